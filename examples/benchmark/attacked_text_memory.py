@@ -0,0 +1,64 @@
+"""
+Measures the memory held per candidate ``AttackedText`` in a population-based
+search, where every generation perturbs the previous one and all candidates
+(and their chains of ``previous_attacked_text``) stay alive.
+
+Example:
+    python examples/benchmark/attacked_text_memory.py --num-words 400 --population 60
+"""
+
+import argparse
+import random
+import tracemalloc
+
+from textattack.shared import AttackedText
+
+
+def run(num_words, population, generations, insert_rate, seed):
+    rng = random.Random(seed)
+    text = AttackedText(" ".join(f"word{i}" for i in range(num_words)) + ".")
+    # Compute words before measuring, since all candidates need them.
+    text.words
+
+    tracemalloc.start()
+    start, _ = tracemalloc.get_traced_memory()
+    candidates = []
+    parents = [text]
+    for _ in range(generations):
+        children = []
+        for parent in parents:
+            for _ in range(population // len(parents)):
+                index = rng.randrange(parent.num_words)
+                if rng.random() < insert_rate:
+                    child = parent.insert_text_after_word_index(index, "extra")
+                else:
+                    child = parent.replace_word_at_index(index, f"swap{index}")
+                children.append(child)
+        candidates.extend(children)
+        parents = rng.sample(children, min(len(children), 10))
+    end, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    index_maps = {
+        id(c.attack_attrs["original_index_map"]) for c in candidates
+    }
+    print(f"candidates:             {len(candidates)}")
+    print(f"distinct index maps:    {len(index_maps)}")
+    print(f"bytes per candidate:    {(end - start) / len(candidates):.0f}")
+    print(f"peak bytes / candidate: {(peak - start) / len(candidates):.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--num-words", type=int, default=200)
+    parser.add_argument("--population", type=int, default=60)
+    parser.add_argument("--generations", type=int, default=20)
+    parser.add_argument(
+        "--insert-rate",
+        type=float,
+        default=0.0,
+        help="Fraction of perturbations that insert a word instead of swapping one.",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    run(args.num_words, args.population, args.generations, args.insert_rate, args.seed)
@@ -1,5 +1,7 @@
 import collections
 
+import numpy as np
+
 import pytest
 
 import textattack
@@ -194,4 +196,70 @@ class TestAttackedText:
             "tan",
         ]
 
+    def test_incremental_words(self, attacked_text, attacked_text_pair):
+        for text in (attacked_text, attacked_text_pair):
+            new_text = text.replace_words_at_indices(
+                (0, 3, 5), ("The", "a long way", "")
+            )
+            retokenized = textattack.shared.AttackedText(new_text._text_input)
+            assert new_text.words == retokenized.words
+            assert new_text.text == retokenized.text
+
+    def test_incremental_words_cjk_replacement(self):
+        text = textattack.shared.AttackedText("the movie was really good fun")
+        new_text = text.replace_word_at_index(3, "中文很好")
+        retokenized = textattack.shared.AttackedText(new_text._text_input)
+        assert new_text.words == retokenized.words
+        assert new_text.num_words == 6
+
+    def test_tokens(self, attacked_text):
+        tokens = attacked_text.tokens
+        assert "".join(tokens.token_texts()) == raw_text
+        assert [tokens[i].text for i in attacked_text.token_word_inds] == (
+            attacked_text.words
+        )
+
+    def test_shared_attack_attrs(self, attacked_text):
+        swapped = attacked_text.replace_word_at_index(2, "other")
+        index_map = swapped.attack_attrs["original_index_map"]
+        assert index_map is attacked_text.attack_attrs["original_index_map"]
+        with pytest.raises(ValueError):
+            index_map[0] = 5
+        swapped_again = swapped.replace_word_at_index(2, "another")
+        assert (
+            swapped_again.attack_attrs["modified_indices"]
+            is swapped.attack_attrs["modified_indices"]
+        )
+        inserted = swapped.insert_text_after_word_index(0, "new")
+        assert inserted.attack_attrs["original_index_map"] is not index_map
+        assert (index_map == np.arange(attacked_text.num_words)).all()
+        assert swapped.attack_attrs["modified_indices"] == {2}
+        assert inserted.attack_attrs["modified_indices"] == {0, 1, 3}
+
+    def test_equality_and_hash(self, attacked_text):
+        swapped = attacked_text.replace_word_at_index(2, "other")
+        swapped_again = attacked_text.replace_word_at_index(2, "other")
+        assert swapped == swapped_again
+        assert hash(swapped) == hash(swapped_again)
+        assert {swapped: 1}[swapped_again] == 1
+        swapped_again.attack_attrs["similarity_score"] = 0.5
+        assert swapped != swapped_again
+        assert swapped != attacked_text.replace_word_at_index(3, "other")
+
+        # Values that are equal but of different types are equal attributes.
+        swapped.attack_attrs["similarity_score"] = np.float64(0.5)
+        assert swapped == swapped_again
+        swapped.attack_attrs["num_queries"] = 3
+        swapped_again.attack_attrs["num_queries"] = np.int64(3)
+        assert swapped == swapped_again
+        swapped.attack_attrs["modified_indices"] = {2}
+        assert swapped_again.attack_attrs["modified_indices"] == frozenset({2})
+        assert swapped == swapped_again
+
+    def test_words_diff_ratio(self, attacked_text):
+        assert attacked_text.words_diff_ratio(attacked_text) == 0.0
+        swapped = attacked_text.replace_words_at_indices([0, 5, 9], ["B", "in", "x"])
+        assert swapped.words_diff_ratio(attacked_text) == 3 / 18
+        assert attacked_text.words_diff_ratio(swapped) == 3 / 18
+
     # TODO: test align_words_with_tokens
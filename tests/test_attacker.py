@@ -0,0 +1,159 @@
+import csv
+import threading
+import zlib
+
+import numpy as np
+import pytest
+
+import textattack
+from textattack.constraints.pre_transformation import RepeatModification
+from textattack.models.wrappers import ModelWrapper
+from textattack.shared.le_record import LeRecord
+from textattack.shared.lineage_store import find_shards
+from textattack.shared.transformation_logger import TransformationLogger
+from textattack.transformations import WordSwap
+
+
+class HashModel(ModelWrapper):
+    """Scores each word of a text by a hash of the word."""
+
+    def __init__(self):
+        self.model = None
+
+    def __call__(self, text_input_list):
+        outputs = []
+        for text in text_input_list:
+            score = sum(
+                (zlib.crc32(w.encode()) % 1000) / 1000 - 0.5 for w in text.split()
+            )
+            prob = 1 / (1 + np.exp(-score - 2.0))
+            outputs.append([1 - prob, prob])
+        return np.array(outputs)
+
+
+class SwapWithSuffixes(WordSwap):
+    def _get_replacement_words(self, word):
+        return [word + suffix for suffix in ("x", "yy", "q", "zz")]
+
+
+class SwapFailingOnWord(SwapWithSuffixes):
+    """Fails on texts containing the word "fail"."""
+
+    def _get_transformations(self, current_text, indices_to_modify):
+        if "fail" in current_text.words:
+            raise RuntimeError("Transformation failed.")
+        return super()._get_transformations(current_text, indices_to_modify)
+
+
+class CachingConstraint(textattack.constraints.Constraint):
+    def __init__(self):
+        super().__init__(compare_against_original=True)
+        self.num_clears = 0
+
+    def _check_constraint(self, transformed_text, reference_text):
+        return True
+
+    def clear_cache(self):
+        self.num_clears += 1
+
+
+class FailingModel(HashModel):
+    def __call__(self, text_input_list):
+        raise RuntimeError("Model failed.")
+
+
+def make_attack(model_wrapper=None, constraints=(), transformation=None):
+    goal_function = textattack.goal_functions.UntargetedClassification(
+        model_wrapper or HashModel()
+    )
+    return textattack.Attack(
+        goal_function,
+        [RepeatModification(), *constraints],
+        transformation or SwapWithSuffixes(),
+        textattack.search_methods.GreedyWordSwapWIR(wir_method="delete"),
+    )
+
+
+def attack_dataset(num_concurrent_attacks, model_wrapper=None):
+    attack = make_attack(model_wrapper)
+    rng = np.random.RandomState(0)
+    vocab = [f"w{i}" for i in range(100)]
+    dataset = textattack.datasets.Dataset(
+        [(" ".join(rng.choice(vocab, size=8)), int(i % 3 > 0)) for i in range(6)]
+    )
+    attack_args = textattack.AttackArgs(
+        num_examples=6,
+        num_concurrent_attacks=num_concurrent_attacks,
+        silent=True,
+        disable_stdout=True,
+    )
+    return textattack.Attacker(attack, dataset, attack_args).attack_dataset()
+
+
+def test_concurrent_attacks_match_sequential(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    sequential = attack_dataset(1)
+    concurrent = attack_dataset(2)
+    assert len(concurrent) == len(sequential) == 6
+    # Concurrent attacks may finish in any order.
+    concurrent = sorted(concurrent, key=lambda r: r.original_text())
+    sequential = sorted(sequential, key=lambda r: r.original_text())
+    for a, b in zip(concurrent, sequential):
+        assert type(a) is type(b)
+        assert a.original_text() == b.original_text()
+        assert a.perturbed_text() == b.perturbed_text()
+        assert a.perturbed_result.num_queries == b.perturbed_result.num_queries
+
+
+def test_concurrent_attacks_stop_batching_on_error(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with pytest.raises(RuntimeError):
+        attack_dataset(2, FailingModel())
+    assert not any(t.name == "BatchingModelWrapper" for t in threading.enumerate())
+
+
+def test_attack_copies_do_not_clear_shared_constraints():
+    constraint = CachingConstraint()
+    attack = make_attack(constraints=[constraint])
+    copy = attack.copy_with_model(attack.goal_function.model)
+    assert copy.constraints == [constraint]
+    copy.clear_cache()
+    assert constraint.num_clears == 0
+    attack.clear_cache()
+    assert constraint.num_clears == 1
+
+
+def test_parallel_attack_merges_lineage_shards_on_error(tmp_path, monkeypatch):
+    for cls, name in [
+        (LeRecord, "lineage_dirname"),
+        (LeRecord, "id_iter"),
+        (LeRecord, "transform_logger"),
+        (LeRecord, "text_logger"),
+        (TransformationLogger, "id_iter"),
+    ]:
+        monkeypatch.setattr(cls, name, getattr(cls, name))
+    monkeypatch.chdir(tmp_path)
+    LeRecord.configure_lineage(dirname=str(tmp_path / "lineage"))
+
+    attack = make_attack(transformation=SwapFailingOnWord())
+    dataset = textattack.datasets.Dataset(
+        [("w1 w2 w3 w4", 1), ("w5 fail w6", 1), ("w7 w8", 1)]
+    )
+    attack_args = textattack.AttackArgs(
+        num_examples=3,
+        parallel=True,
+        model_server=True,
+        num_workers_per_device=1,
+        silent=True,
+        disable_stdout=True,
+    )
+    results = textattack.Attacker(attack, dataset, attack_args).attack_dataset()
+    assert len(results) == 1
+
+    text_path = LeRecord.text_logger.path
+    assert find_shards(text_path) == []
+    assert find_shards(LeRecord.transform_logger.path) == []
+    with open(text_path) as f:
+        texts = [row[1] for row in csv.reader(f, quoting=csv.QUOTE_NONNUMERIC)]
+    # The rows of the worker's finished attack were merged into the main log.
+    assert "w1 w2 w3 w4" in texts
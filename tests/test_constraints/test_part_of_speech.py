@@ -0,0 +1,72 @@
+import types
+
+import pytest
+
+import textattack
+from textattack.transformations import WordSwap
+
+TAGS = {"the": "DET", "dog": "NOUN", "cat": "NOUN", "runs": "VERB", "blue": "ADJ"}
+
+
+def tag(word):
+    return TAGS.get(word.lower(), "NOUN")
+
+
+class StubFlairTagger:
+    def __init__(self):
+        self.num_calls = 0
+
+    def predict(self, sentences):
+        self.num_calls += 1
+        for sentence in sentences:
+            for token in sentence.tokens:
+                token.add_label("pos", tag(token.text))
+
+
+class StubStanzaPipeline:
+    def __init__(self):
+        self.num_calls = 0
+
+    def __call__(self, text):
+        self.num_calls += 1
+        sentences = []
+        for line in text.split("\n"):
+            words = [
+                types.SimpleNamespace(text=w, upos=tag(w), xpos=tag(w))
+                for w in line.split(" ")
+            ]
+            sentences.append(types.SimpleNamespace(words=words))
+        return types.SimpleNamespace(sentences=sentences)
+
+
+class SwapWithFixedWords(WordSwap):
+    def _get_replacement_words(self, word):
+        return ["cat", "runs", "blue"]
+
+
+@pytest.mark.parametrize("tagger_type", ["flair", "stanza"])
+def test_pos_tag_many_batches_tagger_calls(tagger_type):
+    constraint = textattack.constraints.grammaticality.PartOfSpeech(
+        allow_verb_noun_swap=False
+    )
+    constraint.tagger_type = tagger_type
+    if tagger_type == "flair":
+        tagger = constraint._flair_pos_tagger = StubFlairTagger()
+    else:
+        tagger = constraint._stanza_pos_tagger = StubStanzaPipeline()
+
+    text = textattack.shared.AttackedText("the dog runs after the blue cat")
+    transformed_texts = SwapWithFixedWords()(text)
+    filtered = constraint._check_constraint_many(transformed_texts, text)
+    # All contexts are tagged in a single call.
+    assert tagger.num_calls == 1
+
+    constraint.clear_cache()
+    expected = [
+        transformed_text
+        for transformed_text in transformed_texts
+        if constraint._check_constraint(transformed_text, text)
+    ]
+    assert tagger.num_calls > 2
+    assert filtered == expected
+    assert 0 < len(filtered) < len(transformed_texts)
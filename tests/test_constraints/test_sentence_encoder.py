@@ -0,0 +1,70 @@
+import pickle
+
+import numpy as np
+import pytest
+
+import textattack
+from textattack.constraints.semantics.sentence_encoders import SentenceEncoder
+from textattack.transformations import WordSwap
+
+
+class CountingEncoder(SentenceEncoder):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.encoded = []
+
+    def encode(self, sentences):
+        self.encoded.extend(sentences)
+        return np.array([[len(s), s.count("a") + 1.0, 1.0] for s in sentences])
+
+
+class SwapWithFixedWords(WordSwap):
+    def _get_replacement_words(self, word):
+        return ["apple", "banana", "cherry"]
+
+
+def test_embedding_cache():
+    text = textattack.shared.AttackedText("the quick brown fox jumps over a lazy dog")
+    transformed_texts = SwapWithFixedWords()(text)
+    constraint = CountingEncoder(threshold=0.9, window_size=4)
+
+    filtered = list(constraint._check_constraint_many(transformed_texts, text))
+    windows = [text.text_window_around_index(i, 4) for i in range(text.num_words)]
+    for t in transformed_texts:
+        (i,) = t.attack_attrs["newly_modified_indices"]
+        windows.append(t.text_window_around_index(i, 4))
+    # Each distinct window is encoded exactly once.
+    assert sorted(constraint.encoded) == sorted(set(windows))
+
+    # Scores do not depend on whether embeddings come from the cache.
+    scores = [t.attack_attrs["similarity_score"] for t in transformed_texts]
+    constraint.encoded.clear()
+    assert list(constraint._check_constraint_many(transformed_texts, text)) == filtered
+    assert constraint.encoded == []
+    assert [t.attack_attrs["similarity_score"] for t in transformed_texts] == scores
+
+    copy = pickle.loads(pickle.dumps(constraint))
+    assert len(copy._embedding_cache) == 0
+    assert list(copy._check_constraint_many(transformed_texts, text)) == filtered
+
+
+def test_small_embedding_cache():
+    text = textattack.shared.AttackedText("the quick brown fox jumps over a lazy dog")
+    transformed_texts = SwapWithFixedWords()(text)
+    expected = list(
+        CountingEncoder(threshold=0.9, window_size=4)._check_constraint_many(
+            transformed_texts, text
+        )
+    )
+    scores = [t.attack_attrs["similarity_score"] for t in transformed_texts]
+
+    # Embeddings read from the cache are kept, even if encoding the missing
+    # windows evicts them from a cache smaller than one call's windows.
+    constraint = CountingEncoder(threshold=0.9, window_size=4, embedding_cache_size=8)
+    for _ in range(2):
+        filtered = constraint._check_constraint_many(transformed_texts, text)
+        assert list(filtered) == expected
+        assert [t.attack_attrs["similarity_score"] for t in transformed_texts] == scores
+
+    with pytest.raises(ValueError):
+        CountingEncoder(embedding_cache_size=0)
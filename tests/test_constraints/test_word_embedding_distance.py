@@ -0,0 +1,36 @@
+import numpy as np
+
+import textattack
+from textattack.constraints.semantics import WordEmbeddingDistance
+from textattack.transformations import WordSwap
+
+words = [f"w{i}" for i in range(40)]
+
+
+class SwapWithAnyWord(WordSwap):
+    def _get_replacement_words(self, word):
+        return words[:20] + ["unknown"]
+
+
+def test_check_constraint_many_matches_check_constraint():
+    rng = np.random.default_rng(0)
+    embedding_matrix = rng.normal(size=(40, 8)).astype(np.float32)
+    # Make half of the vocabulary similar to each other.
+    embedding_matrix[:10] = embedding_matrix[0] + 0.3 * rng.normal(size=(10, 8))
+    embedding = textattack.shared.WordEmbedding(
+        embedding_matrix, {w: i for i, w in enumerate(words)}, dict(enumerate(words))
+    )
+    text = textattack.shared.AttackedText("w1 w5 unknown w30")
+    transformed_texts = SwapWithAnyWord()(text)
+
+    for kwargs in (
+        {"min_cos_sim": 0.5},
+        {"max_mse_dist": 4.0},
+        {"min_cos_sim": 0.5, "include_unknown_words": False},
+    ):
+        constraint = WordEmbeddingDistance(embedding, **kwargs)
+        filtered = constraint._check_constraint_many(transformed_texts, text)
+        assert 0 < len(filtered) < len(transformed_texts)
+        assert filtered == [
+            t for t in transformed_texts if constraint._check_constraint(t, text)
+        ]
@@ -0,0 +1,38 @@
+import torch
+
+import textattack
+
+
+class RecordingModelWrapper(textattack.models.wrappers.ModelWrapper):
+    def __init__(self, dynamic_padding):
+        self.model = torch.nn.Linear(1, 2)
+        self.dynamic_padding = dynamic_padding
+        self.batches = []
+
+    def __call__(self, text_input_list):
+        self.batches.append(list(text_input_list))
+        lengths = torch.tensor([[float(len(t))] for t in text_input_list])
+        with torch.no_grad():
+            return self.model(lengths)
+
+
+def test_dynamic_padding_keeps_order():
+    texts = [
+        textattack.shared.AttackedText(t)
+        for t in ("a b c d e", "f", "g h h h h h h", "i j", "kkkkkkkkkkkkkkk l m", "n")
+    ]
+    outputs = []
+    for dynamic_padding in (False, True):
+        model_wrapper = RecordingModelWrapper(dynamic_padding)
+        torch.manual_seed(0)
+        model_wrapper.model.reset_parameters()
+        goal_function = textattack.goal_functions.UntargetedClassification(
+            model_wrapper, model_batch_size=2, use_cache=False
+        )
+        outputs.append(goal_function._call_model(texts))
+
+    # Batches are sorted by number of words, and outputs are returned in the
+    # order of the inputs.
+    num_words = [len(t.split()) for batch in model_wrapper.batches for t in batch]
+    assert num_words == sorted(num_words)
+    assert torch.allclose(outputs[0], outputs[1])
@@ -0,0 +1,144 @@
+import csv
+import difflib
+
+import numpy as np
+import pytest
+
+import textattack
+from textattack.models.wrappers import ModelWrapper
+from textattack.shared.le_record import LeRecord
+from textattack.shared.transformation_logger import TransformationLogger
+from textattack.transformations import WordSwap
+
+
+class ConstantModel(ModelWrapper):
+    def __init__(self):
+        self.model = None
+
+    def __call__(self, text_input_list):
+        return np.array([[0.9, 0.1]] * len(text_input_list))
+
+
+class SwapWithSuffixes(WordSwap):
+    def _get_replacement_words(self, word):
+        return [word + suffix for suffix in ("x", "q", "zz")]
+
+
+class NoQConstraint(textattack.constraints.Constraint):
+    """Rejects texts with a word ending in "q"."""
+
+    def __init__(self):
+        super().__init__(compare_against_original=False)
+
+    def _check_constraint(self, transformed_text, reference_text):
+        return not any(w.endswith("q") for w in transformed_text.words)
+
+
+@pytest.fixture
+def lineage_dir(tmp_path, monkeypatch):
+    for cls, name in [
+        (LeRecord, "lineage_dirname"),
+        (LeRecord, "id_iter"),
+        (LeRecord, "transform_logger"),
+        (LeRecord, "text_logger"),
+        (TransformationLogger, "id_iter"),
+    ]:
+        monkeypatch.setattr(cls, name, getattr(cls, name))
+    LeRecord.configure_lineage(dirname=str(tmp_path))
+    yield tmp_path
+    LeRecord.flush_lineage()
+
+
+def read_lineage(dirname):
+    LeRecord.flush_lineage()
+    rows = {}
+    for name in ("text", "transformation"):
+        with open(dirname / f"{name}.csv") as f:
+            rows[name] = list(csv.reader(f, quoting=csv.QUOTE_NONNUMERIC))
+    return rows
+
+
+def expected_transformation_row(trans_id, source, text, indices_to_modify):
+    changes = difflib.SequenceMatcher(
+        None, source.tokens.token_texts(), text.tokens.token_texts()
+    ).get_opcodes()
+    return [
+        float(trans_id),
+        "SwapWithSuffixes",
+        float(source.id),
+        float(text.id),
+        str(indices_to_modify),
+        str(text.attack_attrs["newly_modified_indices"]),
+        str(changes),
+    ]
+
+
+def test_eager_lineage(lineage_dir, monkeypatch):
+    monkeypatch.setattr(LeRecord, "lazy_lineage", False)
+    text = textattack.shared.AttackedText("the cat sat")
+    candidates = SwapWithSuffixes()(text, indices_to_modify=[1])
+    assert [c.text for c in candidates] == [
+        "the catx sat",
+        "the catq sat",
+        "the catzz sat",
+    ]
+
+    assert all(c._pending_lineage is None for c in candidates)
+
+    rows = read_lineage(lineage_dir)
+    # Every candidate is logged as soon as it is created.
+    assert rows["text"] == [[float(t.id), t.text] for t in [text] + candidates]
+    assert rows["transformation"] == [
+        expected_transformation_row(i, text, c, {1}) for i, c in enumerate(candidates)
+    ]
+
+
+def test_lazy_lineage_filtered_candidates(lineage_dir, monkeypatch):
+    monkeypatch.setattr(LeRecord, "lazy_lineage", True)
+    goal_function = textattack.goal_functions.UntargetedClassification(
+        ConstantModel()
+    )
+    attack = textattack.Attack(
+        goal_function,
+        [NoQConstraint()],
+        SwapWithSuffixes(),
+        textattack.search_methods.GreedySearch(),
+    )
+    text = textattack.shared.AttackedText("the cat sat")
+    candidates = SwapWithSuffixes()(text, indices_to_modify=[1])
+    assert all(c._pending_lineage is not None for c in candidates)
+
+    survivors = attack.filter_transformations(candidates, text, original_text=text)
+    assert [c.text for c in survivors] == ["the catx sat", "the catzz sat"]
+    rejected = candidates[1]
+    # The rejected candidate is never diffed, gets no text id and is not logged.
+    assert rejected._pending_lineage is not None
+    assert rejected._id is None
+
+    rows = read_lineage(lineage_dir)
+    assert rows["text"] == [[float(t.id), t.text] for t in [text] + survivors]
+    assert rows["transformation"] == [
+        expected_transformation_row(i, text, c, {1}) for i, c in enumerate(survivors)
+    ]
+
+
+def test_lazy_lineage_chained_children(lineage_dir, monkeypatch):
+    monkeypatch.setattr(LeRecord, "lazy_lineage", True)
+    text = textattack.shared.AttackedText("the cat sat")
+    child = SwapWithSuffixes()(text, indices_to_modify=[1])[0]
+    grandchild = SwapWithSuffixes()(child, indices_to_modify=[2])[2]
+    assert grandchild.text == "the catx satzz"
+    assert child._pending_lineage is not None
+    assert grandchild.le_attrs["previous"] is child
+
+    # Accessing the tokens of the grandchild materializes its parent first.
+    assert grandchild.tokens.token_texts() == ["the", " ", "catx", " ", "satzz"]
+    assert child._pending_lineage is None
+    assert grandchild._pending_lineage is None
+
+    rows = read_lineage(lineage_dir)
+    assert [row[0] for row in rows["text"]] == [text.id, child.id, grandchild.id]
+    assert rows["transformation"] == [
+        expected_transformation_row(0, text, child, {1}),
+        expected_transformation_row(1, child, grandchild, {2}),
+    ]
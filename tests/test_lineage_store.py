@@ -0,0 +1,244 @@
+import csv
+import glob
+import os
+import os.path as osp
+import threading
+import time
+
+import pytest
+
+import textattack
+
+
+class TestLineageStore:
+    def test_flushes_in_segments(self, tmp_path):
+        path = str(tmp_path / "text.csv")
+        store = textattack.shared.LineageStore(
+            path, ["text_id", "text"], flush_size=3
+        )
+        for i in range(7):
+            store.append(i, f"text {i}")
+        assert store.num_segments == 2
+        assert len(store) == 1
+        store.close()
+        assert store.num_rows_written == 7
+        with open(path) as f:
+            rows = list(csv.reader(f, quoting=csv.QUOTE_NONNUMERIC))
+        assert rows == [[float(i), f"text {i}"] for i in range(7)]
+
+    def test_truncates_when_created(self, tmp_path):
+        path = str(tmp_path / "text.csv")
+        store = textattack.shared.LineageStore(path, ["text_id", "text"])
+        store.append(0, "text 0")
+        store.close()
+        # A run that logs nothing must not leave the previous run's rows.
+        store = textattack.shared.LineageStore(path, ["text_id", "text"])
+        store.close()
+        with open(path) as f:
+            assert f.read() == ""
+
+        store = textattack.shared.LineageStore(
+            path, ["text_id", "text"], truncate=False
+        )
+        store.append(1, "text 1")
+        store.close()
+        with open(path) as f:
+            assert len(f.readlines()) == 1
+
+    def test_wrong_row_length(self, tmp_path):
+        store = textattack.shared.LineageStore(
+            str(tmp_path / "text.csv"), ["text_id", "text"]
+        )
+        with pytest.raises(ValueError):
+            store.append(0)
+
+    def test_background_writer(self, tmp_path):
+        path = str(tmp_path / "text.csv")
+        writer = textattack.shared.LineageWriter(max_pending_segments=1)
+        store = textattack.shared.LineageStore(
+            path, ["text_id", "text"], flush_size=2, writer=writer
+        )
+        for i in range(5):
+            store.append(i, f"text {i}")
+        store.flush()
+        writer.drain()
+        assert store.num_segments == 3
+        with open(path) as f:
+            rows = list(csv.reader(f, quoting=csv.QUOTE_NONNUMERIC))
+        assert [row[0] for row in rows] == [float(i) for i in range(5)]
+
+    def test_concurrent_appends(self, tmp_path, monkeypatch):
+        path = str(tmp_path / "text.csv")
+        store = textattack.shared.LineageStore(
+            path, ["text_id", "text"], flush_size=7
+        )
+        flush, write_segment = store.flush, store.write_segment
+
+        def slow_flush():
+            time.sleep(0.001)
+            flush()
+
+        def slow_write_segment(segment):
+            time.sleep(0.001)
+            write_segment(segment)
+
+        # Keep other threads appending while a full buffer is flushed.
+        monkeypatch.setattr(store, "flush", slow_flush)
+        monkeypatch.setattr(store, "write_segment", slow_write_segment)
+        num_threads, num_rows = 8, 300
+        errors = []
+
+        def append_rows(thread):
+            try:
+                for i in range(num_rows):
+                    store.append(thread * num_rows + i, f"text {thread} {i}")
+            except Exception as e:
+                errors.append(e)
+
+        threads = [
+            threading.Thread(target=append_rows, args=(t,)) for t in range(num_threads)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        store.close()
+        assert errors == []
+        assert store.num_rows_written == num_threads * num_rows
+        with open(path) as f:
+            rows = list(csv.reader(f, quoting=csv.QUOTE_NONNUMERIC))
+        assert sorted(row[0] for row in rows) == [
+            float(i) for i in range(num_threads * num_rows)
+        ]
+
+    def test_merge_shards(self, tmp_path):
+        path = str(tmp_path / "text.csv")
+        for shard in (2, 1):
+            store = textattack.shared.LineageStore(
+                textattack.shared.lineage_store.shard_path(path, shard),
+                ["text_id", "text"],
+            )
+            store.append(shard, f"text {shard}")
+            store.close()
+        shards = textattack.shared.lineage_store.find_shards(path)
+        assert shards == [str(tmp_path / "text.1.csv"), str(tmp_path / "text.2.csv")]
+
+        store = textattack.shared.LineageStore(path, ["text_id", "text"])
+        store.append(0, "text 0")
+        store.merge(shards)
+        with open(path) as f:
+            rows = list(csv.reader(f, quoting=csv.QUOTE_NONNUMERIC))
+        assert [row[0] for row in rows] == [0.0, 1.0, 2.0]
+        assert textattack.shared.lineage_store.find_shards(path) == []
+
+    def test_merge_parquet_shards(self, tmp_path):
+        pq = pytest.importorskip("pyarrow.parquet")
+        lineage_store = textattack.shared.lineage_store
+        path = str(tmp_path / "text.csv")
+        for shard in (2, 1):
+            store = textattack.shared.LineageStore(
+                lineage_store.shard_path(path, shard),
+                ["text_id", "text"],
+                flush_size=1,
+                fmt="parquet",
+            )
+            for i in range(2):
+                store.append(10 * shard + i, f"text {shard} {i}")
+            store.close()
+        shards = lineage_store.find_shards(path, "parquet")
+        assert [osp.basename(p) for p in shards] == [
+            "text.1.csv.00000.parquet",
+            "text.1.csv.00001.parquet",
+            "text.2.csv.00000.parquet",
+            "text.2.csv.00001.parquet",
+        ]
+        assert lineage_store.find_shards(path) == []
+
+        store = textattack.shared.LineageStore(path, ["text_id", "text"], fmt="parquet")
+        store.append(0, "text 0")
+        store.merge(shards)
+        assert store.num_segments == 5
+        assert store.num_rows_written == 5
+        assert lineage_store.find_shards(path, "parquet") == []
+        segments = sorted(glob.glob(f"{path}.*.parquet"))
+        text_ids = [
+            text_id
+            for segment in segments
+            for text_id in pq.read_table(segment)["text_id"].to_pylist()
+        ]
+        assert text_ids == [0, 10, 11, 20, 21]
+
+    def test_remove_shards(self, tmp_path):
+        pytest.importorskip("pyarrow")
+        for shard, fmt in [(1, "csv"), (2, "parquet")]:
+            logger = textattack.shared.TextLogger(
+                dirname=str(tmp_path), fmt=fmt, shard=shard, flush_size=1
+            )
+            logger.log_text(shard, f"text {shard}", {})
+            logger.close()
+        assert sorted(os.listdir(tmp_path)) == [
+            "text.1.csv",
+            "text.2.csv.00000.parquet",
+        ]
+        textattack.shared.TextLogger(dirname=str(tmp_path)).remove_shards()
+        assert sorted(os.listdir(tmp_path)) == ["text.csv"]
+
+
+class TestLineageIndex:
+    @pytest.mark.parametrize("fmt", ["csv", "parquet"])
+    def test_queries(self, tmp_path, fmt):
+        if fmt == "parquet":
+            pytest.importorskip("pyarrow")
+        texts = textattack.shared.LineageStore(
+            str(tmp_path / "text.csv"), textattack.shared.TextLogger.columns, fmt=fmt
+        )
+        for i in range(6):
+            texts.append(i, f"text {i}")
+        texts.close()
+        transformations = textattack.shared.LineageStore(
+            str(tmp_path / "transformation.csv"),
+            textattack.shared.TransformationLogger.columns,
+            fmt=fmt,
+        )
+        for i, (prev_id, after_id) in enumerate([(0, 1), (0, 2), (1, 3), (3, 4), (2, 5)]):
+            # Transformations applied to all indices log `None` as their indices.
+            indices = None if i == 0 else {1}
+            transformations.append(i, "WordSwap", prev_id, after_id, indices, {1}, [])
+        transformations.close()
+
+        index = textattack.shared.LineageIndex.build(str(tmp_path))
+        assert index.transformation(0, 1)["from_modified_indices"] is None
+        assert index.transformation(1, 3)["from_modified_indices"] == "{1}"
+        assert index.text_id("text 4") == 4
+        assert index.text_id("missing") is None
+        assert index.ancestors(4) == [3, 1, 0]
+        assert index.descendants(0) == [1, 2, 3, 5, 4]
+        assert index.path(0, 4) == [0, 1, 3, 4]
+        assert index.path(2, 4) is None
+        assert [edge["after_text"] for edge in index.subgraph(1)] == [3, 4]
+        index.close()
+
+    @pytest.mark.parametrize("fmt", ["csv", "parquet"])
+    def test_empty_text(self, tmp_path, fmt):
+        if fmt == "parquet":
+            pytest.importorskip("pyarrow")
+        texts = textattack.shared.LineageStore(
+            str(tmp_path / "text.csv"), textattack.shared.TextLogger.columns, fmt=fmt
+        )
+        texts.append(0, "a")
+        texts.append(1, "")
+        texts.close()
+        transformations = textattack.shared.LineageStore(
+            str(tmp_path / "transformation.csv"),
+            textattack.shared.TransformationLogger.columns,
+            fmt=fmt,
+        )
+        transformations.append(0, "WordDeletion", 0, 1, None, set(), [])
+        transformations.close()
+
+        index = textattack.shared.LineageIndex.build(str(tmp_path))
+        assert index.text(1) == ""
+        assert index.text_id("") == 1
+        assert index.ancestors(1) == [0]
+        assert index.transformation(0, 1)["from_modified_indices"] is None
+        index.close()
@@ -0,0 +1,53 @@
+import torch
+
+import textattack
+
+
+class CountingModelWrapper(textattack.models.wrappers.ModelWrapper):
+    def __init__(self):
+        self.model = torch.nn.Linear(1, 2)
+        self.num_calls = 0
+
+    def __call__(self, text_input_list):
+        self.num_calls += len(text_input_list)
+        lengths = torch.tensor([[float(len(t))] for t in text_input_list])
+        with torch.no_grad():
+            return self.model(lengths)
+
+
+class TestModelOutputCache:
+    def test_outputs_survive_clear_cache(self, tmp_path):
+        model_wrapper = CountingModelWrapper()
+        goal_function = textattack.goal_functions.UntargetedClassification(
+            model_wrapper, model_cache_path=str(tmp_path / "cache.sqlite")
+        )
+        texts = [textattack.shared.AttackedText(t) for t in ("a b", "c d e", "f")]
+        outputs = goal_function._call_model(texts)
+        goal_function.clear_cache()
+        cached_outputs = goal_function._call_model(texts[::-1])
+        assert model_wrapper.num_calls == 3
+        for output, cached_output in zip(outputs, cached_outputs[::-1]):
+            assert torch.allclose(output, cached_output)
+        assert goal_function.persistent_cache.stats()["hits"] == 3
+
+    def test_keyed_by_model(self, tmp_path):
+        path = str(tmp_path / "cache.sqlite")
+        texts = [textattack.shared.AttackedText("a b")]
+        for _ in range(2):
+            model_wrapper = CountingModelWrapper()
+            goal_function = textattack.goal_functions.UntargetedClassification(
+                model_wrapper, model_cache_path=path
+            )
+            goal_function._call_model(texts)
+            assert model_wrapper.num_calls == 1
+
+    def test_keyed_by_preprocessing(self):
+        model_wrapper = CountingModelWrapper()
+        fingerprint = textattack.shared.model_output_cache.model_fingerprint
+        key = fingerprint(model_wrapper)
+        assert fingerprint(model_wrapper) == key
+        model_wrapper.dynamic_padding = True
+        assert fingerprint(model_wrapper) != key
+        model_wrapper.dynamic_padding = False
+        model_wrapper.max_length = 128
+        assert fingerprint(model_wrapper) != key
@@ -0,0 +1,218 @@
+import json
+import string
+
+import pytest
+import torch
+import transformers
+
+import textattack
+from textattack.constraints.grammaticality.language_models import GPT2
+from textattack.models.wrappers import huggingface_model_wrapper
+
+WORDS = ["the", "quick", "brown", "fox", "jumps", "over", "lazy", "dog", "cafe"]
+
+
+@pytest.fixture(scope="module")
+def bert(tmp_path_factory):
+    vocab = (
+        ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"]
+        + list(string.ascii_lowercase)
+        + ["##" + c for c in string.ascii_lowercase]
+        + list(string.punctuation)
+        + WORDS
+        + ["##ump", "##s"]
+    )
+    vocab_file = tmp_path_factory.mktemp("bert") / "vocab.txt"
+    vocab_file.write_text("\n".join(vocab))
+    tokenizer = transformers.BertTokenizerFast(vocab_file=str(vocab_file))
+    tokenizer.model_max_length = 64
+    torch.manual_seed(0)
+    config = transformers.BertConfig(
+        vocab_size=len(vocab),
+        hidden_size=16,
+        num_hidden_layers=1,
+        num_attention_heads=2,
+        intermediate_size=16,
+    )
+    model = transformers.BertForSequenceClassification(config).eval()
+    return model, tokenizer
+
+
+@pytest.fixture(scope="module")
+def gpt2_dir(tmp_path_factory):
+    """A tiny, randomly initialized GPT-2 model and byte-level BPE tokenizer."""
+    path = tmp_path_factory.mktemp("gpt2")
+    byte_encoder = transformers.models.gpt2.tokenization_gpt2.bytes_to_unicode()
+    chars = list(byte_encoder.values())
+    merges = ["Ġ t", "h e", "Ġt he", "Ġ f", "o x"]
+    vocab = chars + ["".join(m.split()) for m in merges] + ["<|endoftext|>"]
+    (path / "vocab.json").write_text(json.dumps({t: i for i, t in enumerate(vocab)}))
+    (path / "merges.txt").write_text("#version: 0.2\n" + "\n".join(merges) + "\n")
+    tokenizer = transformers.GPT2Tokenizer(
+        str(path / "vocab.json"), str(path / "merges.txt")
+    )
+    tokenizer.save_pretrained(str(path))
+    torch.manual_seed(0)
+    config = transformers.GPT2Config(
+        vocab_size=len(vocab),
+        n_positions=64,
+        n_embd=16,
+        n_layer=2,
+        n_head=2,
+        pad_token_id=tokenizer.eos_token_id,
+    )
+    transformers.GPT2LMHeadModel(config).save_pretrained(str(path))
+    return path
+
+
+def test_incremental_tokenization_matches_full(bert):
+    model, tokenizer = bert
+    model_wrapper = textattack.models.wrappers.HuggingFaceModelWrapper(
+        model, tokenizer, dynamic_padding=True, incremental_tokenization=True
+    )
+    assert model_wrapper.incremental_tokenization
+    text = textattack.shared.AttackedText("The quick brown fox jumps over the dog.")
+    model_wrapper.encode_attacked_texts([text])
+    edits = [
+        lambda t: t.replace_word_at_index(1, "lazy"),
+        lambda t: t.replace_word_at_index(4, "xjumpsq"),
+        lambda t: t.insert_text_after_word_index(2, "cafe,"),
+        lambda t: t.delete_word_at_index(0),
+        lambda t: t.replace_word_at_index(t.num_words - 1, "fox!"),
+        lambda t: t.replace_word_at_index(2, "don't"),
+    ]
+    for edit in edits:
+        parent, text = text, edit(text)
+        splice = model_wrapper._find_splice(
+            text.text, parent.text, model_wrapper._encoding_cache[parent.text]
+        )
+        assert splice is not None
+        span = tokenizer(
+            text.text[splice[1] : splice[2]],
+            add_special_tokens=False,
+            return_offsets_mapping=True,
+        )
+        ids, _ = huggingface_model_wrapper._apply_splice(
+            splice, span["input_ids"], span["offset_mapping"], 64
+        )
+        assert ids == tokenizer(text.text)["input_ids"]
+        # The wrapper splices the same ids into its padded inputs.
+        inputs = model_wrapper.encode_attacked_texts([text])
+        assert inputs["input_ids"][0].tolist() == ids
+
+
+def test_batching_forwards_incremental_tokenization(bert):
+    model, tokenizer = bert
+    model_wrapper = textattack.models.wrappers.HuggingFaceModelWrapper(
+        model, tokenizer, dynamic_padding=True, incremental_tokenization=True
+    )
+    batching = textattack.models.wrappers.BatchingModelWrapper(model_wrapper)
+    assert batching.incremental_tokenization
+
+    text = textattack.shared.AttackedText("The quick brown fox jumps over the dog.")
+    model_wrapper.encode_attacked_texts([text])
+    texts = [text.replace_word_at_index(i, "cafe") for i in range(text.num_words)]
+    with torch.no_grad():
+        expected = model_wrapper([t.tokenizer_input for t in texts])
+    outputs = batching.call_attacked_texts(texts)
+    assert torch.allclose(outputs, expected, atol=1e-5)
+    # The edited texts were encoded from their parent.
+    assert all(t.tokenizer_input in model_wrapper._encoding_cache for t in texts)
+
+
+def test_model_server_rejects_incremental_tokenization(bert):
+    model, tokenizer = bert
+    model_wrapper = textattack.models.wrappers.HuggingFaceModelWrapper(
+        model, tokenizer, incremental_tokenization=True
+    )
+    with pytest.raises(ValueError):
+        textattack.models.wrappers.ModelServer(model_wrapper, num_clients=1)
+
+
+def test_shared_prefix_length():
+    input_ids = torch.tensor([[5, 6, 7, 8, 0], [5, 6, 9, 0, 0], [5, 6, 7, 1, 2]])
+    attention_mask = (input_ids != 0).long()
+    assert textattack.shared.utils.shared_prefix_length(input_ids, attention_mask) == 2
+    # At least one token of each row is left unshared.
+    same = torch.tensor([[5, 6, 7], [5, 6, 7]])
+    assert textattack.shared.utils.shared_prefix_length(same) == 2
+    assert textattack.shared.utils.shared_prefix_length(same[:, :1]) == 0
+
+
+def test_shared_prefix_scoring_matches_full_forward(gpt2_dir):
+    tokenizer = transformers.GPT2Tokenizer.from_pretrained(str(gpt2_dir))
+    tokenizer.pad_token = tokenizer.eos_token
+    tokenizer.model_max_length = 64
+    config = transformers.GPT2Config.from_pretrained(str(gpt2_dir), num_labels=3)
+    torch.manual_seed(0)
+    model = transformers.GPT2ForSequenceClassification(config).eval()
+    texts = [
+        "the fox saw the quick dog",
+        "the fox saw the lazy dog run",
+        "the fox saw a cat",
+    ]
+    full = textattack.models.wrappers.HuggingFaceModelWrapper(
+        model, tokenizer, dynamic_padding=True
+    )
+    shared = textattack.models.wrappers.HuggingFaceModelWrapper(
+        model, tokenizer, dynamic_padding=True, shared_prefix_scoring=True
+    )
+    assert torch.allclose(shared(texts), full(texts), atol=1e-5)
+    assert shared.prefix_reuse_stats.num_reused_tokens > 0
+
+
+def test_gpt2_prefix_cache_matches_full_forward(gpt2_dir):
+    constraint = GPT2(model_name=str(gpt2_dir), max_log_prob_diff=1.0)
+    text = textattack.shared.AttackedText("the fox saw the quick dog")
+    siblings = [text.replace_word_at_index(4, w) for w in ("lazy", "fox", "red")]
+
+    prefix_ids = constraint.tokenizer.encode(text.text_until_word_index(4))
+    with torch.no_grad():
+        logits = constraint.model(torch.tensor([prefix_ids]))[0][0, -1]
+    expected = [
+        logits[constraint.tokenizer.encode(t.words[4])[0]] for t in siblings
+    ]
+    for _ in range(2):
+        probs = constraint.get_log_probs_at_index(siblings, 4)
+        assert torch.allclose(torch.stack(probs), torch.stack(expected), atol=1e-5)
+    # The second call reused the cached predictions.
+    stats = constraint.prefix_reuse_stats
+    assert stats.num_queries == 2
+    assert stats.num_reused_tokens == len(prefix_ids)
+
+
+def _query_remote_model(model_wrapper, texts, results):
+    # Send a list, as tensors shared by an exited process can't be received.
+    results.put(model_wrapper(texts).tolist())
+    model_wrapper.close()
+
+
+def test_model_server_round_trip(bert):
+    model, tokenizer = bert
+    model_wrapper = textattack.models.wrappers.HuggingFaceModelWrapper(
+        model, tokenizer, dynamic_padding=True
+    )
+    texts = ["the quick brown fox", "the lazy dog jumps over the fox"]
+    with torch.no_grad():
+        expected = model_wrapper(texts)
+
+    server = textattack.models.wrappers.ModelServer(model_wrapper, num_clients=1)
+    server.start()
+    try:
+        client = server.client()
+        assert torch.allclose(client(texts), expected, atol=1e-5)
+        # The only response queue is free again once this process closes its
+        # client, so that another process can take it.
+        client.close()
+        context = torch.multiprocessing.get_context("spawn")
+        results = context.Queue()
+        process = context.Process(
+            target=_query_remote_model, args=(client, texts, results)
+        )
+        process.start()
+        outputs = results.get(timeout=60)
+        process.join()
+        assert torch.allclose(torch.tensor(outputs), expected, atol=1e-5)
+        assert client(texts[:1]).shape == (1, 2)
+    finally:
+        server.stop()
@@ -0,0 +1,70 @@
+import pickle
+
+import numpy as np
+import pytest
+
+import textattack
+from textattack.shared import PosLexicon
+from textattack.transformations import WordSwap
+
+tagged_words = [
+    ("The", "DET"),
+    ("dog", "NOUN"),
+    ("runs", "VERB"),
+    ("runs", "NOUN"),
+    ("quickly", "ADV"),
+    ("the", "DET"),
+    ("blue", "ADJ"),
+    ("blue", "NOUN"),
+    ("blue", "VERB"),
+]
+
+
+def test_pos_lexicon(tmp_path):
+    lexicon = PosLexicon.build(tagged_words)
+    assert len(lexicon) == 5
+    assert lexicon.tags("the") == {"DET"}
+    assert lexicon.tags("Runs") == {"NOUN", "VERB"}
+    assert lexicon.tags("cat") is None
+    assert PosLexicon.build(tagged_words, min_count=2).tags("runs") is None
+
+    lexicon.save(str(tmp_path / "lexicon"))
+    loaded = PosLexicon.load(str(tmp_path / "lexicon"))
+    assert loaded.tagset is None
+    assert isinstance(loaded.words, np.memmap)
+    assert loaded.tags("blue") == {"ADJ", "NOUN", "VERB"}
+    copy = pickle.loads(pickle.dumps(loaded))
+    assert isinstance(copy.tag_masks, np.memmap)
+    assert copy.tags("quickly") == {"ADV"}
+
+
+class SwapWithFixedWords(WordSwap):
+    def _get_replacement_words(self, word):
+        return ["the", "quickly"]
+
+
+def test_pos_lexicon_tagset(tmp_path):
+    lexicon = PosLexicon.build(tagged_words, tagset="universal")
+    lexicon.save(str(tmp_path / "lexicon"))
+    assert PosLexicon.load(str(tmp_path / "lexicon")).tagset == "universal"
+
+    PartOfSpeech = textattack.constraints.grammaticality.PartOfSpeech
+    PartOfSpeech(tagset="universal", pos_lexicon=str(tmp_path / "lexicon"))
+    with pytest.raises(ValueError):
+        PartOfSpeech(tagset="ptb", pos_lexicon=str(tmp_path / "lexicon"))
+    # Lexicons without a recorded tagset are not checked.
+    PartOfSpeech(tagset="ptb", pos_lexicon=PosLexicon.build(tagged_words))
+
+
+def test_part_of_speech_lexicon_rejects():
+    constraint = textattack.constraints.grammaticality.PartOfSpeech(
+        pos_lexicon=PosLexicon.build(tagged_words)
+    )
+    assert constraint._lexicon_rejects("dog", "quickly")
+    assert not constraint._lexicon_rejects("dog", "runs")
+    assert not constraint._lexicon_rejects("dog", "cat")
+
+    # All swaps are impossible, so no text has to be tagged.
+    text = textattack.shared.AttackedText("dog runs blue")
+    transformed_texts = SwapWithFixedWords()(text)
+    assert constraint._check_constraint_many(transformed_texts, text) == []
@@ -0,0 +1,147 @@
+import numpy as np
+
+import textattack
+from textattack.models.wrappers import ModelWrapper
+from textattack.search_methods import (
+    ImprovedGeneticAlgorithm,
+    ParticleSwarmOptimization,
+    PopulationMember,
+)
+from textattack.shared import utils
+from textattack.transformations import WordSwap
+
+
+class SuffixCountModel(ModelWrapper):
+    """Moves away from the first label with each word ending in "zz"."""
+
+    def __init__(self):
+        self.model = None
+
+    def __call__(self, text_input_list):
+        outputs = []
+        for text in text_input_list:
+            num_zz = sum(w.endswith("zz") for w in text.split())
+            prob = 0.1 + 0.1 * num_zz
+            outputs.append([1 - prob, prob])
+        return np.array(outputs)
+
+
+class SwapWithSuffixes(WordSwap):
+    def _get_replacement_words(self, word):
+        return [word + suffix for suffix in ("x", "yy", "q", "zz")]
+
+
+def _member(text):
+    return PopulationMember(textattack.shared.AttackedText(text))
+
+
+def test_pso_velocity_update_matches_scalar_formula():
+    pso = ParticleSwarmOptimization(pop_size=3)
+    population = [
+        _member("the cat sat on the mat"),
+        _member("a cat sat on the rug"),
+        _member("the dog sat in the mat"),
+    ]
+    local_elites = [
+        _member("the cat sat on a mat"),
+        _member("a cat sat on the rug"),
+        _member("a dog lay in the mat"),
+    ]
+    global_elite = _member("a cat sat in the rug")
+    velocities = np.random.RandomState(0).uniform(-3, 3, (3, 6))
+    omega = 0.65
+
+    new_velocities = pso._update_velocities(
+        velocities, omega, population, local_elites, global_elite
+    )
+
+    def equal(a, b):
+        return -pso.v_max if a == b else pso.v_max
+
+    for k in range(len(population)):
+        for d in range(population[k].num_words):
+            expected = omega * velocities[k][d] + (1 - omega) * (
+                equal(population[k].words[d], local_elites[k].words[d])
+                + equal(population[k].words[d], global_elite.words[d])
+            )
+            assert np.isclose(new_velocities[k][d], expected)
+
+
+def test_pso_turn_matches_scalar_sampling():
+    pso = ParticleSwarmOptimization(post_turn_check=False)
+    source = _member("the cat sat on the mat")
+    target = _member("a dog lay in a rug")
+    source.attacked_text.attack_attrs["modified_indices"] = {1}
+    target.attacked_text.attack_attrs["modified_indices"] = {0, 2, 4}
+    prob = utils.sigmoid(np.array([-3.0, 3.0, 0.0, 1.0, -1.0, 0.5]))
+
+    for seed in range(10):
+        np.random.seed(seed)
+        expected_indices = [
+            i for i in range(len(prob)) if np.random.uniform() < prob[i]
+        ]
+        np.random.seed(seed)
+        turned = pso._turn(source, target, prob, source.attacked_text)
+        assert turned.words == [
+            target.words[i] if i in expected_indices else source.words[i]
+            for i in range(source.num_words)
+        ]
+        assert turned.attacked_text.attack_attrs["modified_indices"] == (
+            {1} - set(expected_indices)
+        ) | ({0, 2, 4} & set(expected_indices))
+
+
+def _genetic_algorithm_and_initial_result(query_budget=float("inf")):
+    goal_function = textattack.goal_functions.UntargetedClassification(
+        SuffixCountModel(), query_budget=query_budget
+    )
+    search_method = ImprovedGeneticAlgorithm(pop_size=3, post_crossover_check=False)
+    textattack.Attack(goal_function, [], SwapWithSuffixes(), search_method)
+    initial_result, _ = goal_function.init_attack_example(
+        textattack.shared.AttackedText("the cat sat on the mat"), 0
+    )
+    return search_method, goal_function, initial_result
+
+
+def _population(initial_result, pop_size):
+    return [
+        PopulationMember(
+            initial_result.attacked_text,
+            initial_result,
+            attributes={"num_replacements_left": np.full(6, 5)},
+        )
+        for _ in range(pop_size)
+    ]
+
+
+def test_genetic_algorithm_perturb_index_zero():
+    search_method, _, initial_result = _genetic_algorithm_and_initial_result()
+    for seed in range(5):
+        np.random.seed(seed)
+        perturbed = search_method._perturb(
+            _population(initial_result, 1)[0], initial_result, index=0
+        )
+        assert perturbed.words == ["thezz", "cat", "sat", "on", "the", "mat"]
+        assert list(perturbed.attributes["num_replacements_left"]) == [4] + [5] * 5
+
+
+def test_genetic_algorithm_perturb_population_query_budget():
+    # One query for the initial text and six for the first round: the four
+    # candidates for the first member and two of the four for the second.
+    search_method, goal_function, initial_result = (
+        _genetic_algorithm_and_initial_result(query_budget=7)
+    )
+    population = _population(initial_result, 3)
+    perturbed = search_method._perturb_population(
+        population, initial_result, indices=[0, 1, 2]
+    )
+
+    assert search_method._search_over
+    assert goal_function.num_queries == 7
+    assert len(perturbed) == 3
+    assert perturbed[0].words[0] == "thezz"
+    assert perturbed[0].score > initial_result.score
+    # The "zz" candidate of the second member was cut by the budget, and the
+    # third member was not scored at all, so neither is modified.
+    assert perturbed[1] is population[1]
+    assert perturbed[2] is population[2]
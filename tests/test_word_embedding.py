@@ -3,7 +3,13 @@ import os
 import numpy as np
 import pytest
 
-from textattack.shared import GensimWordEmbedding, WordEmbedding
+from textattack.shared import (
+    GensimWordEmbedding,
+    IVFIndex,
+    WordEmbedding,
+    build_nearest_neighbour_index,
+    nearest_neighbour_index,
+)
 
 
 def test_embedding_paragramcf():
@@ -49,3 +55,178 @@ bye-bye -1 1
     assert word_embedding.index2word(3) == "bye-bye"
     # remove test file
     os.remove(path)
+
+
+def test_embedding_memory_mapped(tmp_path):
+    import pickle
+
+    from textattack.shared.word_embeddings import _load_pair_table
+
+    np.save(tmp_path / "embedding.npy", np.eye(3, dtype=np.float32))
+    with open(tmp_path / "mse_dist.p", "wb") as f:
+        pickle.dump({0: {1: 2.0, 2: 2.0}}, f)
+
+    embedding_matrix = np.load(tmp_path / "embedding.npy", mmap_mode="r")
+    word2index = {"a": 0, "b": 1, "c": 2}
+    index2word = {i: w for w, i in word2index.items()}
+    word_embedding = WordEmbedding(embedding_matrix, word2index, index2word)
+    word_embedding._mse_dist_table = _load_pair_table(
+        str(tmp_path / "mse_dist.p"), len(embedding_matrix)
+    )
+    assert os.path.exists(tmp_path / "mse_dist.keys.npy")
+    assert word_embedding.get_mse_dist("b", "a") == 2.0
+    assert word_embedding.get_mse_dist(1, 2) == pytest.approx(2.0)
+    assert word_embedding.get_cos_sim(0, 1) == pytest.approx(0.0)
+
+    # Pickling keeps the arrays mapped instead of copying them.
+    copy = pickle.loads(pickle.dumps(word_embedding))
+    assert isinstance(copy.embedding_matrix, np.memmap)
+    assert isinstance(copy._mse_dist_table[0], np.memmap)
+    assert copy.get_mse_dist(0, 2) == 2.0
+    assert pytest.approx(copy["c"][2]) == 1
+
+
+def test_embedding_distances_many():
+    rng = np.random.default_rng(0)
+    embedding_matrix = rng.normal(size=(50, 8)).astype(np.float32)
+    words = [f"w{i}" for i in range(50)]
+    word_embedding = WordEmbedding(
+        embedding_matrix, {w: i for i, w in enumerate(words)}, dict(enumerate(words))
+    )
+    # Precomputed distances take precedence over computed ones.
+    word_embedding._cos_sim_table = (np.array([1 * 50 + 3]), np.array([0.5]))
+
+    bs = [3, 0, 49, "w7", 3]
+    cos_sims = word_embedding.get_cos_sim_many(1, bs)
+    assert cos_sims[0] == 0.5
+    assert list(cos_sims) == [word_embedding.get_cos_sim(1, b) for b in bs]
+    mse_dists = word_embedding.get_mse_dist_many(["w1", 2, 3, 4, 5], bs)
+    assert list(mse_dists) == [
+        word_embedding.get_mse_dist(a, b) for a, b in zip(["w1", 2, 3, 4, 5], bs)
+    ]
+    e1, e2 = embedding_matrix[3], embedding_matrix[49]
+    assert pytest.approx(mse_dists[2], rel=1e-5) == np.sum((e1 - e2) ** 2)
+    assert pytest.approx(cos_sims[2], rel=1e-5) == np.dot(
+        embedding_matrix[1], embedding_matrix[49]
+    ) / np.linalg.norm(embedding_matrix[1]) / np.linalg.norm(embedding_matrix[49])
+
+
+def test_embedding_nn_index(tmp_path):
+    rng = np.random.default_rng(0)
+    embedding_matrix = rng.normal(size=(300, 16)).astype(np.float32)
+    words = [f"w{i}" for i in range(300)]
+    word_embedding = WordEmbedding(
+        embedding_matrix, {w: i for i, w in enumerate(words)}, dict(enumerate(words))
+    )
+    exact = word_embedding.nearest_neighbours(7, 5)
+    assert len(exact) == 5 and 7 not in exact
+
+    # Probing every list makes the index exact.
+    path = str(tmp_path / "nn.ivf")
+    word_embedding.build_nn_index(path, backend="ivf", num_lists=10, num_probes=10)
+    assert os.path.exists(path)
+    assert word_embedding.nearest_neighbours(7, 5) == exact
+    assert word_embedding.nearest_neighbours("w7", 5) == exact
+
+
+def test_embedding_distances_many_use_cache():
+    rng = np.random.default_rng(0)
+    embedding_matrix = rng.normal(size=(20, 8)).astype(np.float32)
+    words = [f"w{i}" for i in range(20)]
+    word_embedding = WordEmbedding(
+        embedding_matrix, {w: i for i, w in enumerate(words)}, dict(enumerate(words))
+    )
+    # Cached values take precedence, like in `get_cos_sim`.
+    word_embedding._cos_sim_mat[2][5] = 0.25
+    cos_sims = word_embedding.get_cos_sim_many(5, [2, 3])
+    assert cos_sims[0] == 0.25
+    # Computed values are cached for later calls, in the embeddings' dtype.
+    assert word_embedding._cos_sim_mat[3][5] == cos_sims[1]
+    assert cos_sims[1] == np.float32(cos_sims[1])
+    assert word_embedding.get_cos_sim(3, 5) == cos_sims[1]
+    mse_dists = word_embedding.get_mse_dist_many(4, [1, 7])
+    assert word_embedding._mse_dist_mat[1][4] == mse_dists[0]
+    assert word_embedding.get_mse_dist(7, 4) == mse_dists[1]
+
+
+def test_nn_index_checks_saved_index(tmp_path, monkeypatch):
+    num_builds = []
+    build = IVFIndex.build
+
+    def counting_build(*args, **kwargs):
+        num_builds.append(1)
+        return build(*args, **kwargs)
+
+    monkeypatch.setattr(IVFIndex, "build", counting_build)
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(200, 8)).astype(np.float32)
+    path = str(tmp_path / "nn.ivf")
+    index = build_nearest_neighbour_index(
+        vectors, path, backend="ivf", num_lists=8, num_probes=2
+    )
+    assert index.metadata["num_vectors"] == 200 and index.metadata["dim"] == 8
+
+    # Search settings of a saved index can be changed when it is loaded.
+    loaded = build_nearest_neighbour_index(
+        vectors, path, backend="ivf", num_lists=8, num_probes=8
+    )
+    assert loaded.num_probes == 8
+    assert np.array_equal(loaded.list_ids, index.list_ids)
+    assert len(num_builds) == 1
+
+    # An index built over other vectors, or with other settings, is rebuilt.
+    for other_vectors, num_lists in (
+        (vectors[:100], 8),
+        (vectors[:, :4], 8),
+        (vectors + 1, 8),
+        (vectors, 4),
+    ):
+        rebuilt = build_nearest_neighbour_index(
+            other_vectors, path, backend="ivf", num_lists=num_lists
+        )
+        assert len(rebuilt.list_ids) == len(other_vectors)
+        assert rebuilt.metadata == IVFIndex.load_metadata(path)
+    assert len(num_builds) == 5
+
+
+def test_nn_index_skips_digest_of_mapped_vectors(tmp_path, monkeypatch):
+    num_digests = []
+    vectors_digest = nearest_neighbour_index._vectors_digest
+
+    def counting_digest(vectors):
+        num_digests.append(1)
+        return vectors_digest(vectors)
+
+    monkeypatch.setattr(nearest_neighbour_index, "_vectors_digest", counting_digest)
+    rng = np.random.default_rng(0)
+    vectors_file = str(tmp_path / "vectors.npy")
+    np.save(vectors_file, rng.normal(size=(200, 8)).astype(np.float32))
+    path = str(tmp_path / "nn.ivf")
+    build_nearest_neighbour_index(
+        np.load(vectors_file, mmap_mode="r"), path, backend="ivf", num_lists=8
+    )
+    assert len(num_digests) == 1
+
+    # The saved index over the same, unmodified file is reused without
+    # reading the vectors.
+    loaded = build_nearest_neighbour_index(
+        np.load(vectors_file, mmap_mode="r"), path, backend="ivf", num_lists=8
+    )
+    assert loaded.metadata == IVFIndex.load_metadata(path)
+    assert len(num_digests) == 1
+
+    # Vectors that are not mapped from that file are compared by digest.
+    in_memory = np.array(np.load(vectors_file))
+    build_nearest_neighbour_index(in_memory, path, backend="ivf", num_lists=8)
+    assert len(num_digests) == 2
+    assert IVFIndex.load_metadata(path) == loaded.metadata
+
+    # A modified file is hashed again, and the index is rebuilt.
+    stat = os.stat(vectors_file)
+    np.save(vectors_file, in_memory + 1)
+    os.utime(vectors_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    rebuilt = build_nearest_neighbour_index(
+        np.load(vectors_file, mmap_mode="r"), path, backend="ivf", num_lists=8
+    )
+    assert len(num_digests) == 3
+    assert rebuilt.metadata["digest"] != loaded.metadata["digest"]
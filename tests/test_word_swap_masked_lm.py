@@ -0,0 +1,132 @@
+import string
+import types
+
+import pytest
+import torch
+import transformers
+
+import textattack
+from textattack.shared import utils
+from textattack.transformations import WordSwapMaskedLM
+
+VOCAB = (
+    ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "mask"]
+    + ["the", "cat", "sat", "on", "mat", "dog", "ran", "to", "a", "big", "red"]
+    + ["good", "bad", "day", "night", "e-mail", "2020", "x2"]
+    + ["##s", "##ing", "##ed", "##y", "Ġday", "Ġcat", "Ġ"]
+    + list(",.!?-'") + ["...", "--"]
+)
+
+
+class StubMaskedLM(torch.nn.Module):
+    """Returns fixed random logits for every position, shifted by the tokens
+    of each input so that different texts get different predictions."""
+
+    def __init__(self, vocab_size, max_length, model_type):
+        super().__init__()
+        generator = torch.Generator().manual_seed(0)
+        self.position_logits = torch.nn.Parameter(
+            3 * torch.randn(max_length, vocab_size, generator=generator)
+        )
+        self.token_logits = torch.nn.Parameter(
+            torch.randn(vocab_size, vocab_size, generator=generator)
+        )
+        self.config = types.SimpleNamespace(model_type=model_type)
+
+    def forward(self, input_ids, attention_mask=None, token_type_ids=None):
+        length = input_ids.shape[1]
+        offsets = (self.token_logits[input_ids] * attention_mask.unsqueeze(2)).sum(1)
+        return (self.position_logits[:length] + offsets.unsqueeze(1),)
+
+
+@pytest.fixture(scope="module")
+def tokenizer(tmp_path_factory):
+    vocab_file = tmp_path_factory.mktemp("bert") / "vocab.txt"
+    vocab_file.write_text("\n".join(VOCAB))
+    # `text_window_around_index` strips the brackets of "[MASK]" from the ends
+    # of a text, so a plain word is used to also mask the first and last words.
+    return transformers.BertTokenizerFast(
+        vocab_file=str(vocab_file), mask_token="mask"
+    )
+
+
+def argsort_walk_replacement_words(transformation, current_text, indices_to_modify):
+    """The BAE replacement words, found by walking the ids of each mask
+    prediction in order of probability."""
+    tokenizer = transformation._lm_tokenizer
+    model_type = transformation._language_model.config.model_type
+    replacement_words = []
+    for index in indices_to_modify:
+        masked_text = current_text.replace_word_at_index(index, tokenizer.mask_token)
+        masked_text = masked_text.text_window_around_index(
+            index, transformation.window_size
+        )
+        inputs = transformation._encode_text([masked_text])
+        ids = inputs["input_ids"].tolist()[0]
+        if tokenizer.mask_token_id not in ids:
+            replacement_words.append([])
+            continue
+        masked_index = ids.index(tokenizer.mask_token_id)
+        with torch.no_grad():
+            preds = transformation._language_model(**inputs)[0]
+        mask_token_probs = torch.softmax(preds[0, masked_index], dim=0)
+        top_words = []
+        for _id in torch.argsort(mask_token_probs, descending=True).tolist():
+            word = tokenizer.convert_ids_to_tokens(_id)
+            if utils.check_if_subword(word, model_type, masked_index == 1):
+                word = utils.strip_BPE_artifacts(word, model_type)
+            if (
+                mask_token_probs[_id] >= transformation.min_confidence
+                and utils.is_one_word(word)
+                and not utils.check_if_punctuations(word)
+            ):
+                top_words.append(word)
+            if (
+                len(top_words) >= transformation.max_candidates
+                or mask_token_probs[_id] < transformation.min_confidence
+            ):
+                break
+        replacement_words.append(top_words)
+    return replacement_words
+
+
+# The first token of a text is not a subword for RoBERTa even without "Ġ".
+@pytest.mark.parametrize("model_type", ["bert", "roberta"])
+@pytest.mark.parametrize("max_candidates", [3, 50])
+@pytest.mark.parametrize("min_confidence", [0.0, 0.01, 0.05])
+def test_bae_replacement_words(tokenizer, model_type, max_candidates, min_confidence):
+    max_length = 10
+    transformation = WordSwapMaskedLM(
+        method="bae",
+        masked_language_model=StubMaskedLM(len(VOCAB), max_length, model_type),
+        tokenizer=tokenizer,
+        max_length=max_length,
+        max_candidates=max_candidates,
+        min_confidence=min_confidence,
+        batch_size=3,
+    )
+    texts = [
+        "the cat sat on the mat",
+        "a big red dog ran to the cat on a good day",
+        "bad night",
+    ]
+    num_candidates = 0
+    for text in texts:
+        current_text = textattack.shared.AttackedText(text)
+        # Words past `max_length` tokens are truncated away with their mask.
+        indices = list(range(current_text.num_words))
+        replacement_words = transformation._bae_replacement_words(
+            current_text, indices
+        )
+        assert replacement_words == argsort_walk_replacement_words(
+            transformation, current_text, indices
+        )
+        if current_text.num_words > max_length:
+            assert replacement_words[-1] == []
+        for words in replacement_words:
+            assert len(words) <= max_candidates
+            assert not any(w in string.punctuation or w == "..." for w in words)
+            if model_type == "bert":
+                assert not any(w.startswith("##") for w in words)
+        num_candidates += sum(len(words) for words in replacement_words)
+    assert num_candidates > 0
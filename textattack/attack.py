@@ -4,6 +4,7 @@ Attack Class
 """
 
 from collections import OrderedDict
+import copy
 from typing import List, Union
 
 import lru
@@ -146,6 +147,9 @@ class Attack:
 
         self.constraint_cache_size = constraint_cache_size
         self.constraints_cache = lru.LRU(constraint_cache_size)
+        # Whether other attacks, running in other threads, use the same
+        # constraints (see ``copy_with_model``).
+        self._shares_constraints = False
 
         # Give search method access to functions for getting transformations and evaluating them
         self.search_method.get_transformations = self.get_transformations
@@ -164,10 +168,34 @@ class Attack:
             self.transformation_cache.clear()
         if recursive:
             self.goal_function.clear_cache()
+            if self._shares_constraints:
+                # Other attacks may be reading the constraints' caches. Those
+                # are bounded, so they are left to evict old entries instead.
+                return
             for constraint in self.constraints:
                 if hasattr(constraint, "clear_cache"):
                     constraint.clear_cache()
 
+    def copy_with_model(self, model_wrapper):
+        """Returns a copy of this attack whose goal function queries
+        ``model_wrapper``.
+
+        The copy has its own goal function, search method and caches, so it
+        can attack an example while this attack attacks another one in a
+        different thread. Transformations and constraints are shared, so the
+        copy never clears the constraints' caches.
+        """
+        attack = Attack(
+            self.goal_function.copy_with_model(model_wrapper),
+            self.pre_transformation_constraints + self.constraints,
+            self.transformation,
+            copy.copy(self.search_method),
+            transformation_cache_size=self.transformation_cache_size,
+            constraint_cache_size=self.constraint_cache_size,
+        )
+        attack._shares_constraints = True
+        return attack
+
     def cpu_(self):
         """Move any `torch.nn.Module` models that are part of Attack to CPU."""
         visited = set()
@@ -356,6 +384,10 @@ class Attack:
         )
         # Sort transformations to ensure order is preserved between runs
         filtered_texts.sort(key=lambda t: t.text)
+        # In lazy lineage mode, only candidates that pass the constraints get
+        # their token diffs computed and their transformations logged.
+        for filtered_text in filtered_texts:
+            filtered_text.materialize_lineage()
         return filtered_texts
 
     def _attack(self, initial_result):
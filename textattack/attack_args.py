@@ -185,6 +185,25 @@ class AttackArgs:
             Disable all logging (except for errors). This is stronger than :obj:`disable_stdout`.
         enable_advance_metrics (:obj:`bool`, `optional`, defaults to :obj:`False`):
             Enable calculation and display of optional advance post-hoc metrics like perplexity, grammar errors, etc.
+        lazy_lineage (:obj:`bool`, `optional`, defaults to :obj:`False`):
+            If :obj:`True`, token-level lineage is only computed and logged for candidates that pass the constraints,
+            instead of for every candidate produced by the transformation.
+        model_cache_path (:obj:`str`, `optional`, defaults to :obj:`None`):
+            Path of a persistent cache of model outputs (an SQLite database). Model outputs stored there are reused
+            across examples, runs and resumed attacks against the same model. If :obj:`None`, model outputs are only
+            cached in memory while attacking each example.
+        num_concurrent_attacks (:obj:`int`, `optional`, defaults to :obj:`1`):
+            Number of examples to attack concurrently in separate threads. Their model queries are merged into shared
+            batches (see :class:`~textattack.models.wrappers.BatchingModelWrapper`), which keeps the model busy
+            when each attack only issues small batches. Examples may finish (and be logged) out of order.
+        max_query_latency (:obj:`float`, `optional`, defaults to :obj:`0.005`):
+            When attacking examples concurrently, the maximum number of seconds a model query waits for queries of
+            other attacks to join its batch.
+        model_server (:obj:`bool`, `optional`, defaults to :obj:`False`):
+            If :obj:`True` and :obj:`parallel` is :obj:`True`, the victim model is run in a single inference server
+            process (see :class:`~textattack.models.wrappers.ModelServer`) that answers the queries of all worker
+            processes in shared batches, instead of being copied into every worker. Also allows parallel attacks
+            without a GPU.
     """
 
     num_examples: int = 10
@@ -206,6 +225,11 @@ class AttackArgs:
     disable_stdout: bool = False
     silent: bool = False
     enable_advance_metrics: bool = False
+    lazy_lineage: bool = False
+    model_cache_path: str = None
+    num_concurrent_attacks: int = 1
+    max_query_latency: float = 0.005
+    model_server: bool = False
 
     def __post_init__(self):
         if self.num_successful_examples:
@@ -230,6 +254,9 @@ class AttackArgs:
         assert (
             self.num_workers_per_device > 0
         ), "`num_workers_per_device` must be greater than 0."
+        assert (
+            self.num_concurrent_attacks > 0
+        ), "`num_concurrent_attacks` must be greater than 0."
 
     @classmethod
     def _add_parser_args(cls, parser):
@@ -371,6 +398,39 @@ class AttackArgs:
             default=default_obj.enable_advance_metrics,
             help="Enable calculation and display of optional advance post-hoc metrics like perplexity, USE distance, etc.",
         )
+        parser.add_argument(
+            "--lazy-lineage",
+            action="store_true",
+            default=default_obj.lazy_lineage,
+            help="Only compute and log token-level lineage for candidates that pass the constraints.",
+        )
+        parser.add_argument(
+            "--model-cache-path",
+            type=str,
+            required=False,
+            default=default_obj.model_cache_path,
+            help="Path of a persistent cache of model outputs that is reused across examples and runs.",
+        )
+        parser.add_argument(
+            "--num-concurrent-attacks",
+            type=int,
+            required=False,
+            default=default_obj.num_concurrent_attacks,
+            help="Number of examples to attack concurrently, merging their model queries into shared batches.",
+        )
+        parser.add_argument(
+            "--max-query-latency",
+            type=float,
+            required=False,
+            default=default_obj.max_query_latency,
+            help="Maximum number of seconds a model query waits for other concurrent attacks' queries to join its batch.",
+        )
+        parser.add_argument(
+            "--model-server",
+            action="store_true",
+            default=default_obj.model_server,
+            help="With `--parallel`, run the victim model in a single inference server process shared by all workers.",
+        )
 
         return parser
 
@@ -4,6 +4,7 @@ Attacker Class
 """
 
 import collections
+import concurrent.futures
 import logging
 import multiprocessing as mp
 import os
@@ -21,6 +22,7 @@ from textattack.attack_results import (
     SkippedAttackResult,
     SuccessfulAttackResult,
 )
+from textattack.shared.le_record import LeRecord
 from textattack.shared.utils import logger
 
 from .attack import Attack
@@ -154,66 +156,111 @@ class Attacker:
             num_skipped = 0
             num_successes = 0
 
-        sample_exhaustion_warned = False
-        while worklist:
-            idx = worklist.popleft()
-            try:
-                example, ground_truth_output = self.dataset[idx]
-            except IndexError:
-                continue
-            example = textattack.shared.AttackedText(example)
-            if self.dataset.label_names is not None:
-                example.attack_attrs["label_names"] = self.dataset.label_names
-            try:
-                result = self.attack.attack(example, ground_truth_output)
-            except Exception as e:
-                raise e
-            if (
-                isinstance(result, SkippedAttackResult) and self.attack_args.attack_n
-            ) or (
-                not isinstance(result, SuccessfulAttackResult)
-                and self.attack_args.num_successful_examples
-            ):
-                if worklist_candidates:
-                    next_sample = worklist_candidates.popleft()
-                    worklist.append(next_sample)
-                else:
-                    if not sample_exhaustion_warned:
-                        logger.warn("Ran out of samples to attack!")
-                        sample_exhaustion_warned = True
-            else:
-                pbar.update(1)
-
-            self.attack_log_manager.log_result(result)
-            if not self.attack_args.disable_stdout and not self.attack_args.silent:
-                print("\n")
-            num_results += 1
-
-            if isinstance(result, SkippedAttackResult):
-                num_skipped += 1
-            if isinstance(result, (SuccessfulAttackResult, MaximizedAttackResult)):
-                num_successes += 1
-            if isinstance(result, FailedAttackResult):
-                num_failures += 1
-            pbar.set_description(
-                f"[Succeeded / Failed / Skipped / Total] {num_successes} / {num_failures} / {num_skipped} / {num_results}"
+        num_concurrent_attacks = self.attack_args.num_concurrent_attacks
+        if num_concurrent_attacks > 1:
+            # Attack several examples at once in threads, each with its own
+            # copy of the attack, and merge their model queries into batches.
+            model_wrapper = textattack.models.wrappers.BatchingModelWrapper(
+                self.attack.goal_function.model,
+                max_latency=self.attack_args.max_query_latency,
+                num_clients=num_concurrent_attacks,
             )
+            idle_attacks = queue.Queue()
+            for _ in range(num_concurrent_attacks):
+                idle_attacks.put(self.attack.copy_with_model(model_wrapper))
+            executor = concurrent.futures.ThreadPoolExecutor(num_concurrent_attacks)
+        # Indices of the examples being attacked concurrently, by future.
+        in_flight = collections.OrderedDict()
 
-            if (
-                self.attack_args.checkpoint_interval
-                and len(self.attack_log_manager.results)
-                % self.attack_args.checkpoint_interval
-                == 0
-            ):
-                new_checkpoint = textattack.shared.AttackCheckpoint(
-                    self.attack_args,
-                    self.attack_log_manager,
-                    worklist,
-                    worklist_candidates,
+        try:
+            sample_exhaustion_warned = False
+            while worklist or in_flight:
+                if num_concurrent_attacks > 1:
+                    while worklist and len(in_flight) < num_concurrent_attacks:
+                        idx = worklist.popleft()
+                        example = self._get_example(idx)
+                        if example is None:
+                            continue
+                        future = executor.submit(
+                            _attack_with_idle_attack, idle_attacks, *example
+                        )
+                        in_flight[future] = idx
+                    if not in_flight:
+                        continue
+                    done, _ = concurrent.futures.wait(
+                        in_flight, return_when=concurrent.futures.FIRST_COMPLETED
+                    )
+                    future = next(iter(done))
+                    del in_flight[future]
+                    result = future.result()
+                else:
+                    idx = worklist.popleft()
+                    example = self._get_example(idx)
+                    if example is None:
+                        continue
+                    try:
+                        result = self.attack.attack(*example)
+                    except Exception as e:
+                        raise e
+                if (
+                    isinstance(result, SkippedAttackResult)
+                    and self.attack_args.attack_n
+                ) or (
+                    not isinstance(result, SuccessfulAttackResult)
+                    and self.attack_args.num_successful_examples
+                ):
+                    if worklist_candidates:
+                        next_sample = worklist_candidates.popleft()
+                        worklist.append(next_sample)
+                    else:
+                        if not sample_exhaustion_warned:
+                            logger.warn("Ran out of samples to attack!")
+                            sample_exhaustion_warned = True
+                else:
+                    pbar.update(1)
+
+                self.attack_log_manager.log_result(result)
+                if not self.attack_args.disable_stdout and not self.attack_args.silent:
+                    print("\n")
+                num_results += 1
+
+                if isinstance(result, SkippedAttackResult):
+                    num_skipped += 1
+                if isinstance(result, (SuccessfulAttackResult, MaximizedAttackResult)):
+                    num_successes += 1
+                if isinstance(result, FailedAttackResult):
+                    num_failures += 1
+                pbar.set_description(
+                    f"[Succeeded / Failed / Skipped / Total] {num_successes} / {num_failures} / {num_skipped} / {num_results}"
                 )
-                new_checkpoint.save()
-                self.attack_log_manager.flush()
 
+                if (
+                    self.attack_args.checkpoint_interval
+                    and len(self.attack_log_manager.results)
+                    % self.attack_args.checkpoint_interval
+                    == 0
+                ):
+                    # Examples still being attacked are attacked again on resume.
+                    new_checkpoint = textattack.shared.AttackCheckpoint(
+                        self.attack_args,
+                        self.attack_log_manager,
+                        collections.deque(list(in_flight.values()) + list(worklist)),
+                        worklist_candidates,
+                    )
+                    new_checkpoint.save()
+                    self.attack_log_manager.flush()
+        finally:
+            if num_concurrent_attacks > 1:
+                # Let the attacks still in flight finish, then stop the
+                # thread that merges their queries.
+                executor.shutdown()
+                model_wrapper.close()
+
+        if num_concurrent_attacks > 1:
+            logger.info(
+                f"Merged model queries of {num_concurrent_attacks} concurrent attacks into batches of "
+                f"{model_wrapper.mean_batch_size:.1f} inputs on average."
+            )
         pbar.close()
         print()
         # Enable summary stdout
@@ -227,6 +274,18 @@ class Attacker:
         self.attack_log_manager.flush()
         print()
 
+    def _get_example(self, idx):
+        """Returns the ``AttackedText`` and ground truth output of example
+        ``idx`` of the dataset, or ``None`` if there is no such example."""
+        try:
+            example, ground_truth_output = self.dataset[idx]
+        except IndexError:
+            return None
+        example = textattack.shared.AttackedText(example)
+        if self.dataset.label_names is not None:
+            example.attack_attrs["label_names"] = self.dataset.label_names
+        return example, ground_truth_output
+
     def _attack_parallel(self):
         pytorch_multiprocessing_workaround()
 
@@ -275,6 +334,9 @@ class Attacker:
 
         # We reserve the first GPU for coordinating workers.
         num_gpus = torch.cuda.device_count()
+        if self.attack_args.model_server:
+            # Without GPUs, workers only run the search on the CPU.
+            num_gpus = max(num_gpus, 1)
         num_workers = self.attack_args.num_workers_per_device * num_gpus
         logger.info(f"Running {num_workers} worker(s) on {num_gpus} GPU(s).")
 
@@ -285,109 +347,138 @@ class Attacker:
         self.attack.cpu_()
         torch.cuda.empty_cache()
 
-        # Start workers.
-        worker_pool = torch.multiprocessing.Pool(
-            num_workers,
-            attack_from_queue,
-            (
-                self.attack,
-                self.attack_args,
-                num_gpus,
-                mp.Value("i", 1, lock=False),
-                lock,
-                in_queue,
-                out_queue,
-            ),
-        )
+        # Workers log lineage to their own shards, which are merged once they finish.
+        LeRecord.clear_lineage_shards()
+
+        attack = self.attack
+        model_server = None
+        if self.attack_args.model_server:
+            # Workers get a copy of the attack that queries the server instead
+            # of holding their own copy of the victim model.
+            model_server = textattack.models.wrappers.ModelServer(
+                self.attack.goal_function.model,
+                num_clients=num_workers,
+                max_latency=self.attack_args.max_query_latency,
+            )
+            model_server.start()
+            attack = self.attack.copy_with_model(model_server.client())
 
-        # Log results asynchronously and update progress bar.
-        if self._checkpoint:
-            num_results = self._checkpoint.results_count
-            num_failures = self._checkpoint.num_failed_attacks
-            num_skipped = self._checkpoint.num_skipped_attacks
-            num_successes = self._checkpoint.num_successful_attacks
-        else:
-            num_results = 0
-            num_failures = 0
-            num_skipped = 0
-            num_successes = 0
+        try:
+            # Start workers.
+            worker_pool = torch.multiprocessing.Pool(
+                num_workers,
+                attack_from_queue,
+                (
+                    attack,
+                    self.attack_args,
+                    LeRecord.lineage_dirname,
+                    num_gpus,
+                    mp.Value("i", 1, lock=False),
+                    lock,
+                    in_queue,
+                    out_queue,
+                ),
+            )
 
-        logger.info(f"Worklist size: {len(worklist)}")
-        logger.info(f"Worklist candidate size: {len(worklist_candidates)}")
+            # Log results asynchronously and update progress bar.
+            if self._checkpoint:
+                num_results = self._checkpoint.results_count
+                num_failures = self._checkpoint.num_failed_attacks
+                num_skipped = self._checkpoint.num_skipped_attacks
+                num_successes = self._checkpoint.num_successful_attacks
+            else:
+                num_results = 0
+                num_failures = 0
+                num_skipped = 0
+                num_successes = 0
 
-        sample_exhaustion_warned = False
-        pbar = tqdm.tqdm(total=num_remaining_attacks, smoothing=0, dynamic_ncols=True)
-        while worklist:
-            idx, result = out_queue.get(block=True)
-            worklist.remove(idx)
+            logger.info(f"Worklist size: {len(worklist)}")
+            logger.info(f"Worklist candidate size: {len(worklist_candidates)}")
 
-            if isinstance(result, tuple) and isinstance(result[0], Exception):
-                logger.error(
-                    f'Exception encountered for input "{self.dataset[idx][0]}".'
-                )
-                error_trace = result[1]
-                logger.error(error_trace)
-                in_queue.close()
-                in_queue.join_thread()
-                out_queue.close()
-                out_queue.join_thread()
-                worker_pool.terminate()
-                worker_pool.join()
-                return
-            elif (
-                isinstance(result, SkippedAttackResult) and self.attack_args.attack_n
-            ) or (
-                not isinstance(result, SuccessfulAttackResult)
-                and self.attack_args.num_successful_examples
-            ):
-                if worklist_candidates:
-                    next_sample = worklist_candidates.popleft()
-                    example, ground_truth_output = self.dataset[next_sample]
-                    example = textattack.shared.AttackedText(example)
-                    if self.dataset.label_names is not None:
-                        example.attack_attrs["label_names"] = self.dataset.label_names
-                    worklist.append(next_sample)
-                    in_queue.put((next_sample, example, ground_truth_output))
-                else:
-                    if not sample_exhaustion_warned:
-                        logger.warn("Ran out of samples to attack!")
-                        sample_exhaustion_warned = True
-            else:
-                pbar.update()
-
-            self.attack_log_manager.log_result(result)
-            num_results += 1
-
-            if isinstance(result, SkippedAttackResult):
-                num_skipped += 1
-            if isinstance(result, (SuccessfulAttackResult, MaximizedAttackResult)):
-                num_successes += 1
-            if isinstance(result, FailedAttackResult):
-                num_failures += 1
-            pbar.set_description(
-                f"[Succeeded / Failed / Skipped / Total] {num_successes} / {num_failures} / {num_skipped} / {num_results}"
+            sample_exhaustion_warned = False
+            pbar = tqdm.tqdm(
+                total=num_remaining_attacks, smoothing=0, dynamic_ncols=True
             )
-
-            if (
-                self.attack_args.checkpoint_interval
-                and len(self.attack_log_manager.results)
-                % self.attack_args.checkpoint_interval
-                == 0
-            ):
-                new_checkpoint = textattack.shared.AttackCheckpoint(
-                    self.attack_args,
-                    self.attack_log_manager,
-                    worklist,
-                    worklist_candidates,
+            while worklist:
+                idx, result = out_queue.get(block=True)
+                worklist.remove(idx)
+
+                if isinstance(result, tuple) and isinstance(result[0], Exception):
+                    logger.error(
+                        f'Exception encountered for input "{self.dataset[idx][0]}".'
+                    )
+                    error_trace = result[1]
+                    logger.error(error_trace)
+                    in_queue.close()
+                    in_queue.join_thread()
+                    out_queue.close()
+                    out_queue.join_thread()
+                    worker_pool.terminate()
+                    worker_pool.join()
+                    return
+                elif (
+                    isinstance(result, SkippedAttackResult)
+                    and self.attack_args.attack_n
+                ) or (
+                    not isinstance(result, SuccessfulAttackResult)
+                    and self.attack_args.num_successful_examples
+                ):
+                    if worklist_candidates:
+                        next_sample = worklist_candidates.popleft()
+                        example, ground_truth_output = self.dataset[next_sample]
+                        example = textattack.shared.AttackedText(example)
+                        if self.dataset.label_names is not None:
+                            example.attack_attrs[
+                                "label_names"
+                            ] = self.dataset.label_names
+                        worklist.append(next_sample)
+                        in_queue.put((next_sample, example, ground_truth_output))
+                    else:
+                        if not sample_exhaustion_warned:
+                            logger.warn("Ran out of samples to attack!")
+                            sample_exhaustion_warned = True
+                else:
+                    pbar.update()
+
+                self.attack_log_manager.log_result(result)
+                num_results += 1
+
+                if isinstance(result, SkippedAttackResult):
+                    num_skipped += 1
+                if isinstance(result, (SuccessfulAttackResult, MaximizedAttackResult)):
+                    num_successes += 1
+                if isinstance(result, FailedAttackResult):
+                    num_failures += 1
+                pbar.set_description(
+                    f"[Succeeded / Failed / Skipped / Total] {num_successes} / {num_failures} / {num_skipped} / {num_results}"
                 )
-                new_checkpoint.save()
-                self.attack_log_manager.flush()
 
-        # Send sentinel values to worker processes
-        for _ in range(num_workers):
-            in_queue.put(("END", "END", "END"))
-        worker_pool.close()
-        worker_pool.join()
+                if (
+                    self.attack_args.checkpoint_interval
+                    and len(self.attack_log_manager.results)
+                    % self.attack_args.checkpoint_interval
+                    == 0
+                ):
+                    new_checkpoint = textattack.shared.AttackCheckpoint(
+                        self.attack_args,
+                        self.attack_log_manager,
+                        worklist,
+                        worklist_candidates,
+                    )
+                    new_checkpoint.save()
+                    self.attack_log_manager.flush()
+
+            # Send sentinel values to worker processes
+            for _ in range(num_workers):
+                in_queue.put(("END", "END", "END"))
+            worker_pool.close()
+            worker_pool.join()
+        finally:
+            if model_server is not None:
+                model_server.stop()
+            # Also merge the shards of workers that stopped on an error, so
+            # that no shard files are left behind.
+            LeRecord.merge_lineage_shards()
 
         pbar.close()
         print()
@@ -414,12 +505,18 @@ class Attacker:
         if self.attack_args.query_budget:
             self.attack.goal_function.query_budget = self.attack_args.query_budget
 
+        if self.attack_args.model_cache_path:
+            self.attack.goal_function.model_cache_path = (
+                self.attack_args.model_cache_path
+            )
+
         if not self.attack_log_manager:
             self.attack_log_manager = AttackArgs.create_loggers_from_args(
                 self.attack_args
             )
 
         textattack.shared.utils.set_seed(self.attack_args.random_seed)
+        LeRecord.lazy_lineage = self.attack_args.lazy_lineage
         if self.dataset.shuffled and self.attack_args.checkpoint_interval:
             # Not allowed b/c we cannot recover order of shuffled data
             raise ValueError(
@@ -431,14 +528,28 @@ class Attacker:
             if self.attack_args.num_examples == -1
             else self.attack_args.num_examples
         )
-        if self.attack_args.parallel:
-            if torch.cuda.device_count() == 0:
-                raise Exception(
-                    "Found no GPU on your system. To run attacks in parallel, GPU is required."
-                )
-            self._attack_parallel()
-        else:
-            self._attack()
+        try:
+            if self.attack_args.parallel:
+                if (
+                    torch.cuda.device_count() == 0
+                    and not self.attack_args.model_server
+                ):
+                    raise Exception(
+                        "Found no GPU on your system. To run attacks in parallel, GPU is required."
+                    )
+                self._attack_parallel()
+            else:
+                self._attack()
+                model_cache = self.attack.goal_function.persistent_cache
+                if model_cache is not None:
+                    stats = model_cache.stats()
+                    logger.info(
+                        f"Persistent model cache: {stats['hits']} hits, {stats['misses']} misses "
+                        f"({stats['hit_rate']:.1%} hit rate)."
+                    )
+        finally:
+            # Make sure every lineage row logged during the attack is on disk.
+            LeRecord.flush_lineage()
 
         if self.attack_args.silent:
             logger.setLevel(logging.INFO)
@@ -536,7 +647,8 @@ def set_env_variables(gpu_id):
     # TODO: Using USE with `--parallel` raises similar issue as https://github.com/tensorflow/tensorflow/issues/38518#
     os.environ["CUDA_VISIBLE_DEVICES"] = str(gpu_id)
     # For PyTorch
-    torch.cuda.set_device(gpu_id)
+    if torch.cuda.is_available():
+        torch.cuda.set_device(gpu_id)
 
     # Fix TensorFlow GPU memory growth
     try:
@@ -555,17 +667,36 @@ def set_env_variables(gpu_id):
         pass
 
 
+def _attack_with_idle_attack(idle_attacks, example, ground_truth_output):
+    attack = idle_attacks.get()
+    try:
+        return attack.attack(example, ground_truth_output)
+    finally:
+        idle_attacks.put(attack)
+
+
 def attack_from_queue(
-    attack, attack_args, num_gpus, first_to_start, lock, in_queue, out_queue
+    attack,
+    attack_args,
+    lineage_dirname,
+    num_gpus,
+    first_to_start,
+    lock,
+    in_queue,
+    out_queue,
 ):
     assert isinstance(
         attack, Attack
     ), f"`attack` must be of type `Attack`, but got type `{type(attack)}`."
 
-    gpu_id = (torch.multiprocessing.current_process()._identity[0] - 1) % num_gpus
+    worker_id = torch.multiprocessing.current_process()._identity[0]
+    gpu_id = (worker_id - 1) % num_gpus
     set_env_variables(gpu_id)
     textattack.shared.utils.set_seed(attack_args.random_seed)
-    if torch.multiprocessing.current_process()._identity[0] > 1:
+    # Write lineage to this worker's own shard with worker-prefixed ids.
+    LeRecord.configure_lineage(dirname=lineage_dirname, shard=worker_id)
+    LeRecord.lazy_lineage = attack_args.lazy_lineage
+    if worker_id > 1:
         logging.disable()
 
     attack.cuda_()
@@ -586,6 +717,12 @@ def attack_from_queue(
             i, example, ground_truth_output = in_queue.get(timeout=5)
             if i == "END" and example == "END" and ground_truth_output == "END":
                 # End process when sentinel value is received
+                LeRecord.flush_lineage()
+                model_wrapper = attack.goal_function.model
+                if isinstance(
+                    model_wrapper, textattack.models.wrappers.RemoteModelWrapper
+                ):
+                    model_wrapper.close()
                 break
             else:
                 result = attack.attack(example, ground_truth_output)
@@ -594,4 +731,10 @@ def attack_from_queue(
             if isinstance(e, queue.Empty):
                 continue
             else:
-                out_queue.put((i, (e, traceback.format_exc())))
+                error = (e, traceback.format_exc())
+                # The main process stops the workers on an error, so the rows
+                # logged so far must be on disk before it is reported.
+                try:
+                    LeRecord.flush_lineage()
+                finally:
+                    out_queue.put((i, error))
@@ -7,6 +7,7 @@ GPT2 Language Models:
 
 import os
 
+import lru
 import torch
 
 from textattack.shared import utils
@@ -23,11 +24,16 @@ class GPT2(LanguageModelConstraint):
     from "Better Language Models and Their Implications"
     (openai.com/blog/better-language-models/)
 
+    Siblings that swap the same word of a text share the prefix before that
+    word, so the model's predictions after each prefix are cached and computed
+    once for all of them. Saved work is counted in ``self.prefix_reuse_stats``.
+
     Args:
         model_name: id of GPT2 model
+        prefix_cache_size: number of prefixes whose predictions are cached
     """
 
-    def __init__(self, model_name="gpt2", **kwargs):
+    def __init__(self, model_name="gpt2", prefix_cache_size=2 ** 6, **kwargs):
         import transformers
 
         # re-enable notifications
@@ -35,8 +41,16 @@ class GPT2(LanguageModelConstraint):
         self.model = transformers.GPT2LMHeadModel.from_pretrained(model_name)
         self.model.to(utils.device)
         self.tokenizer = transformers.GPT2Tokenizer.from_pretrained(model_name)
+        self.prefix_cache_size = prefix_cache_size
+        self._prefix_cache = lru.LRU(prefix_cache_size)
+        self.prefix_reuse_stats = utils.PrefixReuseStats(
+            flops_per_token=2 * self.model.num_parameters()
+        )
         super().__init__(**kwargs)
 
+    def clear_cache(self):
+        self._prefix_cache.clear()
+
     def get_log_probs_at_index(self, text_list, word_index):
         """Gets the probability of the word at index `word_index` according to
         GPT-2.
@@ -52,13 +66,22 @@ class GPT2(LanguageModelConstraint):
             # log-probability 0.0.
             return torch.zeros(len(text_list), dtype=torch.float)
 
-        token_ids = self.tokenizer.encode(prefix)
-        tokens_tensor = torch.tensor([token_ids])
-        tokens_tensor = tokens_tensor.to(utils.device)
-
-        with torch.no_grad():
-            outputs = self.model(tokens_tensor)
-        predictions = outputs[0]
+        cached = self._prefix_cache.get(prefix)
+        if cached is not None:
+            predictions, num_tokens = cached
+            self.prefix_reuse_stats.record(1, num_tokens, num_tokens)
+        else:
+            token_ids = self.tokenizer.encode(prefix)
+            tokens_tensor = torch.tensor([token_ids])
+            tokens_tensor = tokens_tensor.to(utils.device)
+
+            with torch.no_grad():
+                outputs = self.model(tokens_tensor)
+            # Only the predictions for the next token are used.
+            predictions = outputs[0][:, -1:].clone()
+            num_tokens = len(token_ids)
+            self._prefix_cache[prefix] = (predictions, num_tokens)
+            self.prefix_reuse_stats.record(1, num_tokens, 0)
 
         probs = []
         for attacked_text in text_list:
@@ -67,3 +90,12 @@ class GPT2(LanguageModelConstraint):
             probs.append(next_word_prob)
 
         return probs
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_prefix_cache"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__ = state
+        self._prefix_cache = lru.LRU(self.prefix_cache_size)
@@ -38,6 +38,10 @@ class PartOfSpeech(Constraint):
             (available choices: "eng", "rus")
         language_stanza: Language to be used for stanza POS-Tagger
             (available choices: https://stanfordnlp.github.io/stanza/available_models.html)
+        pos_lexicon (Union[str|:class:`~textattack.shared.PosLexicon`], optional): Lexicon (or path of a saved
+            lexicon) of the possible parts of speech of each word, built with the same tagset, which is checked if
+            the lexicon records it. Swaps where no part of speech of the new word can replace any part of speech of
+            the original word are rejected without running the tagger. Words not in the lexicon are always tagged.
     """
 
     def __init__(
@@ -48,6 +52,7 @@ class PartOfSpeech(Constraint):
         compare_against_original=True,
         language_nltk="eng",
         language_stanza="en",
+        pos_lexicon=None,
     ):
         super().__init__(compare_against_original)
         self.tagger_type = tagger_type
@@ -55,6 +60,14 @@ class PartOfSpeech(Constraint):
         self.allow_verb_noun_swap = allow_verb_noun_swap
         self.language_nltk = language_nltk
         self.language_stanza = language_stanza
+        if isinstance(pos_lexicon, str):
+            pos_lexicon = textattack.shared.PosLexicon.load(pos_lexicon)
+        if pos_lexicon is not None and pos_lexicon.tagset not in (None, tagset):
+            raise ValueError(
+                f"`pos_lexicon` was built with tagset {pos_lexicon.tagset}, "
+                f"but the constraint uses tagset {tagset}."
+            )
+        self.pos_lexicon = pos_lexicon
 
         self._pos_tag_cache = lru.LRU(2 ** 14)
         if tagger_type == "flair":
@@ -78,41 +91,81 @@ class PartOfSpeech(Constraint):
             self.allow_verb_noun_swap and set([pos_a, pos_b]) <= set(["NOUN", "VERB"])
         )
 
-    def _get_pos(self, before_ctx, word, after_ctx):
-        context_words = before_ctx + [word] + after_ctx
-        context_key = " ".join(context_words)
-        if context_key in self._pos_tag_cache:
-            word_list, pos_list = self._pos_tag_cache[context_key]
-        else:
-            if self.tagger_type == "nltk":
-                word_list, pos_list = zip(
-                    *nltk.pos_tag(
-                        context_words, tagset=self.tagset, lang=self.language_nltk
-                    )
-                )
+    def _lexicon_rejects(self, reference_word, transformed_word):
+        """Returns ``True`` if the lexicon shows that ``transformed_word``
+        can never take a part of speech of ``reference_word``."""
+        if self.pos_lexicon is None:
+            return False
+        reference_tags = self.pos_lexicon.tags(reference_word)
+        transformed_tags = self.pos_lexicon.tags(transformed_word)
+        if reference_tags is None or transformed_tags is None:
+            return False
+        return not any(
+            self._can_replace_pos(pos_a, pos_b)
+            for pos_a in reference_tags
+            for pos_b in transformed_tags
+        )
 
-            if self.tagger_type == "flair":
-                context_key_sentence = Sentence(
-                    context_key, use_tokenizer=textattack.shared.utils.words_from_text
-                )
-                self._flair_pos_tagger.predict(context_key_sentence)
-                word_list, pos_list = textattack.shared.utils.zip_flair_result(
-                    context_key_sentence
+    def _pos_tag_many(self, context_word_lists):
+        """Tags each list of words in ``context_word_lists`` with one batched
+        call to the tagger, and returns a ``(word_list, pos_list)`` pair for
+        each."""
+        if self.tagger_type == "nltk":
+            return [
+                tuple(zip(*tagged))
+                for tagged in nltk.pos_tag_sents(
+                    context_word_lists, tagset=self.tagset, lang=self.language_nltk
                 )
+            ]
 
-            if self.tagger_type == "stanza":
-                word_list, pos_list = textattack.shared.utils.zip_stanza_result(
-                    self._stanza_pos_tagger(context_key), tagset=self.tagset
-                )
+        if self.tagger_type == "flair":
+            # The contexts are already split into words, which flair takes as
+            # tokens as they are.
+            sentences = [
+                Sentence(list(context_words)) for context_words in context_word_lists
+            ]
+            self._flair_pos_tagger.predict(sentences)
+            return [
+                textattack.shared.utils.zip_flair_result(sentence)
+                for sentence in sentences
+            ]
 
-            self._pos_tag_cache[context_key] = (word_list, pos_list)
+        if self.tagger_type == "stanza":
+            # With pretokenized input, each line is tagged as its own sentence.
+            doc = self._stanza_pos_tagger(
+                "\n".join(" ".join(words) for words in context_word_lists)
+            )
+            results = []
+            for sentence in doc.sentences:
+                word_list = [word.text for word in sentence.words]
+                if self.tagset == "universal":
+                    pos_list = [word.upos for word in sentence.words]
+                else:
+                    pos_list = [word.xpos for word in sentence.words]
+                results.append((word_list, pos_list))
+            return results
+
+    def _get_pos(self, before_ctx, word, after_ctx, tagged=None):
+        context_words = before_ctx + [word] + after_ctx
+        context_key = " ".join(context_words)
+        # Look entries up with a single ``get``, as the cache may be shared
+        # with attacks running in other threads.
+        result = tagged.get(context_key) if tagged is not None else None
+        if result is None:
+            result = self._pos_tag_cache.get(context_key)
+        if result is None:
+            result = self._pos_tag_many([context_words])[0]
+            self._pos_tag_cache[context_key] = result
+        word_list, pos_list = result
 
         # idx of `word` in `context_words`
         assert word in word_list, "POS list not matched with original word list."
         word_idx = word_list.index(word)
         return pos_list[word_idx]
 
-    def _check_constraint(self, transformed_text, reference_text):
+    def _contexts(self, transformed_text, reference_text):
+        """Yields the context before, reference word, transformed word and
+        context after of each newly modified word of ``transformed_text``."""
         try:
             indices = transformed_text.attack_attrs["newly_modified_indices"]
         except KeyError:
@@ -127,13 +180,60 @@ class PartOfSpeech(Constraint):
             after_ctx = reference_text.words[
                 i + 1 : min(i + 4, len(reference_text.words))
             ]
-            ref_pos = self._get_pos(before_ctx, reference_word, after_ctx)
-            replace_pos = self._get_pos(before_ctx, transformed_word, after_ctx)
+            yield before_ctx, reference_word, transformed_word, after_ctx
+
+    def _check_constraint(self, transformed_text, reference_text, tagged=None):
+        contexts = list(self._contexts(transformed_text, reference_text))
+        if any(self._lexicon_rejects(c[1], c[2]) for c in contexts):
+            return False
+        for before_ctx, reference_word, transformed_word, after_ctx in contexts:
+            ref_pos = self._get_pos(before_ctx, reference_word, after_ctx, tagged)
+            replace_pos = self._get_pos(before_ctx, transformed_word, after_ctx, tagged)
             if not self._can_replace_pos(ref_pos, replace_pos):
                 return False
 
         return True
 
+    def _check_constraint_many(self, transformed_texts, reference_text):
+        """Filters ``transformed_texts``, tagging all of the distinct
+        contexts of their modified words that are not cached yet in one
+        batched tagger call."""
+        if self.pos_lexicon is not None:
+            transformed_texts = [
+                transformed_text
+                for transformed_text in transformed_texts
+                if not any(
+                    self._lexicon_rejects(c[1], c[2])
+                    for c in self._contexts(transformed_text, reference_text)
+                )
+            ]
+
+        untagged = {}
+        for transformed_text in transformed_texts:
+            contexts = self._contexts(transformed_text, reference_text)
+            for before_ctx, reference_word, transformed_word, after_ctx in contexts:
+                for word in (reference_word, transformed_word):
+                    context_words = before_ctx + [word] + after_ctx
+                    context_key = " ".join(context_words)
+                    if context_key not in self._pos_tag_cache:
+                        untagged[context_key] = context_words
+
+        # Also keep this call's tags aside, in case there are more of them
+        # than the cache can hold.
+        tagged = {}
+        if untagged:
+            for context_key, result in zip(
+                untagged, self._pos_tag_many(list(untagged.values()))
+            ):
+                tagged[context_key] = result
+                self._pos_tag_cache[context_key] = result
+
+        return [
+            transformed_text
+            for transformed_text in transformed_texts
+            if self._check_constraint(transformed_text, reference_text, tagged)
+        ]
+
     def check_compatibility(self, transformation):
         return transformation_consists_of_word_swaps(transformation)
 
@@ -6,6 +6,7 @@ Sentence Encoder Class
 from abc import ABC
 import math
 
+import lru
 import numpy as np
 import torch
 
@@ -26,6 +27,10 @@ class SentenceEncoder(Constraint, ABC):
         window_size (int): The number of words to use in the similarity
             comparison. `None` indicates no windowing (encoding is based on the
             full input).
+        embedding_cache_size (int): The number of encoded texts (or text windows)
+            whose embeddings are kept, so that texts seen in previous calls
+            (e.g. the starting text's windows) are not encoded again. Must be
+            at least 1.
     """
 
     def __init__(
@@ -35,12 +40,17 @@ class SentenceEncoder(Constraint, ABC):
         compare_against_original=True,
         window_size=None,
         skip_text_shorter_than_window=False,
+        embedding_cache_size=2 ** 14,
     ):
         super().__init__(compare_against_original)
         self.metric = metric
         self.threshold = threshold
         self.window_size = window_size
         self.skip_text_shorter_than_window = skip_text_shorter_than_window
+        if embedding_cache_size < 1:
+            raise ValueError("`embedding_cache_size` must be at least 1.")
+        self.embedding_cache_size = embedding_cache_size
+        self._embedding_cache = lru.LRU(embedding_cache_size)
 
         if not self.window_size:
             self.window_size = float("inf")
@@ -65,6 +75,35 @@ class SentenceEncoder(Constraint, ABC):
         """
         raise NotImplementedError()
 
+    def _encode_cached(self, sentences):
+        """Returns the embeddings of ``sentences`` as a 2-D tensor, like
+        ``encode``, but only encodes each distinct sentence that is not in
+        the embedding cache, in a single call."""
+        # Read cached embeddings before encoding the missing sentences, whose
+        # insertion may evict them. Each entry is looked up with a single
+        # ``get``, as the cache may be shared with attacks in other threads.
+        embeddings = {}
+        missing = []
+        for sentence in dict.fromkeys(sentences):
+            embedding = self._embedding_cache.get(sentence)
+            if embedding is None:
+                missing.append(sentence)
+            else:
+                embeddings[sentence] = embedding
+        if missing:
+            new_embeddings = self.encode(missing)
+            if not isinstance(new_embeddings, torch.Tensor):
+                new_embeddings = torch.tensor(new_embeddings)
+            for sentence, embedding in zip(missing, new_embeddings):
+                # Copy the row, so that the cache does not keep the whole
+                # batch alive.
+                embeddings[sentence] = embedding.clone()
+                self._embedding_cache[sentence] = embeddings[sentence]
+        return torch.stack([embeddings[sentence] for sentence in sentences])
+
+    def clear_cache(self):
+        self._embedding_cache.clear()
+
     def _sim_score(self, starting_text, transformed_text):
         """Returns the metric similarity between the embedding of the starting
         text and the transformed text.
@@ -92,16 +131,10 @@ class SentenceEncoder(Constraint, ABC):
             modified_index, self.window_size
         )
 
-        starting_embedding, transformed_embedding = self.model.encode(
+        starting_embedding, transformed_embedding = self._encode_cached(
             [starting_text_window, transformed_text_window]
         )
 
-        if not isinstance(starting_embedding, torch.Tensor):
-            starting_embedding = torch.tensor(starting_embedding)
-
-        if not isinstance(transformed_embedding, torch.Tensor):
-            transformed_embedding = torch.tensor(transformed_embedding)
-
         starting_embedding = torch.unsqueeze(starting_embedding, dim=0)
         transformed_embedding = torch.unsqueeze(transformed_embedding, dim=0)
 
@@ -149,17 +182,17 @@ class SentenceEncoder(Constraint, ABC):
                         modified_index, self.window_size
                     )
                 )
-            embeddings = self.encode(starting_text_windows + transformed_text_windows)
-            if not isinstance(embeddings, torch.Tensor):
-                embeddings = torch.tensor(embeddings)
+            # The starting text windows repeat across candidates that modify
+            # the same index, and across calls; each is only encoded once.
+            embeddings = self._encode_cached(
+                starting_text_windows + transformed_text_windows
+            )
             starting_embeddings = embeddings[: len(transformed_texts)]
             transformed_embeddings = embeddings[len(transformed_texts) :]
         else:
             starting_raw_text = starting_text.text
             transformed_raw_texts = [t.text for t in transformed_texts]
-            embeddings = self.encode([starting_raw_text] + transformed_raw_texts)
-            if not isinstance(embeddings, torch.Tensor):
-                embeddings = torch.tensor(embeddings)
+            embeddings = self._encode_cached([starting_raw_text] + transformed_raw_texts)
 
             starting_embedding = embeddings[0]
 
@@ -202,6 +235,15 @@ class SentenceEncoder(Constraint, ABC):
         transformed_text.attack_attrs["similarity_score"] = score
         return score >= self.threshold
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_embedding_cache"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__ = state
+        self._embedding_cache = lru.LRU(self.embedding_cache_size)
+
     def extra_repr_keys(self):
         return [
             "metric",
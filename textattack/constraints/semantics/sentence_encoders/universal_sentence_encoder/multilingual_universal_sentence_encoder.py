@@ -33,10 +33,10 @@ class MultilingualUniversalSentenceEncoder(SentenceEncoder):
         return self.model(sentences).numpy()
 
     def __getstate__(self):
-        state = self.__dict__.copy()
+        state = super().__getstate__()
         state["model"] = None
         return state
 
     def __setstate__(self, state):
-        self.__dict__ = state
+        super().__setstate__(state)
         self.model = hub.load(self._tfhub_url)
@@ -31,10 +31,10 @@ class UniversalSentenceEncoder(SentenceEncoder):
         return self.model(sentences).numpy()
 
     def __getstate__(self):
-        state = self.__dict__.copy()
+        state = super().__getstate__()
         state["model"] = None
         return state
 
     def __setstate__(self, state):
-        self.__dict__ = state
+        super().__setstate__(state)
         self.model = None
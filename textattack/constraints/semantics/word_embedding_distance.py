@@ -3,6 +3,8 @@ Word Embedding Distance
 --------------------------
 """
 
+import numpy as np
+
 from textattack.constraints import Constraint
 from textattack.shared import AbstractWordEmbedding, WordEmbedding
 from textattack.shared.validators import transformation_consists_of_word_swaps
@@ -56,9 +58,19 @@ class WordEmbeddingDistance(Constraint):
         """Returns the MSE distance of words with IDs a and b."""
         return self.embedding.get_mse_dist(a, b)
 
-    def _check_constraint(self, transformed_text, reference_text):
-        """Returns true if (``transformed_text`` and ``reference_text``) are
-        closer than ``self.min_cos_sim`` or ``self.max_mse_dist``."""
+    def get_cos_sim_many(self, a, bs):
+        """Returns the cosine similarities of words with IDs a and each of
+        bs."""
+        return self.embedding.get_cos_sim_many(a, bs)
+
+    def get_mse_dist_many(self, a, bs):
+        """Returns the MSE distances of words with IDs a and each of bs."""
+        return self.embedding.get_mse_dist_many(a, bs)
+
+    def _word_id_pairs(self, transformed_text, reference_text):
+        """Returns the ids of the (reference word, transformed word) pairs
+        that ``transformed_text`` has to be checked on, or ``None`` if it
+        fails the constraint regardless of their distances."""
         try:
             indices = transformed_text.attack_attrs["newly_modified_indices"]
         except KeyError:
@@ -71,8 +83,9 @@ class WordEmbeddingDistance(Constraint):
             i >= len(reference_text.words) or i >= len(transformed_text.words)
             for i in indices
         ):
-            return False
+            return None
 
+        pairs = []
         for i in indices:
             ref_word = reference_text.words[i]
             transformed_word = transformed_text.words[i]
@@ -89,20 +102,59 @@ class WordEmbeddingDistance(Constraint):
                 # This error is thrown if x or x_adv has no corresponding ID.
                 if self.include_unknown_words:
                     continue
-                return False
-
-            # Check cosine distance.
-            if self.min_cos_sim:
-                cos_sim = self.get_cos_sim(ref_id, transformed_id)
-                if cos_sim < self.min_cos_sim:
-                    return False
-            # Check MSE distance.
-            if self.max_mse_dist:
-                mse_dist = self.get_mse_dist(ref_id, transformed_id)
-                if mse_dist > self.max_mse_dist:
-                    return False
-
-        return True
+                return None
+            pairs.append((ref_id, transformed_id))
+        return pairs
+
+    def _check_pairs(self, ref_ids, transformed_ids):
+        """Returns a boolean array of whether each pair of words is closer
+        than ``self.min_cos_sim`` or ``self.max_mse_dist``."""
+        passed = np.ones(len(ref_ids), dtype=bool)
+        if not len(ref_ids):
+            return passed
+        # Check cosine distance.
+        if self.min_cos_sim:
+            cos_sims = self.get_cos_sim_many(ref_ids, transformed_ids)
+            passed &= ~(cos_sims < self.min_cos_sim)
+        # Check MSE distance.
+        if self.max_mse_dist:
+            mse_dists = self.get_mse_dist_many(ref_ids, transformed_ids)
+            passed &= ~(mse_dists > self.max_mse_dist)
+        return passed
+
+    def _check_constraint(self, transformed_text, reference_text):
+        """Returns true if (``transformed_text`` and ``reference_text``) are
+        closer than ``self.min_cos_sim`` or ``self.max_mse_dist``."""
+        pairs = self._word_id_pairs(transformed_text, reference_text)
+        if pairs is None:
+            return False
+        ref_ids = [ref_id for ref_id, _ in pairs]
+        transformed_ids = [transformed_id for _, transformed_id in pairs]
+        return bool(self._check_pairs(ref_ids, transformed_ids).all())
+
+    def _check_constraint_many(self, transformed_texts, reference_text):
+        """Filters ``transformed_texts`` with a single vectorized distance
+        computation over the word pairs of all of them."""
+        ref_ids = []
+        transformed_ids = []
+        owners = []
+        rejected = np.zeros(len(transformed_texts), dtype=bool)
+        for j, transformed_text in enumerate(transformed_texts):
+            pairs = self._word_id_pairs(transformed_text, reference_text)
+            if pairs is None:
+                rejected[j] = True
+                continue
+            for ref_id, transformed_id in pairs:
+                ref_ids.append(ref_id)
+                transformed_ids.append(transformed_id)
+                owners.append(j)
+        failed = ~self._check_pairs(ref_ids, transformed_ids)
+        rejected[np.array(owners, dtype=np.int64)[failed]] = True
+        return [
+            transformed_text
+            for j, transformed_text in enumerate(transformed_texts)
+            if not rejected[j]
+        ]
 
     def check_compatibility(self, transformation):
         """WordEmbeddingDistance requires a word being both deleted and
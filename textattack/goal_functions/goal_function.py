@@ -6,6 +6,7 @@ GoalFunction Class
 
 
 from abc import ABC, abstractmethod
+import copy
 
 import lru
 import numpy as np
@@ -15,6 +16,7 @@ from textattack.goal_function_results.goal_function_result import (
     GoalFunctionResultStatus,
 )
 from textattack.shared import validators
+from textattack.shared.model_output_cache import ModelOutputCache, model_fingerprint
 from textattack.shared.utils import default_class_repr
 
 
@@ -31,6 +33,11 @@ class GoalFunction(ABC):
             The maximum number of model queries allowed.
         model_cache_size (:obj:`int`, `optional`, defaults to :obj:`2**20`):
             The maximum number of items to keep in the model results cache at once.
+        model_cache_path (:obj:`str`, `optional`, defaults to :obj:`None`):
+            Path of a persistent, on-disk cache of model outputs (see
+            :class:`~textattack.shared.model_output_cache.ModelOutputCache`).
+            Unlike the in-memory cache, it is kept across examples and runs. If
+            :obj:`None`, only the in-memory cache is used.
     """
 
     def __init__(
@@ -41,6 +48,7 @@ class GoalFunction(ABC):
         query_budget=float("inf"),
         model_batch_size=32,
         model_cache_size=2 ** 20,
+        model_cache_path=None,
     ):
         validators.validate_model_goal_function_compatibility(
             self.__class__, model_wrapper.model.__class__
@@ -54,11 +62,43 @@ class GoalFunction(ABC):
             self._call_model_cache = lru.LRU(model_cache_size)
         else:
             self._call_model_cache = None
+        self.model_cache_path = model_cache_path
+        self._persistent_cache = None
+
+    @property
+    def persistent_cache(self):
+        """The persistent :class:`ModelOutputCache` at ``self.model_cache_path``,
+        or ``None`` if ``model_cache_path`` is not set."""
+        if not self.model_cache_path:
+            return None
+        if (
+            self._persistent_cache is None
+            or self._persistent_cache.path != self.model_cache_path
+        ):
+            self._persistent_cache = ModelOutputCache(
+                self.model_cache_path,
+                model_fingerprint(self.model, salt=type(self).__qualname__),
+            )
+        return self._persistent_cache
 
     def clear_cache(self):
         if self.use_cache:
             self._call_model_cache.clear()
 
+    def copy_with_model(self, model_wrapper):
+        """Returns a copy of this goal function that queries
+        ``model_wrapper`` and has its own per-example state and in-memory
+        cache. The persistent cache, if any, is shared."""
+        # Create the persistent cache before copying, so that copies share it.
+        self.persistent_cache
+        goal_function = copy.copy(self)
+        goal_function.model = model_wrapper
+        if self.use_cache:
+            goal_function._call_model_cache = lru.LRU(
+                self._call_model_cache.get_size()
+            )
+        return goal_function
+
     def init_attack_example(self, attacked_text, ground_truth_output):
         """Called before attacking ``attacked_text`` to 'reset' the goal
         function and set properties for this example."""
@@ -158,11 +198,29 @@ class GoalFunction(ABC):
             return []
 
         inputs = [at.tokenizer_input for at in attacked_text_list]
+        order = None
+        if getattr(self.model, "dynamic_padding", False):
+            # Sort inputs by their number of words, which tracks their number
+            # of tokens without tokenizing them twice, so that each batch is
+            # padded as little as possible. The original order is restored below.
+            order = sorted(
+                range(len(inputs)), key=lambda i: attacked_text_list[i].num_words
+            )
+            inputs = [inputs[i] for i in order]
+            attacked_text_list = [attacked_text_list[i] for i in order]
+        # Models that tokenize incrementally take the ``AttackedText`` objects,
+        # so that they can reuse the tokenization of each text's parent.
+        incremental = getattr(self.model, "incremental_tokenization", False)
         outputs = []
         i = 0
         while i < len(inputs):
-            batch = inputs[i : i + self.batch_size]
-            batch_preds = self.model(batch)
+            if incremental:
+                batch_preds = self.model.call_attacked_texts(
+                    attacked_text_list[i : i + self.batch_size]
+                )
+            else:
+                batch = inputs[i : i + self.batch_size]
+                batch_preds = self.model(batch)
 
             # Some seq-to-seq models will return a single string as a prediction
             # for a single-string list. Wrap these in a list.
@@ -188,8 +246,33 @@ class GoalFunction(ABC):
             outputs
         ), f"Got {len(outputs)} outputs for {len(inputs)} inputs"
 
+        if order is not None:
+            inverse = np.argsort(order)
+            if isinstance(outputs, torch.Tensor):
+                outputs = outputs[torch.from_numpy(inverse)]
+            else:
+                outputs = [outputs[i] for i in inverse]
+            attacked_text_list = [attacked_text_list[i] for i in inverse]
+
         return self._process_model_outputs(attacked_text_list, outputs)
 
+    def _call_model_persistent(self, attacked_text_list):
+        """Gets predictions for a list of ``AttackedText`` objects from the
+        persistent cache, and queries the model for the rest."""
+        cache = self.persistent_cache
+        if cache is None or not len(attacked_text_list):
+            return self._call_model_uncached(attacked_text_list)
+        inputs = [at.tokenizer_input for at in attacked_text_list]
+        outputs = cache.get_many(inputs)
+        missing = [i for i, output in enumerate(outputs) if output is None]
+        new_outputs = self._call_model_uncached(
+            [attacked_text_list[i] for i in missing]
+        )
+        cache.put_many([inputs[i] for i in missing], new_outputs)
+        for i, output in zip(missing, new_outputs):
+            outputs[i] = output
+        return outputs
+
     def _call_model(self, attacked_text_list):
         """Gets predictions for a list of ``AttackedText`` objects.
 
@@ -197,7 +280,7 @@ class GoalFunction(ABC):
         the cache, queries model and stores prediction in cache.
         """
         if not self.use_cache:
-            return self._call_model_uncached(attacked_text_list)
+            return self._call_model_persistent(attacked_text_list)
         else:
             uncached_list = []
             for text in attacked_text_list:
@@ -213,7 +296,7 @@ class GoalFunction(ABC):
                 for text in attacked_text_list
                 if text not in self._call_model_cache
             ]
-            outputs = self._call_model_uncached(uncached_list)
+            outputs = self._call_model_persistent(uncached_list)
             for text, output in zip(uncached_list, outputs):
                 self._call_model_cache[text] = output
             all_outputs = [self._call_model_cache[text] for text in attacked_text_list]
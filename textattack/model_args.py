@@ -137,6 +137,7 @@ class ModelArgs:
     model: str = None
     model_from_file: str = None
     model_from_huggingface: str = None
+    dynamic_padding: bool = False
 
     @classmethod
     def _add_parser_args(cls, parser):
@@ -164,6 +165,12 @@ class ModelArgs:
             required=False,
             help="Name of or path of pre-trained HuggingFace model to load.",
         )
+        parser.add_argument(
+            "--dynamic-padding",
+            action="store_true",
+            default=False,
+            help="Pad each batch of model inputs to its longest input instead of the maximum length (HuggingFace models only).",
+        )
 
         return parser
 
@@ -308,4 +315,8 @@ class ModelArgs:
         assert isinstance(
             model, textattack.models.wrappers.ModelWrapper
         ), "`model` must be of type `textattack.models.wrappers.ModelWrapper`."
+        if args.dynamic_padding and isinstance(
+            model, textattack.models.wrappers.HuggingFaceModelWrapper
+        ):
+            model.dynamic_padding = True
         return model
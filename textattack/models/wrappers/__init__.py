@@ -10,7 +10,9 @@ We've also provided implementations of model wrappers for common patterns in som
 
 from .model_wrapper import ModelWrapper
 
+from .batching_model_wrapper import BatchingModelWrapper
 from .huggingface_model_wrapper import HuggingFaceModelWrapper
 from .pytorch_model_wrapper import PyTorchModelWrapper
+from .remote_model_wrapper import ModelServer, RemoteModelWrapper
 from .sklearn_model_wrapper import SklearnModelWrapper
 from .tensorflow_model_wrapper import TensorFlowModelWrapper
@@ -0,0 +1,197 @@
+"""
+Batching Model Wrapper
+--------------------------
+"""
+
+import queue
+import threading
+import time
+
+import numpy as np
+import torch
+
+from .model_wrapper import ModelWrapper
+
+
+class BatchingModelWrapper(ModelWrapper):
+    """Wraps another model wrapper so that queries issued concurrently from
+    several threads (e.g. by attacks running side by side) are merged into
+    larger batches.
+
+    A background thread waits for the first pending query, then keeps
+    collecting queries until ``max_batch_size`` inputs are pending,
+    ``num_clients`` queries are pending, or ``max_latency`` seconds have
+    passed. The merged batch is passed to the wrapped model in a single call
+    and each caller gets back the outputs for its own inputs. If the wrapped
+    model tokenizes incrementally, queries made through
+    ``call_attacked_texts`` are passed on to its ``call_attacked_texts``.
+
+    Args:
+        model_wrapper (:class:`~textattack.models.wrappers.ModelWrapper`):
+            The model wrapper to query.
+        max_batch_size (:obj:`int`, `optional`, defaults to :obj:`128`):
+            Number of inputs after which a batch is dispatched right away.
+        max_latency (:obj:`float`, `optional`, defaults to :obj:`0.005`):
+            Maximum number of seconds a query waits for other queries to join
+            its batch.
+        num_clients (:obj:`int`, `optional`, defaults to :obj:`None`):
+            Number of threads querying the model. Once each of them has a
+            query pending, none can add more, so the batch is dispatched
+            without waiting for ``max_latency``.
+    """
+
+    def __init__(
+        self, model_wrapper, max_batch_size=128, max_latency=0.005, num_clients=None
+    ):
+        self.model_wrapper = model_wrapper
+        self.model = model_wrapper.model
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self.num_clients = num_clients
+        self.num_queries = 0
+        self.num_batches = 0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def dynamic_padding(self):
+        return self.model_wrapper.dynamic_padding
+
+    @property
+    def incremental_tokenization(self):
+        return self.model_wrapper.incremental_tokenization
+
+    @property
+    def mean_batch_size(self):
+        """Mean number of inputs per batch passed to the wrapped model."""
+        return self.num_queries / self.num_batches if self.num_batches else 0.0
+
+    def __call__(self, text_input_list):
+        return self._query(_Request(list(text_input_list)))
+
+    def call_attacked_texts(self, attacked_text_list):
+        """Like ``__call__``, but takes ``AttackedText`` objects, which are
+        passed on to the wrapped model's ``call_attacked_texts``."""
+        return self._query(_Request(list(attacked_text_list), attacked_texts=True))
+
+    def _query(self, request):
+        if not request.inputs:
+            return self._call_model_wrapper(request.inputs, request.attacked_texts)
+        self._start()
+        self._queue.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.outputs
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="BatchingModelWrapper", daemon=True
+                )
+                self._thread.start()
+
+    def close(self):
+        """Stops the background thread, once pending queries are answered. It
+        is started again by the next query."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                self._queue.put(None)
+                self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            request = self._queue.get()
+            if request is None:
+                break
+            requests = [request]
+            num_inputs = len(request.inputs)
+            deadline = time.monotonic() + self.max_latency
+            while num_inputs < self.max_batch_size and (
+                self.num_clients is None or len(requests) < self.num_clients
+            ):
+                timeout = deadline - time.monotonic()
+                try:
+                    if timeout > 0:
+                        request = self._queue.get(timeout=timeout)
+                    else:
+                        request = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if request is None:
+                    stopping = True
+                    break
+                requests.append(request)
+                num_inputs += len(request.inputs)
+            self._dispatch(requests)
+
+    def _call_model_wrapper(self, inputs, attacked_texts):
+        if attacked_texts:
+            return self.model_wrapper.call_attacked_texts(inputs)
+        return self.model_wrapper(inputs)
+
+    def _dispatch(self, requests):
+        # Queries of text inputs and of ``AttackedText`` objects are passed to
+        # the wrapped model in separate calls.
+        for attacked_texts in (False, True):
+            group = [r for r in requests if r.attacked_texts == attacked_texts]
+            if group:
+                self._dispatch_group(group, attacked_texts)
+
+    def _dispatch_group(self, requests, attacked_texts):
+        inputs = [x for request in requests for x in request.inputs]
+        try:
+            outputs = self._call_model_wrapper(inputs, attacked_texts)
+            if isinstance(outputs, torch.Tensor):
+                outputs = outputs.cpu()
+            self.num_queries += len(inputs)
+            self.num_batches += 1
+            i = 0
+            for request in requests:
+                request.outputs = _take(outputs, i, i + len(request.inputs))
+                i += len(request.inputs)
+        except Exception as e:
+            for request in requests:
+                request.error = e
+        finally:
+            for request in requests:
+                request.done.set()
+
+    def get_grad(self, text_input):
+        return self.model_wrapper.get_grad(text_input)
+
+    def _tokenize(self, inputs):
+        return self.model_wrapper._tokenize(inputs)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_queue"] = None
+        state["_thread"] = None
+        state["_lock"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__ = state
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+
+
+class _Request:
+    __slots__ = ("inputs", "attacked_texts", "outputs", "error", "done")
+
+    def __init__(self, inputs, attacked_texts=False):
+        self.inputs = inputs
+        self.attacked_texts = attacked_texts
+        self.outputs = None
+        self.error = None
+        self.done = threading.Event()
+
+
+def _take(outputs, start, end):
+    if isinstance(outputs, (torch.Tensor, np.ndarray, list)):
+        return outputs[start:end]
+    return list(outputs)[start:end]
@@ -3,6 +3,9 @@ HuggingFace Model Wrapper
 --------------------------
 """
 
+import unicodedata
+
+import lru
 import torch
 import transformers
 
@@ -14,9 +17,42 @@ torch.cuda.empty_cache()
 
 
 class HuggingFaceModelWrapper(PyTorchModelWrapper):
-    """Loads a HuggingFace ``transformers`` model and tokenizer."""
+    """Loads a HuggingFace ``transformers`` model and tokenizer.
+
+    Args:
+        model (:obj:`transformers.PreTrainedModel`): The model to wrap.
+        tokenizer (:obj:`transformers.PreTrainedTokenizer`): The model's tokenizer.
+        dynamic_padding (:obj:`bool`, `optional`, defaults to :obj:`False`):
+            If :obj:`True`, each batch is only padded to its longest input
+            instead of to the tokenizer's maximum length, and goal functions
+            batch inputs of similar lengths together.
+        incremental_tokenization (:obj:`bool`, `optional`, defaults to :obj:`False`):
+            If :obj:`True`, a perturbed text is tokenized by re-encoding only
+            the span that differs from the text it was perturbed from, and
+            reusing the token ids of the rest. Only used for fast WordPiece
+            tokenizers (e.g. BERT's), where tokens never cross whitespace or
+            punctuation; other tokenizers always tokenize the full text.
+        encoding_cache_size (:obj:`int`, `optional`, defaults to :obj:`2**14`):
+            Number of text encodings kept for incremental tokenization.
+        shared_prefix_scoring (:obj:`bool`, `optional`, defaults to :obj:`False`):
+            If :obj:`True`, the tokens shared at the start of all inputs of a
+            batch (e.g. the words before the swapped word of sibling
+            candidates) are run through the model once, and their cached
+            key/value states are reused for every input. Only valid for causal
+            (decoder-only) models with right padding, like
+            ``GPT2ForSequenceClassification``. Saved work is counted in
+            ``self.prefix_reuse_stats``.
+    """
 
-    def __init__(self, model, tokenizer):
+    def __init__(
+        self,
+        model,
+        tokenizer,
+        dynamic_padding=False,
+        incremental_tokenization=False,
+        encoding_cache_size=2 ** 14,
+        shared_prefix_scoring=False,
+    ):
         assert isinstance(
             model, transformers.PreTrainedModel
         ), f"`model` must be of type `transformers.PreTrainedModel`, but got type {type(model)}."
@@ -27,6 +63,29 @@ class HuggingFaceModelWrapper(PyTorchModelWrapper):
 
         self.model = model
         self.tokenizer = tokenizer
+        self.dynamic_padding = dynamic_padding
+        self.incremental_tokenization = (
+            incremental_tokenization and _is_wordpiece_tokenizer(tokenizer)
+        )
+        self.encoding_cache_size = encoding_cache_size
+        self._encoding_cache = lru.LRU(encoding_cache_size)
+        if shared_prefix_scoring and model.config.is_encoder_decoder:
+            raise ValueError(
+                "`shared_prefix_scoring` requires a decoder-only model."
+            )
+        self.shared_prefix_scoring = shared_prefix_scoring
+        self.prefix_reuse_stats = textattack.shared.utils.PrefixReuseStats(
+            flops_per_token=2 * model.num_parameters()
+        )
+
+    @property
+    def max_length(self):
+        # Default max length is set to be int(1e30), so we force 512 to enable batching.
+        return (
+            512
+            if self.tokenizer.model_max_length == int(1e30)
+            else self.tokenizer.model_max_length
+        )
 
     def __call__(self, text_input_list):
         """Passes inputs to HuggingFace models as keyword arguments.
@@ -34,25 +93,165 @@ class HuggingFaceModelWrapper(PyTorchModelWrapper):
         (Regular PyTorch ``nn.Module`` models typically take inputs as
         positional arguments.)
         """
-        # Default max length is set to be int(1e30), so we force 512 to enable batching.
-        max_length = (
-            512
-            if self.tokenizer.model_max_length == int(1e30)
-            else self.tokenizer.model_max_length
-        )
         inputs_dict = self.tokenizer(
             text_input_list,
             add_special_tokens=True,
-            padding="max_length",
-            max_length=max_length,
+            padding=True if self.dynamic_padding else "max_length",
+            max_length=self.max_length,
             truncation=True,
             return_tensors="pt",
         )
+        return self._predict(inputs_dict)
+
+    def call_attacked_texts(self, attacked_text_list):
+        """Like ``__call__``, but takes ``AttackedText`` objects, so that
+        perturbed texts can be tokenized incrementally from their parents
+        (see ``encode_attacked_texts``)."""
+        return self._predict(self.encode_attacked_texts(attacked_text_list))
+
+    def encode_attacked_texts(self, attacked_text_list):
+        """Returns the padded model inputs (token ids and attention mask) for
+        a list of ``AttackedText`` objects.
+
+        A text whose parent (``attack_attrs["previous_attacked_text"]``) was
+        encoded before is encoded by splicing the ids of the re-encoded span
+        that differs between the two into the parent's ids. Texts without an
+        encoded parent, with multiple inputs, or that might be truncated are
+        tokenized in full.
+        """
+        inputs = [text.tokenizer_input for text in attacked_text_list]
+        if not self.incremental_tokenization or not all(
+            isinstance(x, str) for x in inputs
+        ):
+            return self.tokenizer(
+                inputs,
+                add_special_tokens=True,
+                padding=True if self.dynamic_padding else "max_length",
+                max_length=self.max_length,
+                truncation=True,
+                return_tensors="pt",
+            )
+        input_ids = [ids for ids, _ in self._encode_many(inputs, attacked_text_list)]
+        return self._pad(input_ids)
+
+    def _encode_many(self, inputs, attacked_text_list):
+        """Returns the token ids of each text and the character span of each
+        token, as produced by the tokenizer. The spans that differ from each
+        text's parent, and the texts that have to be tokenized in full, are
+        each tokenized in a single call to the tokenizer."""
+        encodings = [self._encoding_cache.get(text) for text in inputs]
+        splices = []
+        for i, attacked_text in enumerate(attacked_text_list):
+            if encodings[i] is not None:
+                continue
+            parent = attacked_text.attack_attrs.get("previous_attacked_text")
+            if parent is not None and parent.tokenizer_input in self._encoding_cache:
+                splice = self._find_splice(
+                    inputs[i],
+                    parent.tokenizer_input,
+                    self._encoding_cache[parent.tokenizer_input],
+                )
+                if splice is not None:
+                    splices.append((i, splice))
+        if splices:
+            spans = self.tokenizer(
+                [inputs[i][splice[1] : splice[2]] for i, splice in splices],
+                add_special_tokens=False,
+                return_offsets_mapping=True,
+            )
+            for (i, splice), span_ids, span_offsets in zip(
+                splices, spans["input_ids"], spans["offset_mapping"]
+            ):
+                encodings[i] = _apply_splice(
+                    splice, span_ids, span_offsets, self.max_length
+                )
+        missing = [i for i, encoding in enumerate(encodings) if encoding is None]
+        if missing:
+            full = self.tokenizer(
+                [inputs[i] for i in missing],
+                add_special_tokens=True,
+                max_length=self.max_length,
+                truncation=True,
+                return_offsets_mapping=True,
+            )
+            for i, ids, offsets in zip(
+                missing, full["input_ids"], full["offset_mapping"]
+            ):
+                encodings[i] = (ids, offsets)
+        for text, encoding in zip(inputs, encodings):
+            self._encoding_cache[text] = encoding
+        return encodings
+
+    def _find_splice(self, text, parent_text, parent_encoding):
+        """Finds the span of ``text`` to re-encode, and the tokens of the
+        parent that its encoding replaces, or returns ``None`` if ``text`` has
+        to be tokenized in full."""
+        parent_ids, parent_offsets = parent_encoding
+        if len(parent_ids) >= self.max_length:
+            # The parent may have been truncated.
+            return None
+        # Find the span of characters that differs between the two texts,
+        # widened to whitespace or punctuation on both sides. The tokenizer
+        # never merges characters across those, so everything outside of the
+        # span is tokenized exactly like in the parent.
+        start = 0
+        max_start = min(len(text), len(parent_text))
+        while start < max_start and text[start] == parent_text[start]:
+            start += 1
+        end = 0
+        max_end = max_start - start
+        while end < max_end and text[-end - 1] == parent_text[-end - 1]:
+            end += 1
+        while start > 0 and not _is_boundary(parent_text[start - 1]):
+            start -= 1
+        parent_end = len(parent_text) - end
+        while parent_end < len(parent_text) and not _is_boundary(
+            parent_text[parent_end]
+        ):
+            parent_end += 1
+
+        # Special tokens have empty spans and are never part of the re-encoded
+        # span, so the first and last token are always kept.
+        first, last = 1, len(parent_ids) - 1
+        while first < last and parent_offsets[first][0] < start:
+            first += 1
+        last = first
+        while last < len(parent_ids) - 1 and parent_offsets[last][0] < parent_end:
+            last += 1
+        shift = len(text) - len(parent_text)
+        return parent_encoding, start, parent_end + shift, first, last, shift
+
+    def _pad(self, input_ids):
+        """Pads a list of token id lists into a batch of model inputs."""
+        length = (
+            max(len(ids) for ids in input_ids)
+            if self.dynamic_padding
+            else self.max_length
+        )
+        ids_tensor = torch.full(
+            (len(input_ids), length), self.tokenizer.pad_token_id, dtype=torch.long
+        )
+        attention_mask = torch.zeros((len(input_ids), length), dtype=torch.long)
+        for row, ids in enumerate(input_ids):
+            if self.tokenizer.padding_side == "left":
+                ids_tensor[row, length - len(ids) :] = torch.tensor(ids)
+                attention_mask[row, length - len(ids) :] = 1
+            else:
+                ids_tensor[row, : len(ids)] = torch.tensor(ids)
+                attention_mask[row, : len(ids)] = 1
+        return transformers.BatchEncoding(
+            {"input_ids": ids_tensor, "attention_mask": attention_mask}
+        )
+
+    def _predict(self, inputs_dict):
         model_device = next(self.model.parameters()).device
         inputs_dict.to(model_device)
 
         with torch.no_grad():
-            outputs = self.model(**inputs_dict)
+            if self.shared_prefix_scoring:
+                outputs = self._predict_shared_prefix(inputs_dict)
+            else:
+                outputs = self.model(**inputs_dict)
 
         if isinstance(outputs[0], str):
             # HuggingFace sequence-to-sequence models return a list of
@@ -65,6 +264,59 @@ class HuggingFaceModelWrapper(PyTorchModelWrapper):
             # scores for each input.
             return outputs.logits
 
+    def _predict_shared_prefix(self, inputs_dict):
+        """Runs the model on the prefix shared by all inputs once, then on the
+        rest of each input using the prefix's cached key/value states."""
+        input_ids = inputs_dict["input_ids"]
+        attention_mask = inputs_dict.get("attention_mask")
+        batch_size = len(input_ids)
+        num_tokens = (
+            int(attention_mask.sum()) if attention_mask is not None else input_ids.numel()
+        )
+        prefix_length = (
+            textattack.shared.utils.shared_prefix_length(input_ids, attention_mask)
+            if batch_size > 1 and self.tokenizer.padding_side == "right"
+            else 0
+        )
+        self.prefix_reuse_stats.record(
+            batch_size, num_tokens, (batch_size - 1) * prefix_length
+        )
+        if not prefix_length:
+            return self.model(**inputs_dict)
+
+        # Other per-token inputs (e.g. ``token_type_ids``) are split like the ids.
+        token_inputs = {
+            k: v for k, v in inputs_dict.items() if k != "attention_mask"
+        }
+        prefix = self.model(
+            **{k: v[:1, :prefix_length] for k, v in token_inputs.items()},
+            use_cache=True,
+        )
+        past_key_values = prefix.past_key_values
+        if hasattr(past_key_values, "batch_repeat_interleave"):
+            past_key_values.batch_repeat_interleave(batch_size)
+        else:
+            past_key_values = tuple(
+                tuple(t.expand(batch_size, *t.shape[1:]) for t in layer)
+                for layer in past_key_values
+            )
+        if attention_mask is None:
+            attention_mask = torch.ones_like(input_ids)
+        return self.model(
+            **{k: v[:, prefix_length:] for k, v in token_inputs.items()},
+            attention_mask=attention_mask,
+            past_key_values=past_key_values,
+        )
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_encoding_cache"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__ = state
+        self._encoding_cache = lru.LRU(state.get("encoding_cache_size", 2 ** 14))
+
     def get_grad(self, text_input):
         """Get gradient of loss with respect to input tokens.
 
@@ -138,3 +390,36 @@ class HuggingFaceModelWrapper(PyTorchModelWrapper):
             )
             for x in inputs
         ]
+
+
+def _is_wordpiece_tokenizer(tokenizer):
+    if not getattr(tokenizer, "is_fast", False):
+        return False
+    pre_tokenizer = tokenizer.backend_tokenizer.pre_tokenizer
+    return type(pre_tokenizer).__name__ == "BertPreTokenizer"
+
+
+def _is_boundary(char):
+    """Whether WordPiece tokenizers always split at ``char``: whitespace, or
+    punctuation as defined by BERT's basic tokenizer."""
+    if char.isspace():
+        return True
+    cp = ord(char)
+    if 33 <= cp <= 47 or 58 <= cp <= 64 or 91 <= cp <= 96 or 123 <= cp <= 126:
+        return True
+    return unicodedata.category(char).startswith("P")
+
+
+def _apply_splice(splice, span_ids, span_offsets, max_length):
+    """Splices the encoding of a re-encoded span into the encoding of the
+    parent text, as found by ``HuggingFaceModelWrapper._find_splice``."""
+    (parent_ids, parent_offsets), start, _, first, last, shift = splice
+    ids = parent_ids[:first] + span_ids + parent_ids[last:]
+    if len(ids) > max_length:
+        return None
+    offsets = (
+        parent_offsets[:first]
+        + [(s + start, e + start) for s, e in span_offsets]
+        + [(s + shift, e + shift) if e > s else (s, e) for s, e in parent_offsets[last:]]
+    )
+    return ids, offsets
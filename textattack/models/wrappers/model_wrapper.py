@@ -17,6 +17,13 @@ class ModelWrapper(ABC):
     output – like a translation or summarization – for a given input.
     """
 
+    # Whether the model's cost depends on the length of the longest input in
+    # a batch. If so, goal functions batch inputs of similar lengths together.
+    dynamic_padding = False
+    # Whether the model takes ``AttackedText`` objects through
+    # ``call_attacked_texts`` to tokenize them incrementally.
+    incremental_tokenization = False
+
     @abstractmethod
     def __call__(self, text_input_list, **kwargs):
         raise NotImplementedError()
@@ -0,0 +1,208 @@
+"""
+Remote Model Wrapper
+--------------------------
+"""
+
+import os
+import queue
+import time
+
+import torch
+
+from .batching_model_wrapper import _take
+from .model_wrapper import ModelWrapper
+
+
+class ModelServer:
+    """Runs a model wrapper in a separate inference process that serves
+    batched predictions to :class:`RemoteModelWrapper` clients in other
+    processes.
+
+    Only the server process holds a copy of the model, so many worker
+    processes can query one model without each loading it. Queries from
+    different clients that arrive within ``max_latency`` seconds of each other
+    are merged into one batch. Inputs and outputs are passed through
+    ``torch.multiprocessing`` queues, which move tensors through shared
+    memory. Queries are sent as plain text inputs, so model wrappers that
+    tokenize incrementally (which needs each text's parent) can't be served.
+
+    Args:
+        model_wrapper (:class:`~textattack.models.wrappers.ModelWrapper`):
+            The model wrapper to serve.
+        num_clients (:obj:`int`): Maximum number of processes that query the
+            server at the same time.
+        max_batch_size (:obj:`int`, `optional`, defaults to :obj:`128`):
+            Number of inputs after which a batch is dispatched right away.
+        max_latency (:obj:`float`, `optional`, defaults to :obj:`0.005`):
+            Maximum number of seconds a query waits for other queries to join
+            its batch.
+
+    Example::
+
+        >>> server = ModelServer(model_wrapper, num_clients=8)
+        >>> server.start()
+        >>> remote_model = server.client()  # Pass this to worker processes.
+        >>> ...
+        >>> server.stop()
+    """
+
+    def __init__(
+        self, model_wrapper, num_clients, max_batch_size=128, max_latency=0.005
+    ):
+        if getattr(model_wrapper, "incremental_tokenization", False):
+            raise ValueError(
+                "`ModelServer` does not support `incremental_tokenization`."
+            )
+        self.model_wrapper = model_wrapper
+        self.num_clients = num_clients
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self._process = None
+
+        # A forked process may hang in the model's first forward pass if this
+        # process ran the model before (its thread pools don't survive fork),
+        # so the inference process is always spawned.
+        self._context = torch.multiprocessing.get_context("spawn")
+        self._request_queue = self._context.Queue()
+        self._response_queues = [self._context.Queue() for _ in range(num_clients)]
+        # Indices of the response queues not taken by a client process yet.
+        self._free_slots = self._context.Queue()
+        for slot in range(num_clients):
+            self._free_slots.put(slot)
+
+    def start(self):
+        """Starts the inference process."""
+        if self._process is not None:
+            return
+        self._process = self._context.Process(
+            target=_serve,
+            args=(
+                self.model_wrapper,
+                self._request_queue,
+                self._response_queues,
+                self.max_batch_size,
+                self.max_latency,
+            ),
+            name="ModelServer",
+            daemon=True,
+        )
+        self._process.start()
+
+    def stop(self):
+        """Stops the inference process, once pending queries are answered."""
+        if self._process is None:
+            return
+        self._request_queue.put(None)
+        self._process.join()
+        self._process = None
+
+    def client(self):
+        """Returns a :class:`RemoteModelWrapper` that queries this server. It
+        can be pickled and passed to (up to ``num_clients``) other
+        processes."""
+        return RemoteModelWrapper(
+            self._request_queue,
+            self._response_queues,
+            self._free_slots,
+            dynamic_padding=self.model_wrapper.dynamic_padding,
+        )
+
+
+class RemoteModelWrapper(ModelWrapper):
+    """Client of a :class:`ModelServer`. Calling it sends the inputs to the
+    server process and waits for its predictions.
+
+    Use :meth:`ModelServer.client` to create one. Each process that calls it
+    takes one of the server's ``num_clients`` response queues until it calls
+    :meth:`close`.
+    """
+
+    def __init__(
+        self, request_queue, response_queues, free_slots, dynamic_padding=False
+    ):
+        # The model lives in the server process.
+        self.model = None
+        self.dynamic_padding = dynamic_padding
+        self._request_queue = request_queue
+        self._response_queues = response_queues
+        self._free_slots = free_slots
+        self._slot = None
+        self._pid = None
+        self._num_requests = 0
+
+    def __call__(self, text_input_list):
+        if self._pid != os.getpid():
+            # Each process takes its own response queue.
+            self._slot = self._free_slots.get()
+            self._pid = os.getpid()
+        self._num_requests += 1
+        request_id = self._num_requests
+        self._request_queue.put((self._slot, request_id, list(text_input_list)))
+        response_id, outputs, error = self._response_queues[self._slot].get()
+        assert response_id == request_id, "Got a response for another query."
+        if error is not None:
+            raise error
+        return outputs
+
+    def close(self):
+        """Gives the response queue taken by this process back to the server,
+        so that another process can use it."""
+        if self._pid == os.getpid():
+            self._free_slots.put(self._slot)
+            self._slot = None
+            self._pid = None
+
+    def get_grad(self, text_input):
+        raise NotImplementedError("Gradients are not available from a remote model.")
+
+
+def _serve(
+    model_wrapper, request_queue, response_queues, max_batch_size, max_latency
+):
+    if torch.cuda.is_available():
+        model = getattr(model_wrapper, "model", None)
+        if isinstance(model, torch.nn.Module):
+            model.to(torch.device("cuda"))
+    stopping = False
+    while not stopping:
+        request = request_queue.get()
+        if request is None:
+            break
+        requests = [request]
+        num_inputs = len(request[2])
+        deadline = time.monotonic() + max_latency
+        while num_inputs < max_batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                if timeout > 0:
+                    request = request_queue.get(timeout=timeout)
+                else:
+                    request = request_queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                stopping = True
+                break
+            requests.append(request)
+            num_inputs += len(request[2])
+        _dispatch(model_wrapper, requests, response_queues)
+
+
+def _dispatch(model_wrapper, requests, response_queues):
+    inputs = [x for _, _, request_inputs in requests for x in request_inputs]
+    try:
+        outputs = model_wrapper(inputs) if inputs else []
+        if isinstance(outputs, torch.Tensor):
+            outputs = outputs.cpu()
+    except Exception as e:
+        for slot, request_id, _ in requests:
+            response_queues[slot].put((request_id, None, e))
+        return
+    i = 0
+    for slot, request_id, request_inputs in requests:
+        response = _take(outputs, i, i + len(request_inputs))
+        if isinstance(response, torch.Tensor):
+            # Slices of a tensor share its storage; send only the slice.
+            response = response.clone()
+        response_queues[slot].put((request_id, response, None))
+        i += len(request_inputs)
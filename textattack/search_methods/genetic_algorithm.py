@@ -71,56 +71,91 @@ class GeneticAlgorithm(PopulationBasedSearch, ABC):
         Returns:
             Perturbed `PopulationMember`
         """
-        num_words = pop_member.attacked_text.num_words
-        # `word_select_prob_weights` is a list of values used for sampling one word to transform
-        word_select_prob_weights = np.copy(
-            self._get_word_select_prob_weights(pop_member)
-        )
-        non_zero_indices = np.count_nonzero(word_select_prob_weights)
-        if non_zero_indices == 0:
-            return pop_member
-        iterations = 0
-        while iterations < non_zero_indices:
-            if index:
-                idx = index
-            else:
-                w_select_probs = word_select_prob_weights / np.sum(
-                    word_select_prob_weights
-                )
-                idx = np.random.choice(num_words, 1, p=w_select_probs)[0]
+        indices = None if index is None else [index]
+        return self._perturb_population([pop_member], original_result, indices)[0]
 
-            transformed_texts = self.get_transformations(
-                pop_member.attacked_text,
-                original_text=original_result.attacked_text,
-                indices_to_modify=[idx],
-            )
+    def _perturb_population(self, population, original_result, indices=None):
+        """Perturb every member of `population` like `_perturb` and return the
+        perturbed members.
 
-            if not len(transformed_texts):
-                iterations += 1
-                continue
+        Members are perturbed together in rounds: each round picks a word to
+        transform for every member that has not been improved yet, and the
+        transformed texts of all members are scored in a single batch.
 
-            new_results, self._search_over = self.get_goal_results(transformed_texts)
-
-            diff_scores = (
-                torch.Tensor([r.score for r in new_results]) - pop_member.result.score
-            )
-            if len(diff_scores) and diff_scores.max() > 0:
-                idx_with_max_score = diff_scores.argmax()
-                pop_member = self._modify_population_member(
-                    pop_member,
-                    transformed_texts[idx_with_max_score],
-                    new_results[idx_with_max_score],
-                    idx,
+        Args:
+            population (list[PopulationMember]): The population members being perturbed.
+            original_result (GoalFunctionResult): Result of original sample being attacked
+            indices (list[int]): Index of word to perturb for each member.
+        Returns:
+            List of perturbed `PopulationMember`
+        """
+        population = list(population)
+        # `word_select_prob_weights` are lists of values used for sampling one word to
+        # transform in each member
+        word_select_prob_weights = [
+            np.copy(self._get_word_select_prob_weights(pop_member))
+            for pop_member in population
+        ]
+        attempts_left = [np.count_nonzero(w) for w in word_select_prob_weights]
+        active = [i for i in range(len(population)) if attempts_left[i]]
+
+        while active and not self._search_over:
+            proposals = []
+            # Maps each distinct transformed text to its position in the batch.
+            candidates = {}
+            for i in active:
+                pop_member = population[i]
+                if indices is not None:
+                    idx = indices[i]
+                else:
+                    w_select_probs = word_select_prob_weights[i] / np.sum(
+                        word_select_prob_weights[i]
+                    )
+                    idx = np.random.choice(pop_member.num_words, 1, p=w_select_probs)[0]
+
+                transformed_texts = self.get_transformations(
+                    pop_member.attacked_text,
+                    original_text=original_result.attacked_text,
+                    indices_to_modify=[idx],
                 )
-                return pop_member
-
-            word_select_prob_weights[idx] = 0
-            iterations += 1
-
-            if self._search_over:
-                break
+                positions = [
+                    candidates.setdefault(t, len(candidates)) for t in transformed_texts
+                ]
+                proposals.append((i, idx, transformed_texts, positions))
 
-        return pop_member
+            if candidates:
+                new_results, self._search_over = self.get_goal_results(list(candidates))
+            else:
+                new_results = []
+
+            next_active = []
+            for i, idx, transformed_texts, positions in proposals:
+                pop_member = population[i]
+                attempts_left[i] -= 1
+                # Results are cut short if the query budget runs out.
+                scored = [
+                    (text, new_results[p])
+                    for text, p in zip(transformed_texts, positions)
+                    if p < len(new_results)
+                ]
+                if scored:
+                    diff_scores = (
+                        np.array([r.score for _, r in scored]) - pop_member.result.score
+                    )
+                    idx_with_max_score = np.argmax(diff_scores)
+                    if diff_scores[idx_with_max_score] > 0:
+                        population[i] = self._modify_population_member(
+                            pop_member, *scored[idx_with_max_score], idx
+                        )
+                        continue
+
+                if transformed_texts:
+                    word_select_prob_weights[i][idx] = 0
+                if indices is None and attempts_left[i]:
+                    next_active.append(i)
+            active = next_active
+
+        return population
 
     @abstractmethod
     def _crossover_operation(self, pop_member1, pop_member2):
@@ -174,7 +209,8 @@ class GeneticAlgorithm(PopulationBasedSearch, ABC):
             pop_member2 (PopulationMember): The second population member.
             original_text (AttackedText): Original text
         Returns:
-            A population member containing the crossover.
+            A population member containing the crossover. Its result is left
+            for the caller to compute, unless it is one of the parents.
         """
         x1_text = pop_member1.attacked_text
         x2_text = pop_member2.attacked_text
@@ -214,10 +250,7 @@ class GeneticAlgorithm(PopulationBasedSearch, ABC):
             pop_mem = pop_member1 if np.random.uniform() < 0.5 else pop_member2
             return pop_mem
         else:
-            new_results, self._search_over = self.get_goal_results([new_text])
-            return PopulationMember(
-                new_text, result=new_results[0], attributes=attributes
-            )
+            return PopulationMember(new_text, attributes=attributes)
 
     @abstractmethod
     def _initialize_population(self, initial_result, pop_size):
@@ -259,23 +292,28 @@ class GeneticAlgorithm(PopulationBasedSearch, ABC):
             parent1_idx = np.random.choice(pop_size, size=pop_size - 1, p=select_probs)
             parent2_idx = np.random.choice(pop_size, size=pop_size - 1, p=select_probs)
 
-            children = []
-            for idx in range(pop_size - 1):
-                child = self._crossover(
+            children = [
+                self._crossover(
                     population[parent1_idx[idx]],
                     population[parent2_idx[idx]],
                     initial_result.attacked_text,
                 )
-                if self._search_over:
-                    break
-
-                child = self._perturb(child, initial_result)
-                children.append(child)
+                for idx in range(pop_size - 1)
+            ]
+
+            # Score the new children in one batch. Children left unscored because
+            # the query budget ran out are dropped.
+            unscored = [child for child in children if child.result is None]
+            if unscored:
+                new_results, self._search_over = self.get_goal_results(
+                    [child.attacked_text for child in unscored]
+                )
+                for child, result in zip(unscored, new_results):
+                    child.result = result
+                children = [child for child in children if child.result is not None]
 
-                # We need two `search_over` checks b/c value might change both in
-                # `crossover` method and `perturb` method.
-                if self._search_over:
-                    break
+            if not self._search_over:
+                children = self._perturb_population(children, initial_result)
 
             population = [population[0]] + children
 
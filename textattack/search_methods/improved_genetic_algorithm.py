@@ -112,19 +112,19 @@ class ImprovedGeneticAlgorithm(GeneticAlgorithm):
         num_replacements_left = np.array(
             [self.max_replace_times_per_index] * len(words)
         )
-        population = []
-
         # IGA initializes the first population by replacing each word by its optimal synonym
-        for idx in range(len(words)):
-            pop_member = PopulationMember(
+        num_members = min(len(words), pop_size)
+        population = [
+            PopulationMember(
                 initial_result.attacked_text,
                 initial_result,
                 attributes={"num_replacements_left": np.copy(num_replacements_left)},
             )
-            pop_member = self._perturb(pop_member, initial_result, index=idx)
-            population.append(pop_member)
-
-        return population[:pop_size]
+            for _ in range(num_members)
+        ]
+        return self._perturb_population(
+            population, initial_result, indices=list(range(num_members))
+        )
 
     def extra_repr_keys(self):
         return super().extra_repr_keys() + ["max_replace_times_per_index"]
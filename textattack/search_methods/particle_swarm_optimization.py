@@ -44,9 +44,11 @@ class ParticleSwarmOptimization(PopulationBasedSearch):
         self.max_iters = max_iters
         self.pop_size = pop_size
         self.post_turn_check = post_turn_check
-        self.max_turn_retries = 20
+        self.max_turn_retries = max_turn_retries
 
         self._search_over = False
+        self._vocab = {}
+        self._word_ids_cache = {}
         self.omega_1 = 0.8
         self.omega_2 = 0.2
         self.c1_origin = 0.8
@@ -76,8 +78,45 @@ class ParticleSwarmOptimization(PopulationBasedSearch):
             pop_member.result = random_result
             return True
 
-    def _equal(self, a, b):
-        return -self.v_max if a == b else self.v_max
+    def _word_ids(self, pop_member):
+        """Returns the words of `pop_member` as an array of integer word ids,
+        so that the words of population members can be compared as arrays."""
+        text = pop_member.attacked_text.text
+        if text not in self._word_ids_cache:
+            self._word_ids_cache[text] = np.array(
+                [self._vocab.setdefault(w, len(self._vocab)) for w in pop_member.words],
+                dtype=np.int64,
+            )
+        return self._word_ids_cache[text]
+
+    def _update_velocities(
+        self, velocities, omega, population, local_elites, global_elite
+    ):
+        """Returns the velocities of every word of every population member
+        after one step towards the local elites and the global elite.
+
+        Args:
+            velocities (np.array[float]): Velocities of shape `(pop_size, num_words)`.
+            omega (float): Inertia weight of the current step.
+            population (list[PopulationMember]): Current population.
+            local_elites (list[PopulationMember]): Local elite of each member.
+            global_elite (PopulationMember): Global elite.
+        Returns:
+            New velocities as `np.array[float]` of the same shape.
+        """
+        pop_ids = np.stack([self._word_ids(p) for p in population])
+        local_elite_ids = np.stack([self._word_ids(p) for p in local_elites])
+        global_elite_ids = self._word_ids(global_elite)
+        assert (
+            pop_ids.shape == local_elite_ids.shape == velocities.shape
+        ), "PSO word length mismatch!"
+        local_attraction = np.where(pop_ids == local_elite_ids, -self.v_max, self.v_max)
+        global_attraction = np.where(
+            pop_ids == global_elite_ids, -self.v_max, self.v_max
+        )
+        return omega * velocities + (1 - omega) * (
+            local_attraction + global_attraction
+        )
 
     def _turn(self, source_text, target_text, prob, original_text):
         """
@@ -101,12 +140,9 @@ class ParticleSwarmOptimization(PopulationBasedSearch):
         num_tries = 0
         passed_constraints = False
         while num_tries < self.max_turn_retries + 1:
-            indices_to_replace = []
-            words_to_replace = []
-            for i in range(len_x):
-                if np.random.uniform() < prob[i]:
-                    indices_to_replace.append(i)
-                    words_to_replace.append(target_text.words[i])
+            indices_to_replace = np.flatnonzero(np.random.uniform(size=len_x) < prob)
+            indices_to_replace = indices_to_replace.tolist()
+            words_to_replace = [target_text.words[i] for i in indices_to_replace]
             new_text = source_text.attacked_text.replace_words_at_indices(
                 indices_to_replace, words_to_replace
             )
@@ -214,14 +250,13 @@ class ParticleSwarmOptimization(PopulationBasedSearch):
 
     def perform_search(self, initial_result):
         self._search_over = False
+        self._vocab = {}
+        self._word_ids_cache = {}
         population = self._initialize_population(initial_result, self.pop_size)
         # Initialize  up velocities of each word for each population
         v_init = np.random.uniform(-self.v_max, self.v_max, self.pop_size)
-        velocities = np.array(
-            [
-                [v_init[t] for _ in range(initial_result.attacked_text.num_words)]
-                for t in range(self.pop_size)
-            ]
+        velocities = np.repeat(
+            v_init[:, np.newaxis], initial_result.attacked_text.num_words, axis=1
         )
 
         global_elite = max(population, key=lambda x: x.score)
@@ -233,6 +268,8 @@ class ParticleSwarmOptimization(PopulationBasedSearch):
 
         local_elites = copy.copy(population)
 
+        original_ids = self._word_ids(PopulationMember(initial_result.attacked_text))
+
         # start iterations
         for i in range(self.max_iters):
             omega = (self.omega_1 - self.omega_2) * (
@@ -243,27 +280,19 @@ class ParticleSwarmOptimization(PopulationBasedSearch):
             P1 = C1
             P2 = C2
 
-            for k in range(len(population)):
-                # calculate the probability of turning each word
-                pop_mem_words = population[k].words
-                local_elite_words = local_elites[k].words
-                assert len(pop_mem_words) == len(
-                    local_elite_words
-                ), "PSO word length mismatch!"
-
-                for d in range(len(pop_mem_words)):
-                    velocities[k][d] = omega * velocities[k][d] + (1 - omega) * (
-                        self._equal(pop_mem_words[d], local_elite_words[d])
-                        + self._equal(pop_mem_words[d], global_elite.words[d])
-                    )
-                turn_prob = utils.sigmoid(velocities[k])
+            # calculate the probability of turning each word of each member
+            velocities = self._update_velocities(
+                velocities, omega, population, local_elites, global_elite
+            )
+            turn_probs = utils.sigmoid(velocities)
 
+            for k in range(len(population)):
                 if np.random.uniform() < P1:
                     # Move towards local elite
                     population[k] = self._turn(
                         local_elites[k],
                         population[k],
-                        turn_prob,
+                        turn_probs[k],
                         initial_result.attacked_text,
                     )
 
@@ -272,7 +301,7 @@ class ParticleSwarmOptimization(PopulationBasedSearch):
                     population[k] = self._turn(
                         global_elite,
                         population[k],
-                        turn_prob,
+                        turn_probs[k],
                         initial_result.attacked_text,
                     )
 
@@ -293,11 +322,11 @@ class ParticleSwarmOptimization(PopulationBasedSearch):
             ):
                 return top_member.result
 
-            # Mutation based on the current change rate
+            # Mutation based on the current change rate. Members can be the same
+            # object and `_perturb` works in-place, so ratios are computed one
+            # member at a time.
             for k in range(len(population)):
-                change_ratio = initial_result.attacked_text.words_diff_ratio(
-                    population[k].attacked_text
-                )
+                change_ratio = np.mean(self._word_ids(population[k]) != original_ids)
                 # Referred from the original source code
                 p_change = 1 - 2 * change_ratio
                 if np.random.uniform() < p_change:
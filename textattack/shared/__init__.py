@@ -12,10 +12,20 @@ from . import utils
 from .utils import logger
 from . import validators
 
+from .lineage_store import LineageStore, LineageWriter
+from .lineage_query import LineageIndex
+from .model_output_cache import ModelOutputCache
 from .text_logger import TextLogger
 from .transformation_logger import TransformationLogger
 from .le_text import LeText
 from .le_token import LeToken
 from .attacked_text import AttackedText
+from .nearest_neighbour_index import (
+    NearestNeighbourIndex,
+    IVFIndex,
+    FaissIndex,
+    build_nearest_neighbour_index,
+)
 from .word_embeddings import AbstractWordEmbedding, WordEmbedding, GensimWordEmbedding
+from .pos_lexicon import PosLexicon
 from .checkpoint import AttackCheckpoint
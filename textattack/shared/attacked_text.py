@@ -9,6 +9,8 @@ A helper class that represents a string that can be attacked.
 from collections import OrderedDict
 from lib2to3.pgen2 import token
 import math
+import numbers
+import re
 
 import flair
 from flair.data import Sentence
@@ -27,6 +29,10 @@ import textattack
 
 flair.device = device
 
+# Texts containing these characters may be segmented by ``jieba`` in
+# ``words_from_text``, which depends on context.
+_CJK_RE = re.compile("[\u2e80-\u2fdf\u3000-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]")
+
 
 
 class AttackedText(LeRecord):
@@ -62,9 +68,15 @@ class AttackedText(LeRecord):
             )
         # Process input lazily.
         self._words = None
+        # Character offset of each word in the ``SPLIT_TOKEN``-joined text.
+        self._word_offsets = None
+        self._cjk_free = None
         self._words_per_input = None
         self._pos_tags = None
         self._ner_tags = None
+        self._text = None
+        self._hash = None
+        self._attrs_fingerprint_cache = None
 
         # Format text inputs.
         self._text_input = OrderedDict([(k, v) for k, v in self._text_input.items()])
@@ -76,9 +88,17 @@ class AttackedText(LeRecord):
             raise TypeError(f"Invalid type for attack_attrs: {type(attack_attrs)}")
         # Indices of words from the *original* text. Allows us to map
         # indices between original text and this text, and vice-versa.
-        self.attack_attrs.setdefault("original_index_map", np.arange(self.num_words))
-        # A list of all indices in *this* text that have been modified.
-        self.attack_attrs.setdefault("modified_indices", set())
+        # The map is read-only, since it is shared between a text and its
+        # children whenever no words were inserted or deleted.
+        if "original_index_map" not in self.attack_attrs:
+            self.attack_attrs["original_index_map"] = np.arange(self.num_words)
+        self.attack_attrs["original_index_map"].setflags(write=False)
+        # A set of all indices in *this* text that have been modified. Like the
+        # index map, it is immutable so that children can share it.
+        modified_indices = self.attack_attrs.get("modified_indices", frozenset())
+        if not isinstance(modified_indices, frozenset):
+            modified_indices = frozenset(modified_indices)
+        self.attack_attrs["modified_indices"] = modified_indices
 
     def __eq__(self, other):
         """Compares two text instances to make sure they have the same attack
@@ -86,14 +106,33 @@ class AttackedText(LeRecord):
 
         Since some elements stored in ``self.attack_attrs`` may be numpy
         arrays, we have to take special care when comparing them.
+
+        Texts are first compared by their cached hash and attributes
+        fingerprint, so most unequal texts are rejected without comparing
+        their contents. Attributes shared between the two texts (such as an
+        index map inherited from the same parent) are not compared.
         """
-        if not (self.text == other.text):
+        if self is other:
+            return True
+        if not isinstance(other, AttackedText):
+            return NotImplemented
+        if hash(self) != hash(other) or not (self.text == other.text):
             return False
         if len(self.attack_attrs) != len(other.attack_attrs):
             return False
+        # Equal values always have equal hashes, so a differing hash rejects
+        # the pair. Anything else falls back to comparing the values.
+        other_fingerprint = other._attrs_fingerprint()
+        for key, value_hash in self._attrs_fingerprint().items():
+            other_hash = other_fingerprint.get(key)
+            if value_hash is not None and other_hash is not None:
+                if value_hash != other_hash:
+                    return False
         for key in self.attack_attrs:
             if key not in other.attack_attrs:
                 return False
+            elif self.attack_attrs[key] is other.attack_attrs[key]:
+                continue
             elif isinstance(self.attack_attrs[key], np.ndarray):
                 if not (self.attack_attrs[key].shape == other.attack_attrs[key].shape):
                     return False
@@ -105,7 +144,38 @@ class AttackedText(LeRecord):
         return True
 
     def __hash__(self):
-        return hash(self.text)
+        if self._hash is None:
+            self._hash = hash(self.text)
+        return self._hash
+
+    def _attrs_fingerprint(self):
+        """Returns a dictionary with the hash of each value of
+        ``self.attack_attrs``, such that equal values have equal hashes
+        regardless of their types (e.g. ``int`` and ``np.int64``).
+
+        Values that are not hashed by content or can change in place (e.g.
+        sets and arrays) map to ``None``. The fingerprint is cached until an
+        attribute is set, replaced or removed.
+        """
+        values = tuple(self.attack_attrs.values())
+        cached = self._attrs_fingerprint_cache
+        if (
+            cached is not None
+            and len(cached[0]) == len(values)
+            and all(a is b for a, b in zip(cached[0], values))
+        ):
+            return cached[1]
+        fingerprint = {}
+        for key, value in self.attack_attrs.items():
+            if isinstance(
+                value, (AttackedText, str, numbers.Number, frozenset, type(None))
+            ):
+                fingerprint[key] = hash(value)
+            else:
+                fingerprint[key] = None
+        # Keep references to the values, so that their ids can't be reused.
+        self._attrs_fingerprint_cache = (values, fingerprint)
+        return fingerprint
 
     def free_memory(self):
         """Delete items that take up memory.
@@ -393,6 +463,28 @@ class AttackedText(LeRecord):
             self.attack_attrs["original_index_map"] == -1
         ]
 
+    def _get_word_offsets(self, original_text):
+        """Returns the character offset of each word in ``original_text``,
+        the ``SPLIT_TOKEN``-joined text.
+
+        Offsets are found once by scanning the text from left to right and
+        then cached.
+        """
+        if self._word_offsets is None:
+            offsets = np.empty(self.num_words, dtype=np.int64)
+            pos = 0
+            for i, word in enumerate(self.words):
+                pos = original_text.index(word, pos)
+                offsets[i] = pos
+                pos += len(word)
+            self._word_offsets = offsets
+        return self._word_offsets
+
+    def _is_cjk_free(self):
+        if self._cjk_free is None:
+            self._cjk_free = not _CJK_RE.search(self.text)
+        return self._cjk_free
+
     def generate_new_attacked_text(self, new_words):
         """Returns a new AttackedText object and replaces old list of words
         with a new list of words, but preserves the punctuation and spacing of
@@ -403,32 +495,70 @@ class AttackedText(LeRecord):
         be an empty string, representing a word deletion, or a string
         with multiple space-separated words, representation an insertion
         of one or more words.
+
+        Only the spans of words that actually changed are spliced into the
+        text, using the cached word offsets. When the new words cannot merge
+        with their neighbours, the new text's words and offsets are derived
+        from this text's instead of tokenizing the new text from scratch.
         """
-        perturbed_text = ""
         original_text = AttackedText.SPLIT_TOKEN.join(self._text_input.values())
+        words = self.words
+        offsets = self._get_word_offsets(original_text)
         new_attack_attrs = dict()
         if "label_names" in self.attack_attrs:
             new_attack_attrs["label_names"] = self.attack_attrs["label_names"]
         new_attack_attrs["newly_modified_indices"] = set()
         # Point to previously monitored text.
         new_attack_attrs["previous_attacked_text"] = self
-        # Use `new_attack_attrs` to track indices with respect to the original
-        # text.
-        new_attack_attrs["modified_indices"] = self.attack_attrs[
-            "modified_indices"
-        ].copy()
-        new_attack_attrs["original_index_map"] = self.attack_attrs[
-            "original_index_map"
-        ].copy()
-        new_i = 0
+        # Track indices with respect to the original text. Both are shared
+        # with this text and only copied once they have to change.
+        modified_indices = self.attack_attrs["modified_indices"]
+        owns_modified_indices = False
+        new_idx_map = self.attack_attrs["original_index_map"]
+        owns_idx_map = False
+
+        changed_indices = [
+            i for i, (input_word, adv_word_seq) in enumerate(zip(words, new_words))
+            if input_word != adv_word_seq
+        ]
+        # Whether the new text tokenizes into this text's words with the
+        # changed words swapped in, so that its words can be derived here.
+        # CJK words are segmented by ``jieba``, which depends on context.
+        derive_words = self._is_cjk_free() and all(
+            _is_self_delimiting(new_words[i]) and not _CJK_RE.search(new_words[i])
+            for i in changed_indices
+        )
+        new_word_list = []
+        new_offset_parts = []
+
+        perturbed_pieces = []
+        perturbed_len = 0
+        # Position in `original_text` up to which text has been processed.
+        cursor = 0
+        # Next word of this text that has not been copied to `new_word_list`.
+        next_word = 0
+        # Difference between the index of a word in the new text and in this
+        # text, due to insertions and deletions before it.
+        index_shift = 0
 
         # Create the new attacked text by swapping out words from the original
         # text with a sequence of 0+ words in the new text.
-        for i, (input_word, adv_word_seq) in enumerate(zip(self.words, new_words)):
-            word_start = original_text.index(input_word)
-            word_end = word_start + len(input_word)
-            perturbed_text += original_text[:word_start] # processed text / move cursor to word_start
-            original_text = original_text[word_end:] # unprocessed text
+        for i in changed_indices:
+            input_word = words[i]
+            adv_word_seq = new_words[i]
+            word_start = int(offsets[i])
+            if derive_words:
+                new_word_list.extend(words[next_word:i])
+                new_offset_parts.append(
+                    offsets[next_word:i] + (perturbed_len - cursor)
+                )
+            # processed text / move cursor to word_start
+            gap = original_text[cursor:word_start]
+            perturbed_pieces.append(gap)
+            perturbed_len += len(gap)
+            cursor = word_start + len(input_word)
+            next_word = i + 1
+
             adv_words = words_from_text(adv_word_seq)
             adv_num_words = len(adv_words)
             num_words_diff = adv_num_words - len(words_from_text(input_word))
@@ -438,17 +568,20 @@ class AttackedText(LeRecord):
                 # Re-calculated modified indices. If words are inserted or deleted,
                 # they could change.
                 shifted_modified_indices = set()
-                for modified_idx in new_attack_attrs["modified_indices"]:
+                for modified_idx in modified_indices:
                     if modified_idx < i:
                         shifted_modified_indices.add(modified_idx)
                     elif modified_idx > i:
                         shifted_modified_indices.add(modified_idx + num_words_diff)
                     else:
                         pass
-                new_attack_attrs["modified_indices"] = shifted_modified_indices
+                modified_indices = shifted_modified_indices
+                owns_modified_indices = True
                 # Track insertions and deletions wrt original text.
                 # original_modification_idx = i
-                new_idx_map = new_attack_attrs["original_index_map"].copy()
+                if not owns_idx_map:
+                    new_idx_map = new_idx_map.copy()
+                    owns_idx_map = True
                 if num_words_diff == -1:
                     # Word deletion at i
                     new_idx_map[new_idx_map == i] = -1
@@ -458,30 +591,48 @@ class AttackedText(LeRecord):
                     # If insertion happens before the `input_word`
                     new_idx_map[new_idx_map == i] += num_words_diff
 
-                new_attack_attrs["original_index_map"] = new_idx_map
-            # Move pointer and save indices of new modified words. --> insertion
-            for j in range(i, i + adv_num_words):
-                if input_word != adv_word_seq:
-                    new_attack_attrs["modified_indices"].add(new_i)
-                    new_attack_attrs["newly_modified_indices"].add(new_i)
-                new_i += 1
+            # Save indices of new modified words. --> insertion
+            new_i = i + index_shift
+            for j in range(new_i, new_i + adv_num_words):
+                if j not in modified_indices:
+                    if not owns_modified_indices:
+                        modified_indices = set(modified_indices)
+                        owns_modified_indices = True
+                    modified_indices.add(j)
+                new_attack_attrs["newly_modified_indices"].add(j)
+            index_shift += adv_num_words - 1
+
             # Check spaces for deleted text.
-            if adv_num_words == 0 and len(original_text):
+            if adv_num_words == 0 and cursor < len(original_text):
                 # Remove extra space (or else there would be two spaces for each
                 # deleted word).
                 # @TODO What to do with punctuation in this case? This behavior is undefined.
                 if i == 0:
                     # If the first word was deleted, take a subsequent space.
-                    if original_text[0] == " ":
-                        original_text = original_text[1:]
+                    if original_text[cursor] == " ":
+                        cursor += 1
                 else:
                     # If a word other than the first was deleted, take a preceding space.
-                    if perturbed_text[-1] == " ":
-                        perturbed_text = perturbed_text[:-1]
-            # Add substitute word(s) to new sentence.
-            perturbed_text += adv_word_seq
+                    if _remove_trailing_space(perturbed_pieces):
+                        perturbed_len -= 1
 
-        perturbed_text += original_text  # Add all of the ending punctuation. -- rest of unprocessed text
+            # Add substitute word(s) to new sentence.
+            if derive_words:
+                pos = 0
+                for adv_word in adv_words:
+                    pos = adv_word_seq.index(adv_word, pos)
+                    new_offset_parts.append([perturbed_len + pos])
+                    pos += len(adv_word)
+                new_word_list.extend(adv_words)
+            perturbed_pieces.append(adv_word_seq)
+            perturbed_len += len(adv_word_seq)
+
+        if derive_words:
+            new_word_list.extend(words[next_word:])
+            new_offset_parts.append(offsets[next_word:] + (perturbed_len - cursor))
+        # Add all of the ending punctuation. -- rest of unprocessed text
+        perturbed_pieces.append(original_text[cursor:])
+        perturbed_text = "".join(perturbed_pieces)
 
         # Reform perturbed_text into an OrderedDict.
         perturbed_input_texts = perturbed_text.split(AttackedText.SPLIT_TOKEN)
@@ -489,7 +640,16 @@ class AttackedText(LeRecord):
             zip(self._text_input.keys(), perturbed_input_texts)
         )
 
+        new_attack_attrs["modified_indices"] = (
+            frozenset(modified_indices) if owns_modified_indices else modified_indices
+        )
+        new_attack_attrs["original_index_map"] = new_idx_map
         new_text = AttackedText(perturbed_input, attack_attrs=new_attack_attrs)
+        if derive_words:
+            new_text._words = new_word_list
+            new_text._word_offsets = np.concatenate(new_offset_parts).astype(np.int64)
+            # Neither this text nor any of the new words contain CJK characters.
+            new_text._cjk_free = True
 
         return new_text
 
@@ -499,7 +659,8 @@ class AttackedText(LeRecord):
         Note that current text and `x` must have same number of words.
         """
         assert self.num_words == x.num_words
-        return float(np.sum(self.words != x.words)) / self.num_words
+        num_diff_words = np.sum(np.array(self.words) != np.array(x.words))
+        return float(num_diff_words) / self.num_words
 
     def align_with_model_tokens(self, model_wrapper):
         """Align AttackedText's `words` with target model's tokenization scheme
@@ -577,7 +738,9 @@ class AttackedText(LeRecord):
 
         Multiply inputs are joined with a line break.
         """
-        return "\n".join(self._text_input.values())
+        if self._text is None:
+            self._text = "\n".join(self._text_input.values())
+        return self._text
 
     @property
     def num_words(self):
@@ -618,3 +781,22 @@ class AttackedText(LeRecord):
 
     def __repr__(self):
         return f'<AttackedText "{self.text}">'
+
+
+def _is_self_delimiting(word_seq):
+    """Whether ``word_seq`` tokenizes the same on its own as when spliced in
+    between the separators around a word, i.e. it is empty or starts and ends
+    with a character that cannot be absorbed into a neighbouring word."""
+    return word_seq == "" or (word_seq[0].isalnum() and word_seq[-1].isalnum())
+
+
+def _remove_trailing_space(pieces):
+    """Removes a trailing space from the text made of ``pieces``. Returns
+    whether a space was removed."""
+    for k in range(len(pieces) - 1, -1, -1):
+        if pieces[k]:
+            if pieces[k][-1] != " ":
+                return False
+            pieces[k] = pieces[k][:-1]
+            return True
+    return False
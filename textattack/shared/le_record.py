@@ -3,14 +3,15 @@ from typing import List
 import numpy as np
 import nltk
 from collections import OrderedDict
-import copy
+import atexit
+import multiprocessing
 
 import difflib
 import itertools
 
 import textattack
-from .utils.text import diff_text
-from .utils import device, tokens_from_text
+from .utils import device, token_table_from_text
+from .lineage_store import LineageWriter
 from .transformation_logger import TransformationLogger
 from .text_logger import TextLogger
 
@@ -36,8 +37,26 @@ class LeRecord:
     id_iter = itertools.count()
     sent_tokenizer = nltk.tokenize.punkt.PunktSentenceTokenizer()
     SPLIT_TOKEN = "<SPLIT>"
-    transform_logger = TransformationLogger(dirname='../results/')
-    text_logger = TextLogger(dirname='../results/')
+    # Ids are ``shard << LINEAGE_ID_SHARD_SHIFT | n``, so that worker
+    # processes never hand out the same text or transformation id.
+    LINEAGE_ID_SHARD_SHIFT = 40
+    # If ``True``, token diffs are only computed and transformations only
+    # logged once a candidate survives constraint filtering (see
+    # ``materialize_lineage``), instead of for every candidate.
+    lazy_lineage = False
+    lineage_dirname = '../results/'
+    lineage_writer = LineageWriter()
+    # Logs are cleared when they are configured, except in child processes
+    # (e.g. spawned attack workers importing textattack), which would
+    # otherwise clobber the main process's logs. Workers log to their own
+    # shards via ``configure_lineage``.
+    _is_main_process = multiprocessing.parent_process() is None
+    transform_logger = TransformationLogger(
+        dirname=lineage_dirname, writer=lineage_writer, truncate=_is_main_process
+    )
+    text_logger = TextLogger(
+        dirname=lineage_dirname, writer=lineage_writer, truncate=_is_main_process
+    )
 
     def __init__(self, text_input, le_attrs=None):
         self._id = None
@@ -62,6 +81,9 @@ class LeRecord:
 
         self._tokens = None
         self._token_word_inds = None
+        # (source record, transformation type, indices_to_modify) of a
+        # transformation whose lineage has not been materialized yet.
+        self._pending_lineage = None
 
         self.le_attrs.setdefault("transformation_history", [])
         self.le_attrs.setdefault("previous", None)
@@ -102,49 +124,83 @@ class LeRecord:
 
         # apply the provided function to the text stored in LeText
         transformed_texts = transformation._get_transformations(self, indices_to_modify)
+        transformation_type = transformation.__class__.__name__
 
         for output_text in transformed_texts:
-            new_tokens, changes = self.generate_new_record(output_text.text)
-            output_text._tokens = new_tokens
-
-            transformation_type = transformation.__class__.__name__
-            
             new_le_attrs = {
                 "transformation_history": self.le_attrs["transformation_history"] + [f"<{transformation_type}: {indices_to_modify}>"],
                 "previous": self 
             }
             output_text.le_attrs = new_le_attrs
+            output_text._pending_lineage = (self, transformation_type, indices_to_modify)
 
-            modified_inds = (indices_to_modify, output_text.attack_attrs["newly_modified_indices"])
-
-            LeRecord.transform_logger.log_transformation(self.id, output_text.id, transformation_type, modified_inds, changes)
+            if not LeRecord.lazy_lineage:
+                output_text.materialize_lineage()
 
-        LeRecord.text_logger.flush()
-        LeRecord.transform_logger.flush()
+        # Rows are handed to the background lineage writer in bulk segments
+        # once the loggers' buffers fill up, so there is no need to flush
+        # after every transformation.
         return transformed_texts
 
+    def materialize_lineage(self):
+        """Computes the token diff against the record this one was
+        transformed from, propagates token attributes, and logs the
+        transformation.
+
+        Does nothing if the lineage was already materialized. In lazy
+        lineage mode, this is called for candidates that survive constraint
+        filtering, or when ``tokens`` is first accessed.
+        """
+        if self._pending_lineage is None:
+            return
+        source, transformation_type, indices_to_modify = self._pending_lineage
+        self._pending_lineage = None
+        # The source's own edge must be logged before this one.
+        source.materialize_lineage()
+
+        new_tokens, changes = source.generate_new_record(self._token_source_text())
+        self._tokens = new_tokens
+        self._token_word_inds = None
+
+        modified_inds = (indices_to_modify, self.attack_attrs["newly_modified_indices"])
+        LeRecord.transform_logger.log_transformation(source.id, self.id, transformation_type, modified_inds, changes)
 
     def generate_new_record(self, output_text: str):
-        # find changes between self.text and output_text
-        old_tokens, new_tokens, changes = diff_text(self.text, output_text, tokenizer=tokens_from_text)
+        """Tokenizes ``output_text`` into a ``TokenTable`` and propagates the
+        ops of this record's tokens to it.
+
+        Returns the new token table and the ``difflib`` opcodes between this
+        record's tokens and the new tokens.
+        """
+        old_tokens = self.tokens
+        # Share the op history registry so that op ids can be copied over.
+        new_tokens = token_table_from_text(
+            output_text, op_histories=old_tokens.op_histories
+        )
+        # find changes between self.tokens and new_tokens
+        seq = difflib.SequenceMatcher(None, old_tokens.token_texts(), new_tokens.token_texts())
+        changes = seq.get_opcodes()
 
         for (tag, i1, i2, j1, j2) in changes:
             if tag == 'equal' and (j2 - j1) == (i2 - i1):
-                for offset in range(0, j2 - j1):
-                    new_tokens[j1 + offset].le_attrs = copy.deepcopy(self.tokens[i1 + offset].le_attrs)
+                new_tokens.op_ids[j1:j2] = old_tokens.op_ids[i1:i2]
             elif tag == 'replace' and (j2 - j1) == (i2 - i1):
                 for offset in range(0, j2 - j1):
-                    new_tokens[j1 + offset].le_attrs = copy.deepcopy(self.tokens[i1 + offset].le_attrs)
-                    new_tokens[j1 + offset].le_attrs['ops'].append('replace')
+                    new_tokens.set_ops(j1 + offset, old_tokens.ops(i1 + offset) + ('replace',))
             elif tag == 'insert':
                 for j in range(j1, j2):
-                    new_tokens[j].le_attrs['ops'] = ['insert']
+                    new_tokens.set_ops(j, ('insert',))
             elif tag == 'delete':
                 for i in range(i1, i2):
-                    self.tokens[i].le_attrs['ops'].append('delete')
+                    old_tokens.add_op(i, 'delete')
     
         return new_tokens, changes
 
+    def _token_source_text(self):
+        """The string that ``tokens`` are computed from, with inputs joined by
+        ``SPLIT_TOKEN``."""
+        return LeRecord.SPLIT_TOKEN.join(self._text_input.values())
+
 
     @property
     def column_labels(self):
@@ -156,7 +212,7 @@ class LeRecord:
 
     @property
     def id(self):
-        if not self._id:
+        if self._id is None:
             self._id = next(LeRecord.id_iter)
             LeRecord.text_logger.log_text(self._id, self.printable_text(), self.le_attrs)
             #LeRecord.text_logger.flush()
@@ -186,18 +242,19 @@ class LeRecord:
 
     @property
     def token_word_inds(self):
-        if self.tokens and not self._token_word_inds:
-            self._token_word_inds =  [ i for i in range(len(self.tokens)) if self.tokens[i].le_attrs['is_word']]
+        if self._token_word_inds is None:
+            self._token_word_inds = self.tokens.word_indices()
 
         return self._token_word_inds
 
     @property
     def tokens(self):
-        if not self._tokens:
-            cur_text = LeRecord.SPLIT_TOKEN.join(self._text_input.values())
-
-            self._tokens = tokens_from_text(cur_text)
-            self._token_word_inds = [ i for i in range(len(self._tokens)) if self._tokens[i].le_attrs['is_word']]
+        """The ``TokenTable`` of this record's words and separators."""
+        if self._pending_lineage is not None:
+            self.materialize_lineage()
+        if self._tokens is None:
+            self._tokens = token_table_from_text(self._token_source_text())
+            self._token_word_inds = None
 
             self.attack_attrs["src"] = True
 
@@ -205,7 +262,7 @@ class LeRecord:
 
     def printable_tokens(self, key_color="bold", key_color_method=None):
 
-        token_strings = list(map(str, self.tokens))
+        token_strings = self.tokens.token_texts()
 
         # For single-sequence inputs, don't show a prefix.
         if len(self._text_input) == 1:
@@ -238,4 +295,50 @@ class LeRecord:
     def __repr__(self):
         class_name = self.__class__.__name__
         return f'<{class_name} "{self.text}">'
+
+    @staticmethod
+    def flush_lineage():
+        """Writes all buffered lineage rows to disk and waits for the
+        background writer to finish."""
+        LeRecord.text_logger.flush()
+        LeRecord.transform_logger.flush()
+        LeRecord.lineage_writer.drain()
+
+    @staticmethod
+    def configure_lineage(dirname=None, shard=None):
+        """Points lineage logging at a new directory and/or worker shard.
+
+        Worker processes call this with a unique ``shard`` number so that
+        they write their own files with ids that are unique across all
+        workers. Rows already buffered are flushed to the previous logs.
+        """
+        LeRecord.flush_lineage()
+        if dirname is not None:
+            LeRecord.lineage_dirname = dirname
+        id_start = (shard or 0) << LeRecord.LINEAGE_ID_SHARD_SHIFT
+        LeRecord.id_iter = itertools.count(id_start)
+        TransformationLogger.id_iter = itertools.count(id_start)
+        LeRecord.transform_logger = TransformationLogger(
+            dirname=LeRecord.lineage_dirname, writer=LeRecord.lineage_writer, shard=shard
+        )
+        LeRecord.text_logger = TextLogger(
+            dirname=LeRecord.lineage_dirname, writer=LeRecord.lineage_writer, shard=shard
+        )
+
+    @staticmethod
+    def clear_lineage_shards():
+        """Deletes worker shards left over from a previous run."""
+        LeRecord.text_logger.remove_shards()
+        LeRecord.transform_logger.remove_shards()
+
+    @staticmethod
+    def merge_lineage_shards():
+        """Combines the logs written by worker shards into this process's
+        logs, producing one lineage graph."""
+        LeRecord.flush_lineage()
+        LeRecord.text_logger.merge_shards()
+        LeRecord.transform_logger.merge_shards()
+
+
+atexit.register(LeRecord.flush_lineage)
         
\ No newline at end of file
@@ -0,0 +1,353 @@
+"""
+Lineage Query
+========================
+
+Indexed queries over the text and transformation lineage logs.
+"""
+
+import csv
+import glob
+import hashlib
+import itertools
+import os.path as osp
+import re
+import sqlite3
+
+from .text_logger import TextLogger
+from .transformation_logger import TransformationLogger
+from .utils import LazyLoader
+
+pq = LazyLoader("pyarrow.parquet", globals(), "pyarrow.parquet")
+
+
+def text_hash(text):
+    """Stable 64-bit hash of ``text`` that fits in a SQLite ``INTEGER``."""
+    digest = hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little", signed=True)
+
+
+class LineageIndex:
+    """Traces texts through the lineage logs written during an attack, using
+    an on-disk SQLite index instead of loading the logs into memory.
+
+    Transformations are indexed by ``prev_text`` and ``after_text`` and texts
+    by a hash of their content, so tracing an adversarial example back to its
+    source only touches the rows on its path.
+
+    Args:
+        db_path (str): Path of the SQLite index, as created by :meth:`build`.
+
+    Example::
+
+        >>> index = LineageIndex.build("../results/")
+        >>> perturbed_id = index.text_id(perturbed_text)
+        >>> original_id = index.ancestors(perturbed_id)[-1]
+        >>> for text_id in index.path(original_id, perturbed_id):
+        ...     print(index.text(text_id))
+    """
+
+    DB_NAME = "lineage.sqlite"
+    BATCH_SIZE = 65536
+
+    def __init__(self, db_path):
+        if not osp.exists(db_path):
+            raise FileNotFoundError(f"No lineage index found at {db_path}.")
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+
+    @classmethod
+    def build(cls, dirname="../results/", db_path=None, fmt=None):
+        """Builds the index from ``text.csv`` and ``transformation.csv`` in
+        ``dirname`` and returns a :class:`LineageIndex` over it.
+
+        The logs are streamed in batches, so building uses bounded memory
+        regardless of the number of edges. An existing index at ``db_path``
+        is replaced.
+
+        ``fmt`` is the format the logs were written in (``"csv"`` or
+        ``"parquet"``). By default, it is ``"csv"`` if ``text.csv`` exists
+        and ``"parquet"`` if only parquet segments do. Parquet segments
+        written by worker shards are included.
+        """
+        text_path = osp.join(dirname, "text.csv")
+        transformation_path = osp.join(dirname, "transformation.csv")
+        if fmt is None:
+            only_parquet = not osp.exists(text_path) and _parquet_segments(text_path)
+            fmt = "parquet" if only_parquet else "csv"
+        if fmt not in ("csv", "parquet"):
+            raise ValueError(f"Invalid lineage format {fmt} (must be csv or parquet)")
+
+        db_path = db_path or osp.join(dirname, cls.DB_NAME)
+        conn = sqlite3.connect(db_path)
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.executescript(
+            """
+            DROP TABLE IF EXISTS texts;
+            DROP TABLE IF EXISTS transformations;
+            CREATE TABLE texts (
+                text_id INTEGER PRIMARY KEY,
+                text TEXT,
+                text_hash INTEGER
+            );
+            CREATE TABLE transformations (
+                transformation_id INTEGER,
+                transformation_type TEXT,
+                prev_text INTEGER,
+                after_text INTEGER,
+                from_modified_indices TEXT,
+                to_modified_indices TEXT,
+                changes TEXT
+            );
+            """
+        )
+
+        texts = (
+            (_to_int(text_id), text, text_hash(text))
+            for text_id, text in _read_rows(
+                text_path, TextLogger.columns, fmt, nullable=("text_id",)
+            )
+        )
+        _insert_batched(
+            conn, "INSERT OR REPLACE INTO texts VALUES (?, ?, ?)", texts, cls.BATCH_SIZE
+        )
+        transformations = (
+            (
+                _to_int(row[0]),
+                row[1],
+                _to_int(row[2]),
+                _to_int(row[3]),
+                *(None if v is None else str(v) for v in row[4:]),
+            )
+            for row in _read_rows(
+                transformation_path,
+                TransformationLogger.columns,
+                fmt,
+                nullable=_NULLABLE_TRANSFORMATION_COLUMNS,
+            )
+        )
+        _insert_batched(
+            conn,
+            f"INSERT INTO transformations VALUES ({', '.join('?' * len(TransformationLogger.columns))})",
+            transformations,
+            cls.BATCH_SIZE,
+        )
+
+        # Building indexes after the bulk load is much faster than keeping
+        # them up to date on every insert.
+        conn.executescript(
+            """
+            CREATE INDEX idx_texts_hash ON texts (text_hash);
+            CREATE INDEX idx_transformations_prev ON transformations (prev_text);
+            CREATE INDEX idx_transformations_after ON transformations (after_text);
+            """
+        )
+        conn.commit()
+        conn.close()
+        return cls(db_path)
+
+    def close(self):
+        self.conn.close()
+
+    def text(self, text_id):
+        """Returns the text logged under ``text_id``."""
+        row = self.conn.execute(
+            "SELECT text FROM texts WHERE text_id = ?", (text_id,)
+        ).fetchone()
+        if row is None:
+            raise KeyError(f"No text with id {text_id} in lineage index.")
+        return row[0]
+
+    def text_id(self, text):
+        """Returns the id of the first logged text equal to ``text``, or
+        ``None`` if it was never logged."""
+        row = self.conn.execute(
+            "SELECT text_id FROM texts WHERE text_hash = ? AND text = ? ORDER BY text_id LIMIT 1",
+            (text_hash(text), text),
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def parents(self, text_id):
+        """Returns the ids of the texts that ``text_id`` was directly
+        transformed from."""
+        rows = self.conn.execute(
+            "SELECT prev_text FROM transformations WHERE after_text = ?", (text_id,)
+        )
+        return [row[0] for row in rows]
+
+    def children(self, text_id):
+        """Returns the ids of the texts directly transformed from
+        ``text_id``."""
+        rows = self.conn.execute(
+            "SELECT after_text FROM transformations WHERE prev_text = ?", (text_id,)
+        )
+        return [row[0] for row in rows]
+
+    def ancestors(self, text_id):
+        """Returns the ids of all texts that ``text_id`` was derived from,
+        nearest first."""
+        rows = self.conn.execute(
+            """
+            WITH RECURSIVE anc(text_id, depth) AS (
+                SELECT prev_text, 1 FROM transformations WHERE after_text = ?
+                UNION
+                SELECT t.prev_text, anc.depth + 1
+                FROM transformations t JOIN anc ON t.after_text = anc.text_id
+            )
+            SELECT text_id FROM anc GROUP BY text_id ORDER BY MIN(depth), text_id
+            """,
+            (text_id,),
+        )
+        return [row[0] for row in rows]
+
+    def descendants(self, text_id):
+        """Returns the ids of all texts derived from ``text_id``, nearest
+        first."""
+        rows = self.conn.execute(
+            """
+            WITH RECURSIVE des(text_id, depth) AS (
+                SELECT after_text, 1 FROM transformations WHERE prev_text = ?
+                UNION
+                SELECT t.after_text, des.depth + 1
+                FROM transformations t JOIN des ON t.prev_text = des.text_id
+            )
+            SELECT text_id FROM des GROUP BY text_id ORDER BY MIN(depth), text_id
+            """,
+            (text_id,),
+        )
+        return [row[0] for row in rows]
+
+    def path(self, original_id, perturbed_id):
+        """Returns the ids of the texts on the chain of transformations from
+        ``original_id`` to ``perturbed_id`` (both included), or ``None`` if
+        ``perturbed_id`` was not derived from ``original_id``."""
+        # Walk backwards from the perturbed text, since a text usually has a
+        # single parent but many children.
+        parent_of = {perturbed_id: None}
+        frontier = [perturbed_id]
+        while frontier and original_id not in parent_of:
+            next_frontier = []
+            for text_id in frontier:
+                for parent_id in self.parents(text_id):
+                    if parent_id not in parent_of:
+                        parent_of[parent_id] = text_id
+                        next_frontier.append(parent_id)
+            frontier = next_frontier
+        if original_id not in parent_of:
+            return None
+        path = [original_id]
+        while path[-1] != perturbed_id:
+            path.append(parent_of[path[-1]])
+        return path
+
+    def transformation(self, prev_id, after_id):
+        """Returns the logged transformation from ``prev_id`` to ``after_id``
+        as a dictionary, or ``None`` if there is none."""
+        row = self.conn.execute(
+            "SELECT * FROM transformations WHERE prev_text = ? AND after_text = ? LIMIT 1",
+            (prev_id, after_id),
+        ).fetchone()
+        return None if row is None else dict(zip(TransformationLogger.columns, row))
+
+    def subgraph(self, text_id):
+        """Returns every transformation reachable from ``text_id`` as a list
+        of dictionaries with the columns of ``transformation.csv``."""
+        rows = self.conn.execute(
+            """
+            WITH RECURSIVE des(text_id) AS (
+                SELECT ?
+                UNION
+                SELECT t.after_text
+                FROM transformations t JOIN des ON t.prev_text = des.text_id
+            )
+            SELECT t.* FROM transformations t JOIN des ON t.prev_text = des.text_id
+            ORDER BY t.transformation_id
+            """,
+            (text_id,),
+        )
+        return [dict(zip(TransformationLogger.columns, row)) for row in rows]
+
+    def export_subgraph(self, text_id, dirname):
+        """Writes the subgraph reachable from ``text_id`` to ``text.csv`` and
+        ``transformation.csv`` in ``dirname``, in the same format as the
+        original logs."""
+        edges = self.subgraph(text_id)
+        text_ids = [text_id] + [edge["after_text"] for edge in edges]
+        with open(osp.join(dirname, "text.csv"), "w", newline="") as f:
+            writer = csv.writer(f, quoting=csv.QUOTE_NONNUMERIC)
+            writer.writerows((i, self.text(i)) for i in dict.fromkeys(text_ids))
+        with open(osp.join(dirname, "transformation.csv"), "w", newline="") as f:
+            writer = csv.writer(f, quoting=csv.QUOTE_NONNUMERIC)
+            writer.writerows(
+                [edge[c] for c in TransformationLogger.columns] for edge in edges
+            )
+
+
+# Columns of the transformation log where an empty CSV field is a ``None``.
+_NULLABLE_TRANSFORMATION_COLUMNS = (
+    "transformation_id",
+    "prev_text",
+    "after_text",
+    "from_modified_indices",
+    "to_modified_indices",
+)
+
+
+def _read_rows(path, columns, fmt, nullable=()):
+    """Yields the rows of a lineage log as lists of values.
+
+    Empty CSV fields are ``None`` in the ``nullable`` columns, and empty
+    strings in the others (e.g. a logged empty text).
+    """
+    if fmt == "parquet":
+        for segment in _parquet_segments(path):
+            batches = pq.ParquetFile(segment).iter_batches(
+                batch_size=LineageIndex.BATCH_SIZE, columns=columns
+            )
+            for batch in batches:
+                values = batch.to_pydict()
+                yield from zip(*(values[c] for c in columns))
+        return
+    if not osp.exists(path):
+        return
+    with open(path, newline="") as f:
+        # Logs are written with QUOTE_NONNUMERIC, but reading them back that
+        # way fails on empty fields (e.g. a ``None`` index list), so values are
+        # read as strings and converted by column.
+        is_nullable = [c in nullable for c in columns]
+        for row in csv.reader(f):
+            yield [
+                None if v == "" and null else v for v, null in zip(row, is_nullable)
+            ]
+
+
+def _parquet_segments(path):
+    """Returns the parquet segments of ``path`` and of its worker shards."""
+    root, ext = osp.splitext(path)
+    pattern = re.compile(
+        re.escape(root) + r"(\.\d+)?" + re.escape(ext) + r"\.\d+\.parquet$"
+    )
+    return sorted(
+        segment
+        for segment in glob.glob(f"{glob.escape(root)}*.parquet")
+        if pattern.match(segment)
+    )
+
+
+def _to_int(value):
+    if value is None or isinstance(value, int):
+        return value
+    try:
+        return int(value)
+    except ValueError:
+        return int(float(value))
+
+
+def _insert_batched(conn, sql, rows, batch_size):
+    rows = iter(rows)
+    while True:
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            break
+        conn.executemany(sql, batch)
+
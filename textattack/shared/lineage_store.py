@@ -0,0 +1,307 @@
+"""
+Lineage Store
+========================
+
+Append-only columnar storage for transformation and text lineage rows.
+"""
+
+import csv
+import glob
+import os
+import os.path as osp
+import queue
+import re
+import shutil
+import threading
+
+from .utils import LazyLoader
+
+pa = LazyLoader("pyarrow", globals(), "pyarrow")
+pq = LazyLoader("pyarrow.parquet", globals(), "pyarrow.parquet")
+
+
+class LineageStore:
+    """Buffers lineage rows in preallocated column arrays and writes them to
+    disk in bulk segments.
+
+    Appending a row only stores each value into its column slot, so logging
+    costs amortized O(1) per row and memory stays bounded by ``flush_size``
+    rows. Once the buffer is full, it is written out as one segment.
+
+    Args:
+        path (str): Path of the output file. For the ``"parquet"`` format,
+            segments are written next to it as ``<path>.<n>.parquet``.
+        columns (list[str]): Names of the columns stored for each row.
+        flush_size (int): Number of buffered rows that triggers a segment write.
+        fmt (str): Segment format. One of ``"csv"`` (appends to a single CSV
+            file, readable with ``pandas.read_csv``) or ``"parquet"``
+            (requires ``pyarrow``).
+        truncate (bool): Whether to clear ``path`` (and, for the
+            ``"parquet"`` format, its existing segments) when the store is
+            created, so that a run that logs nothing does not leave the
+            previous run's rows behind.
+        writer (:class:`LineageWriter`, `optional`): If set, full segments are
+            handed to this background writer instead of being written on the
+            calling thread.
+    """
+
+    FORMATS = ("csv", "parquet")
+
+    def __init__(
+        self, path, columns, flush_size=4096, fmt="csv", truncate=True, writer=None
+    ):
+        if fmt not in LineageStore.FORMATS:
+            raise ValueError(
+                f"Invalid lineage format {fmt} (must be one of {LineageStore.FORMATS})"
+            )
+        if flush_size <= 0:
+            raise ValueError("`flush_size` must be greater than 0.")
+        self.path = path
+        self.columns = list(columns)
+        self.flush_size = flush_size
+        self.fmt = fmt
+        self.writer = writer
+        self.num_segments = 0
+        self.num_rows_written = 0
+
+        if truncate:
+            self._truncate()
+        self._buffers = self._new_buffers()
+        self._size = 0
+        # Rows may be appended from several threads (e.g. concurrent attacks).
+        self._lock = threading.Lock()
+        # Segments taken by different threads may be written concurrently.
+        self._write_lock = threading.Lock()
+
+    def __len__(self):
+        """Number of rows buffered but not yet written."""
+        return self._size
+
+    def append(self, *values):
+        """Appends one row, given as values in the order of ``self.columns``."""
+        if len(values) != len(self.columns):
+            raise ValueError(
+                f"Expected {len(self.columns)} values per row, got {len(values)}."
+            )
+        with self._lock:
+            i = self._size
+            for buf, value in zip(self._buffers, values):
+                buf[i] = value
+            self._size = i + 1
+            # Take the full buffer in the same locked section, so that other
+            # threads append to fresh buffers while it is being written.
+            segment = self._take_segment() if self._size == self.flush_size else None
+        if segment is not None:
+            self._submit_segment(segment)
+
+    def take_segment(self):
+        """Removes all buffered rows from the store and returns them as a
+        list of columns."""
+        with self._lock:
+            return self._take_segment()
+
+    def _take_segment(self):
+        """Like ``take_segment``, but must be called with ``_lock`` held."""
+        if self._size == self.flush_size:
+            segment = self._buffers
+        else:
+            segment = [buf[: self._size] for buf in self._buffers]
+        self._buffers = self._new_buffers()
+        self._size = 0
+        return segment
+
+    def _new_buffers(self):
+        return [[None] * self.flush_size for _ in self.columns]
+
+    def write_segment(self, segment):
+        """Writes a list of columns (as returned by ``take_segment``) to
+        disk."""
+        num_rows = len(segment[0]) if segment else 0
+        if not num_rows:
+            return
+        with self._write_lock:
+            self._write_segment(segment, num_rows)
+
+    def _write_segment(self, segment, num_rows):
+        self._prepare()
+        if self.fmt == "csv":
+            with open(self.path, "a", newline="") as f:
+                writer = csv.writer(f, quoting=csv.QUOTE_NONNUMERIC)
+                writer.writerows(zip(*segment))
+        else:
+            table = pa.table(
+                {
+                    name: [_to_arrow_value(v) for v in column]
+                    for name, column in zip(self.columns, segment)
+                }
+            )
+            pq.write_table(table, self._segment_path())
+        self.num_segments += 1
+        self.num_rows_written += num_rows
+
+    def _segment_path(self):
+        """Path of the next parquet segment of this store."""
+        return f"{self.path}.{self.num_segments:05d}.parquet"
+
+    def _prepare(self):
+        dirname = osp.dirname(self.path)
+        if dirname and not osp.exists(dirname):
+            os.makedirs(dirname, exist_ok=True)
+
+    def _truncate(self):
+        self._prepare()
+        if self.fmt == "csv":
+            open(self.path, "w").close()
+        else:
+            for segment in glob.glob(f"{glob.escape(self.path)}.*.parquet"):
+                os.remove(segment)
+
+    def merge(self, paths):
+        """Adds the rows of other files written with the same columns and
+        format (e.g. per-process shards, as returned by :func:`find_shards`)
+        to this store and removes them.
+
+        Buffered rows of this store are written first. CSV files are appended
+        to ``self.path``. Parquet segments are standalone files already, so
+        they are renamed to the next segments of this store.
+        """
+        self.close()
+        self._prepare()
+        if self.fmt == "csv":
+            with open(self.path, "ab") as fout:
+                for path in paths:
+                    with open(path, "rb") as fin:
+                        shutil.copyfileobj(fin, fout)
+                    os.remove(path)
+        else:
+            for path in paths:
+                num_rows = pq.ParquetFile(path).metadata.num_rows
+                os.replace(path, self._segment_path())
+                self.num_segments += 1
+                self.num_rows_written += num_rows
+
+    def flush(self):
+        """Writes all buffered rows to disk as one segment.
+
+        With a ``writer``, the segment is only queued for writing; call
+        :meth:`LineageWriter.drain` to wait until it is on disk.
+        """
+        if not self._size:
+            return
+        segment = self.take_segment()
+        if not segment[0]:
+            # Another thread flushed the rows first.
+            return
+        self._submit_segment(segment)
+
+    def _submit_segment(self, segment):
+        if self.writer is None:
+            self.write_segment(segment)
+        else:
+            self.writer.submit(self, segment)
+
+    def close(self):
+        self.flush()
+        if self.writer is not None:
+            self.writer.drain()
+
+
+class LineageWriter:
+    """Writes segments of one or more :class:`LineageStore` objects on a
+    background thread, so that serialization and disk I/O stay off the search
+    loop.
+
+    Pending segments are held in a bounded queue. When the queue is full,
+    :meth:`submit` blocks until the writer catches up, which bounds memory
+    use if the disk is slower than the attack.
+
+    Args:
+        max_pending_segments (int): Maximum number of segments waiting to be
+            written before :meth:`submit` blocks.
+    """
+
+    def __init__(self, max_pending_segments=8):
+        self._queue = queue.Queue(maxsize=max_pending_segments)
+        self._error = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="LineageWriter", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            store, segment = self._queue.get()
+            try:
+                store.write_segment(segment)
+            except Exception as e:
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+    def submit(self, store, segment):
+        """Queues ``segment`` to be written by ``store``.
+
+        Blocks while ``max_pending_segments`` segments are already queued.
+        """
+        self._raise_error()
+        self._start()
+        self._queue.put((store, segment))
+
+    def drain(self):
+        """Blocks until every queued segment has been written."""
+        if self._thread is not None:
+            self._queue.join()
+        self._raise_error()
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+
+def shard_path(path, shard):
+    """Path of the shard of ``path`` written by worker ``shard``, e.g.
+    ``text.csv`` -> ``text.3.csv``."""
+    root, ext = osp.splitext(path)
+    return f"{root}.{shard}{ext}"
+
+
+def find_shards(path, fmt="csv"):
+    """Returns the existing shard files of ``path`` written in format ``fmt``,
+    ordered by shard number.
+
+    For the ``"parquet"`` format, these are the segments of every shard,
+    ordered by shard number and then by segment number.
+    """
+    root, ext = osp.splitext(path)
+    if fmt == "csv":
+        suffix, candidates = "$", f"{glob.escape(root)}.*{ext}"
+    elif fmt == "parquet":
+        suffix, candidates = r"\.(\d+)\.parquet$", f"{glob.escape(root)}.*.parquet"
+    else:
+        raise ValueError(
+            f"Invalid lineage format {fmt} (must be one of {LineageStore.FORMATS})"
+        )
+    pattern = re.compile(re.escape(root) + r"\.(\d+)" + re.escape(ext) + suffix)
+    shards = []
+    for candidate in glob.glob(candidates):
+        match = pattern.match(candidate)
+        if match:
+            numbers = tuple(int(n) for n in match.groups())
+            shards.append((numbers, candidate))
+    return [candidate for _, candidate in sorted(shards)]
+
+
+def _to_arrow_value(value):
+    """Arrow columns must be homogeneously typed, so anything that isn't a
+    scalar (e.g. sets of indices or diff opcodes) is stored as its string
+    representation, like it would be in the CSV format."""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return str(value)
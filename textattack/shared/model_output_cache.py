@@ -0,0 +1,234 @@
+"""
+Model Output Cache
+========================
+
+Persistent, on-disk cache of victim model outputs shared across examples,
+runs and processes.
+"""
+
+import hashlib
+import os
+import os.path as osp
+import pickle
+import sqlite3
+import threading
+
+import numpy as np
+import torch
+
+
+class ModelOutputCache:
+    """Stores processed model outputs in a SQLite database on local disk,
+    keyed by a fingerprint of the model and a digest of the model input.
+
+    Unlike the in-memory cache of :class:`~textattack.goal_functions.GoalFunction`,
+    entries are kept when the goal function's cache is cleared between
+    examples, and are reused by later runs (and resumed attacks) against the
+    same model. Several processes can share one cache file.
+
+    Args:
+        path (str): Path of the SQLite database. Created if it does not exist.
+        model_fingerprint (str): Identifies the model (and the processing of
+            its outputs). Entries are only reused for the same fingerprint.
+    """
+
+    def __init__(self, path, model_fingerprint):
+        self.path = path
+        self.model_fingerprint = model_fingerprint
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+
+    def _connection(self):
+        # SQLite connections must not be shared between threads or with forked
+        # worker processes.
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            dirname = osp.dirname(self.path)
+            if dirname and not osp.exists(dirname):
+                os.makedirs(dirname)
+            conn = sqlite3.connect(self.path, timeout=60)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS outputs (
+                    model TEXT,
+                    input_digest BLOB,
+                    output BLOB,
+                    PRIMARY KEY (model, input_digest)
+                ) WITHOUT ROWID
+                """
+            )
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @staticmethod
+    def input_digest(model_input):
+        """Returns a 128-bit digest of ``model_input`` (a string or a tuple of
+        strings, as in ``AttackedText.tokenizer_input``)."""
+        if isinstance(model_input, str):
+            model_input = (model_input,)
+        h = hashlib.blake2b(digest_size=16)
+        for part in model_input:
+            h.update(part.encode("utf-8"))
+            h.update(b"\x00")
+        return h.digest()
+
+    def get_many(self, model_inputs):
+        """Returns the cached output of each of ``model_inputs``, or ``None``
+        for inputs that are not cached."""
+        digests = [ModelOutputCache.input_digest(x) for x in model_inputs]
+        found = {}
+        conn = self._connection()
+        # Stay well below SQLite's limit on the number of query parameters.
+        for i in range(0, len(digests), 500):
+            chunk = digests[i : i + 500]
+            rows = conn.execute(
+                f"SELECT input_digest, output FROM outputs WHERE model = ? "
+                f"AND input_digest IN ({', '.join('?' * len(chunk))})",
+                (self.model_fingerprint, *chunk),
+            )
+            for digest, output in rows:
+                found[digest] = _decode(output)
+        outputs = [found.get(digest) for digest in digests]
+        num_hits = sum(output is not None for output in outputs)
+        self.hits += num_hits
+        self.misses += len(outputs) - num_hits
+        return outputs
+
+    def put_many(self, model_inputs, outputs):
+        """Stores ``outputs[i]`` as the output for ``model_inputs[i]``."""
+        rows = [
+            (self.model_fingerprint, ModelOutputCache.input_digest(x), _encode(y))
+            for x, y in zip(model_inputs, outputs)
+        ]
+        if not rows:
+            return
+        conn = self._connection()
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO outputs VALUES (?, ?, ?)", rows)
+
+    def stats(self):
+        """Returns the number of hits and misses since the cache was created,
+        and the hit rate."""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def close(self):
+        """Closes the calling thread's connection to the database."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            conn.close()
+        self._local = threading.local()
+
+    def __len__(self):
+        return self._connection().execute(
+            "SELECT COUNT(*) FROM outputs WHERE model = ?", (self.model_fingerprint,)
+        ).fetchone()[0]
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_local"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__ = state
+        self._local = threading.local()
+
+    def __repr__(self):
+        return f"<ModelOutputCache {self.path} ({self.model_fingerprint[:12]})>"
+
+
+def model_fingerprint(model_wrapper, salt=""):
+    """Returns a fingerprint of the model wrapped by ``model_wrapper``.
+
+    For PyTorch models, it is a digest of the model's class and all of its
+    parameters and buffers, so that a fine-tuned copy of a model does not share
+    cache entries with the original. Other models are identified by their
+    class and, if available, their name or path. The wrapper's preprocessing
+    settings (tokenizer, maximum length and padding mode) are included as
+    well, since they change the outputs for the same text. ``salt`` is mixed
+    in to separate outputs that are processed differently (e.g. by different
+    goal functions).
+    """
+    model = getattr(model_wrapper, "model", model_wrapper)
+    h = hashlib.blake2b(digest_size=20)
+    h.update(salt.encode("utf-8"))
+    h.update(type(model_wrapper).__qualname__.encode("utf-8"))
+    h.update(type(model).__qualname__.encode("utf-8"))
+    h.update(_preprocessing_settings(model_wrapper).encode("utf-8"))
+    if isinstance(model, torch.nn.Module):
+        for name, tensor in model.state_dict().items():
+            h.update(name.encode("utf-8"))
+            h.update(str(tuple(tensor.shape)).encode("utf-8"))
+            h.update(tensor.detach().cpu().contiguous().numpy().tobytes())
+    else:
+        config = getattr(model, "config", None)
+        name = getattr(config, "_name_or_path", None) or getattr(
+            model, "name", None
+        )
+        if name:
+            h.update(str(name).encode("utf-8"))
+    return h.hexdigest()
+
+
+def _preprocessing_settings(model_wrapper):
+    """Returns a description of the settings of ``model_wrapper`` that change
+    how texts are turned into model inputs."""
+    # Look through wrappers that only change how queries are scheduled, like
+    # ``BatchingModelWrapper``.
+    while getattr(model_wrapper, "model_wrapper", None) is not None:
+        model_wrapper = model_wrapper.model_wrapper
+    settings = {
+        "dynamic_padding": bool(getattr(model_wrapper, "dynamic_padding", False))
+    }
+    try:
+        settings["max_length"] = getattr(model_wrapper, "max_length", None)
+    except Exception:
+        pass
+    tokenizer = getattr(model_wrapper, "tokenizer", None)
+    if tokenizer is not None:
+        settings["tokenizer"] = type(tokenizer).__qualname__
+        for attr in (
+            "name_or_path",
+            "model_max_length",
+            "max_length",
+            "padding_side",
+            "truncation_side",
+        ):
+            value = getattr(tokenizer, attr, None)
+            if isinstance(value, (str, int, float, bool)):
+                settings[f"tokenizer.{attr}"] = value
+        init_kwargs = getattr(tokenizer, "init_kwargs", None)
+        if isinstance(init_kwargs, dict):
+            settings["tokenizer.init_kwargs"] = sorted(
+                (key, value)
+                for key, value in init_kwargs.items()
+                if isinstance(value, (str, int, float, bool, type(None)))
+            )
+        try:
+            settings["tokenizer.size"] = len(tokenizer)
+        except TypeError:
+            pass
+    return repr(sorted(settings.items()))
+
+
+def _encode(output):
+    # Tensors are stored as numpy arrays, since pickling a tensor that is a
+    # row of a larger batch would store the whole batch.
+    if isinstance(output, torch.Tensor):
+        return pickle.dumps(("torch", output.detach().cpu().numpy().copy()))
+    return pickle.dumps(("object", output))
+
+
+def _decode(data):
+    kind, value = pickle.loads(data)
+    if kind == "torch":
+        return torch.from_numpy(np.asarray(value))
+    return value
@@ -0,0 +1,390 @@
+"""
+Nearest Neighbour Index
+========================
+
+Approximate nearest-neighbour search over word embedding vectors, for
+embeddings without a precomputed neighbour matrix.
+"""
+
+from abc import ABC, abstractmethod
+import hashlib
+import importlib.util
+import json
+import mmap
+import os
+
+import numpy as np
+
+from .utils import LazyLoader, logger
+
+faiss = LazyLoader("faiss", globals(), "faiss")
+
+
+class NearestNeighbourIndex(ABC):
+    """Index over the rows of a matrix of vectors that returns the rows
+    closest (in euclidean distance) to query vectors.
+
+    Indexes are built once with :meth:`build`, saved with :meth:`save` and
+    reopened with :meth:`load`. :func:`build_nearest_neighbour_index` picks
+    a backend and does both.
+
+    Saved indexes also store ``metadata`` (a JSON-serializable dict), which
+    :func:`build_nearest_neighbour_index` uses to check that an index was
+    built over the same vectors with the same settings.
+    """
+
+    # Arguments of ``build`` that only affect searches, and can be changed
+    # when an index is loaded.
+    search_kwargs = ()
+    metadata = None
+
+    @classmethod
+    @abstractmethod
+    def build(cls, vectors, **kwargs):
+        """Builds an index over the rows of ``vectors`` (a 2-D array)."""
+        raise NotImplementedError()
+
+    @abstractmethod
+    def search(self, queries, k):
+        """Returns the ids of the (approximately) ``k`` nearest rows of each
+        of ``queries`` (a 2-D array), as a 2-D integer array with the nearest
+        first. Rows are padded with -1 if fewer than ``k`` are found."""
+        raise NotImplementedError()
+
+    @abstractmethod
+    def save(self, path):
+        """Saves the index and its ``metadata`` to ``path``."""
+        raise NotImplementedError()
+
+    @classmethod
+    @abstractmethod
+    def load(cls, path, vectors, **kwargs):
+        """Loads an index saved with :meth:`save`. ``vectors`` must be the
+        matrix the index was built over. ``kwargs`` (see ``search_kwargs``)
+        override the settings the index was built with."""
+        raise NotImplementedError()
+
+    @classmethod
+    @abstractmethod
+    def load_metadata(cls, path):
+        """Returns the ``metadata`` of the index saved at ``path``, or
+        ``None`` if it has none."""
+        raise NotImplementedError()
+
+
+class IVFIndex(NearestNeighbourIndex):
+    """Inverted file index: the vectors are clustered with k-means, and a
+    query only scans the vectors of the ``num_probes`` clusters with the
+    closest centroids.
+
+    Args:
+        vectors (ndarray): The indexed vectors (N x D).
+        centroids (ndarray): Cluster centroids (C x D).
+        list_offsets (ndarray): Vectors of cluster ``c`` are
+            ``list_ids[list_offsets[c]:list_offsets[c + 1]]``.
+        list_ids (ndarray): Row ids of the vectors, grouped by cluster.
+        num_probes (int): Number of clusters scanned per query. Higher is
+            more accurate and slower.
+    """
+
+    search_kwargs = ("num_probes",)
+
+    def __init__(self, vectors, centroids, list_offsets, list_ids, num_probes=16):
+        self.vectors = vectors
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_ids = list_ids
+        self.num_probes = num_probes
+        self._centroid_norms = (centroids * centroids).sum(axis=1)
+        self._norms = _squared_norms(vectors)
+
+    @classmethod
+    def build(
+        cls,
+        vectors,
+        num_lists=None,
+        num_probes=16,
+        num_iterations=10,
+        max_training_size=65536,
+        seed=0,
+    ):
+        """Clusters the rows of ``vectors`` into ``num_lists`` clusters
+        (defaults to about four times the square root of the number of rows)
+        with ``num_iterations`` rounds of k-means over at most
+        ``max_training_size`` sampled rows."""
+        num_vectors = len(vectors)
+        if num_lists is None:
+            num_lists = max(1, int(4 * np.sqrt(num_vectors)))
+        num_lists = min(num_lists, num_vectors)
+        rng = np.random.default_rng(seed)
+        sample = rng.choice(
+            num_vectors, min(num_vectors, max_training_size), replace=False
+        )
+        training = np.asarray(vectors[np.sort(sample)], dtype=np.float32)
+        centroids = training[rng.choice(len(training), num_lists, replace=False)]
+        for _ in range(num_iterations):
+            assignment = _nearest_centroids(training, centroids, 1)[:, 0]
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, training)
+            counts = np.bincount(assignment, minlength=num_lists)
+            # Empty clusters keep their previous centroid.
+            nonempty = counts > 0
+            centroids[nonempty] = sums[nonempty] / counts[nonempty, None]
+
+        assignment = _nearest_centroids(vectors, centroids, 1)[:, 0]
+        list_ids = np.argsort(assignment, kind="stable")
+        list_offsets = np.zeros(num_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignment, minlength=num_lists), out=list_offsets[1:])
+        return cls(vectors, centroids, list_offsets, list_ids, num_probes=num_probes)
+
+    def search(self, queries, k):
+        queries = np.asarray(queries, dtype=np.float32)
+        num_probes = min(self.num_probes, len(self.centroids))
+        probes = _nearest_centroids(
+            queries, self.centroids, num_probes, self._centroid_norms
+        )
+        results = np.full((len(queries), k), -1, dtype=np.int64)
+        for i, query in enumerate(queries):
+            candidates = np.concatenate(
+                [
+                    self.list_ids[self.list_offsets[c] : self.list_offsets[c + 1]]
+                    for c in probes[i]
+                ]
+            )
+            candidate_vectors = np.asarray(self.vectors[candidates], dtype=np.float32)
+            # |x - q|^2 up to |q|^2, which is the same for all candidates.
+            dists = self._norms[candidates] - 2 * candidate_vectors @ query
+            n = min(k, len(candidates))
+            if n < len(candidates):
+                nearest = np.argpartition(dists, n - 1)[:n]
+            else:
+                nearest = np.arange(n)
+            nearest = nearest[np.argsort(dists[nearest], kind="stable")]
+            results[i, :n] = candidates[nearest]
+        return results
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                centroids=self.centroids,
+                list_offsets=self.list_offsets,
+                list_ids=self.list_ids,
+                num_probes=self.num_probes,
+                metadata=json.dumps(self.metadata),
+            )
+
+    @classmethod
+    def load(cls, path, vectors, num_probes=None):
+        with np.load(path) as data:
+            if num_probes is None:
+                num_probes = int(data["num_probes"])
+            index = cls(
+                vectors,
+                data["centroids"],
+                data["list_offsets"],
+                data["list_ids"],
+                num_probes=num_probes,
+            )
+        index.metadata = cls.load_metadata(path)
+        return index
+
+    @classmethod
+    def load_metadata(cls, path):
+        with np.load(path) as data:
+            if "metadata" not in data.files:
+                return None
+            return json.loads(str(data["metadata"]))
+
+
+class FaissIndex(NearestNeighbourIndex):
+    """HNSW graph index from `faiss <https://github.com/facebookresearch/faiss>`_,
+    used when faiss is installed.
+
+    Args:
+        index: A ``faiss.Index`` over the vectors.
+    """
+
+    search_kwargs = ("ef_search",)
+
+    def __init__(self, index):
+        self.index = index
+
+    @classmethod
+    def build(cls, vectors, num_links=32, ef_search=64):
+        """Builds an HNSW graph where each vector is linked to
+        ``num_links`` neighbours. ``ef_search`` trades speed for
+        accuracy at query time."""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        index = faiss.IndexHNSWFlat(vectors.shape[1], num_links)
+        index.hnsw.efSearch = ef_search
+        index.add(vectors)
+        return cls(index)
+
+    def search(self, queries, k):
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+        _, ids = self.index.search(queries, k)
+        return ids
+
+    def save(self, path):
+        # Faiss files can't hold the metadata, which is stored next to them.
+        faiss.write_index(self.index, path)
+        with open(f"{path}.json", "w") as f:
+            json.dump(self.metadata, f)
+
+    @classmethod
+    def load(cls, path, vectors, ef_search=None):
+        index = cls(faiss.read_index(path))
+        if ef_search is not None:
+            index.index.hnsw.efSearch = ef_search
+        index.metadata = cls.load_metadata(path)
+        return index
+
+    @classmethod
+    def load_metadata(cls, path):
+        if not os.path.exists(f"{path}.json"):
+            return None
+        with open(f"{path}.json") as f:
+            return json.load(f)
+
+
+def build_nearest_neighbour_index(vectors, path=None, backend=None, **kwargs):
+    """Returns a nearest-neighbour index over the rows of ``vectors``.
+
+    If ``path`` is given and an index was already saved there, it is loaded
+    instead of being rebuilt, unless it was built over other vectors (of a
+    different number, dimension or content) or with other ``kwargs``;
+    otherwise the new index is saved to ``path``. Arguments that only affect
+    searches (e.g. ``num_probes`` of the ``"ivf"`` backend) are applied to a
+    loaded index.
+
+    The contents of ``vectors`` are compared by a digest, except when they
+    are memory-mapped from the same file, unmodified since the index was
+    built. Then the saved index is reused without reading the vectors.
+
+    Args:
+        vectors (ndarray): 2-D array of vectors to index.
+        path (:obj:`str`, `optional`): Where the index is persisted.
+        backend (:obj:`str`, `optional`): ``"faiss"`` or ``"ivf"``. Defaults
+            to ``"faiss"`` if it is installed and ``"ivf"`` otherwise.
+        kwargs: Passed to the ``build`` method of the backend.
+    """
+    if backend is None:
+        backend = "faiss" if importlib.util.find_spec("faiss") else "ivf"
+    if backend == "faiss":
+        index_cls = FaissIndex
+    elif backend == "ivf":
+        index_cls = IVFIndex
+    else:
+        raise ValueError(f"Unknown nearest neighbour index backend {backend}.")
+
+    search_kwargs = {k: v for k, v in kwargs.items() if k in index_cls.search_kwargs}
+    metadata = {
+        "num_vectors": len(vectors),
+        "dim": int(vectors.shape[1]),
+        "build_kwargs": {
+            k: v for k, v in kwargs.items() if k not in index_cls.search_kwargs
+        },
+        "source": _vectors_source(vectors),
+    }
+    if path is not None and os.path.exists(path):
+        saved_metadata = index_cls.load_metadata(path) or {}
+        if _same_vectors(saved_metadata, metadata, vectors):
+            return index_cls.load(path, vectors, **search_kwargs)
+        logger.warning(
+            f"Rebuilding nearest neighbour index {path}, which was built over "
+            "other vectors or with other settings."
+        )
+    if "digest" not in metadata:
+        metadata["digest"] = _vectors_digest(vectors)
+    index = index_cls.build(vectors, **kwargs)
+    index.metadata = metadata
+    if path is not None:
+        # Save to a temporary file first, since other processes may be
+        # loading the same index.
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        index.save(tmp_path)
+        if os.path.exists(f"{tmp_path}.json"):
+            os.replace(f"{tmp_path}.json", f"{path}.json")
+        os.replace(tmp_path, path)
+    return index
+
+
+def _same_vectors(saved_metadata, metadata, vectors):
+    """Whether an index saved with ``saved_metadata`` was built over
+    ``vectors`` with the settings in ``metadata``.
+
+    The cheap checks come first. The contents of ``vectors`` are only hashed
+    if they are not mapped from the same, unmodified file as the saved
+    index's vectors. The digest is then stored in ``metadata`` so that a
+    rebuilt index does not hash them again.
+    """
+    for key in ("num_vectors", "dim", "build_kwargs"):
+        if saved_metadata.get(key) != metadata[key]:
+            return False
+    if metadata["source"] is not None and saved_metadata.get("source") == (
+        metadata["source"]
+    ):
+        return True
+    metadata["digest"] = _vectors_digest(vectors)
+    return saved_metadata.get("digest") == metadata["digest"]
+
+
+def _vectors_source(vectors):
+    """Returns the file that ``vectors`` are memory-mapped from, with its size
+    and modification time, or ``None`` if they are not mapped from a file.
+
+    Comparing it is much cheaper than hashing the vectors."""
+    # Views of a mapped array may not cover the file region it maps.
+    if not (
+        isinstance(vectors, np.memmap)
+        and isinstance(vectors.base, mmap.mmap)
+        and vectors.filename is not None
+    ):
+        return None
+    stat = os.stat(vectors.filename)
+    return {
+        "filename": os.path.realpath(vectors.filename),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "offset": int(vectors.offset),
+        "dtype": str(vectors.dtype),
+        "order": "C" if vectors.flags.c_contiguous else "F",
+    }
+
+
+def _vectors_digest(vectors, batch_size=4096):
+    """Returns a digest of the contents of ``vectors``, read in batches so
+    that memory-mapped matrices are not loaded at once."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(str(np.asarray(vectors[:0]).dtype).encode("utf-8"))
+    for start in range(0, len(vectors), batch_size):
+        batch = np.ascontiguousarray(vectors[start : start + batch_size])
+        h.update(batch.tobytes())
+    return h.hexdigest()
+
+
+def _squared_norms(vectors, batch_size=4096):
+    norms = np.empty(len(vectors), dtype=np.float32)
+    for start in range(0, len(vectors), batch_size):
+        batch = np.asarray(vectors[start : start + batch_size], dtype=np.float32)
+        norms[start : start + len(batch)] = (batch * batch).sum(axis=1)
+    return norms
+
+
+def _nearest_centroids(vectors, centroids, k, centroid_norms=None, batch_size=4096):
+    """Returns the ids of the ``k`` nearest centroids of each vector."""
+    if centroid_norms is None:
+        centroid_norms = (centroids * centroids).sum(axis=1)
+    nearest = np.empty((len(vectors), k), dtype=np.int64)
+    for start in range(0, len(vectors), batch_size):
+        batch = np.asarray(vectors[start : start + batch_size], dtype=np.float32)
+        # |x - c|^2 up to |x|^2, which is the same for all centroids.
+        dists = centroid_norms - 2 * batch @ centroids.T
+        if k < len(centroids):
+            top = np.argpartition(dists, k - 1, axis=1)[:, :k]
+        else:
+            top = np.broadcast_to(np.arange(len(centroids)), dists.shape)
+        order = np.argsort(np.take_along_axis(dists, top, axis=1), axis=1)
+        nearest[start : start + len(batch)] = np.take_along_axis(top, order, axis=1)
+    return nearest
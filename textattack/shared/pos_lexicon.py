@@ -0,0 +1,153 @@
+"""
+Part-of-Speech Lexicon
+========================
+
+Possible parts of speech of each word of a vocabulary, stored in
+memory-mappable arrays.
+"""
+
+from collections import defaultdict
+import os
+
+import numpy as np
+
+from .utils import LazyLoader
+
+nltk = LazyLoader("nltk", globals(), "nltk")
+
+
+class PosLexicon:
+    """Maps words to the set of parts of speech they were tagged with in a
+    corpus.
+
+    A word swap can be rejected without running a contextual tagger if no
+    part of speech of the new word is compatible with any part of speech of
+    the original word. Words are lowercased, so a word's tags include those
+    of all of its casings.
+
+    The lexicon is stored as a sorted array of UTF-8 encoded words and an
+    array of bitmasks of their tags, which are memory-mapped when loaded
+    with :meth:`load`.
+
+    Args:
+        words (ndarray): Sorted 1-D bytes array of UTF-8 encoded words.
+        tag_masks (ndarray): ``tag_masks[i]`` has bit ``j`` set if
+            ``words[i]`` was tagged with ``tag_names[j]``.
+        tag_names (list[str]): Names of the tags (at most 64).
+        path (:obj:`str`, `optional`): Path the lexicon was loaded from.
+        tagset (:obj:`str`, `optional`): Name of the tagset of the tags (e.g.
+            ``"universal"``), if known. Part-of-speech constraints check that
+            it is the tagset they use.
+    """
+
+    def __init__(self, words, tag_masks, tag_names, path=None, tagset=None):
+        self.words = words
+        self.tag_masks = tag_masks
+        self.tag_names = list(tag_names)
+        self.path = path
+        self.tagset = tagset
+        self._tag_sets = {}
+
+    @classmethod
+    def build(cls, tagged_words, min_count=1, tagset=None):
+        """Builds a lexicon from ``(word, tag)`` pairs, e.g. the tagged words
+        of a corpus, with tags of ``tagset``. Tags seen less than
+        ``min_count`` times for a word are left out, so that rare tagging
+        errors in the corpus do not make every swap possible."""
+        counts = defaultdict(lambda: defaultdict(int))
+        for word, tag in tagged_words:
+            counts[word.lower()][tag] += 1
+        tag_names = sorted({tag for word_tags in counts.values() for tag in word_tags})
+        if len(tag_names) > 64:
+            raise ValueError(f"At most 64 tags are supported, got {len(tag_names)}.")
+        tag_ids = {tag: i for i, tag in enumerate(tag_names)}
+
+        masks = {}
+        for word, word_tags in counts.items():
+            mask = 0
+            for tag, count in word_tags.items():
+                if count >= min_count:
+                    mask |= 1 << tag_ids[tag]
+            if mask:
+                masks[word.encode("utf-8")] = mask
+        words = np.array(sorted(masks), dtype=bytes)
+        tag_masks = np.array([masks[word] for word in words], dtype=np.uint64)
+        return cls(words, tag_masks, tag_names, tagset=tagset)
+
+    @classmethod
+    def from_nltk_corpus(cls, corpus="brown", tagset="universal", min_count=2):
+        """Builds a lexicon from a tagged corpus of NLTK (e.g. ``"brown"`` or
+        ``"treebank"``), with the tags of ``tagset``."""
+        tagged_words = getattr(nltk.corpus, corpus).tagged_words(tagset=tagset)
+        return cls.build(tagged_words, min_count=min_count, tagset=tagset)
+
+    def save(self, path):
+        """Saves the lexicon to ``path`` (a directory)."""
+        os.makedirs(path, exist_ok=True)
+        arrays = {
+            "words": self.words,
+            "tag_masks": self.tag_masks,
+            "tag_names": np.array(self.tag_names),
+        }
+        if self.tagset is not None:
+            arrays["tagset"] = np.array(self.tagset)
+        for name, array in arrays.items():
+            # Write to a temporary file first, since other processes may be
+            # loading the same lexicon.
+            tmp_file = os.path.join(path, f"{name}.{os.getpid()}.tmp.npy")
+            np.save(tmp_file, array)
+            os.replace(tmp_file, os.path.join(path, f"{name}.npy"))
+
+    @classmethod
+    def load(cls, path):
+        """Loads a lexicon saved with :meth:`save`, memory-mapping its
+        arrays."""
+        tagset_file = os.path.join(path, "tagset.npy")
+        return cls(
+            np.load(os.path.join(path, "words.npy"), mmap_mode="r"),
+            np.load(os.path.join(path, "tag_masks.npy"), mmap_mode="r"),
+            np.load(os.path.join(path, "tag_names.npy")).tolist(),
+            path=path,
+            tagset=str(np.load(tagset_file)) if os.path.exists(tagset_file) else None,
+        )
+
+    def tags(self, word):
+        """Returns the set of tags of ``word``, or ``None`` if it is not in
+        the lexicon."""
+        key = word.lower().encode("utf-8")
+        i = np.searchsorted(self.words, key)
+        if i == len(self.words) or self.words[i] != key:
+            return None
+        mask = int(self.tag_masks[i])
+        if mask not in self._tag_sets:
+            self._tag_sets[mask] = frozenset(
+                tag for j, tag in enumerate(self.tag_names) if mask >> j & 1
+            )
+        return self._tag_sets[mask]
+
+    def __contains__(self, word):
+        return self.tags(word) is not None
+
+    def __len__(self):
+        return len(self.words)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        if self.path is not None:
+            # Reload (and memory-map) the arrays instead of copying them.
+            state["words"] = None
+            state["tag_masks"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__ = state
+        if self.path is not None:
+            loaded = PosLexicon.load(self.path)
+            self.words = loaded.words
+            self.tag_masks = loaded.tag_masks
+
+    def __repr__(self):
+        return (
+            f"<PosLexicon {len(self)} words, {len(self.tag_names)} tags, "
+            f"tagset {self.tagset}>"
+        )
@@ -3,46 +3,52 @@ Attack Logs to CSV
 ========================
 """
 
-import csv
-from numpy import indices
-
-import pandas as pd
-
 #from textattack.shared import logger
+import os
 import os.path as osp
 
+from .lineage_store import LineageStore, find_shards, shard_path
+
 
 class TextLogger:
-    """Logs transformation provenance to a CSV."""
+    """Logs transformation provenance to a CSV.
+
+    Rows are buffered in a :class:`~textattack.shared.lineage_store.LineageStore`
+    and written out in segments of ``flush_size`` rows, either directly or by
+    a background :class:`~textattack.shared.lineage_store.LineageWriter`.
+    If ``shard`` is set, rows go to a separate per-worker file that can later
+    be combined with :meth:`merge_shards`.
+    """
+    columns = ["text_id", "text"]
 
-    def __init__(self, dirname='../results/'):
+    def __init__(self, dirname='../results/', flush_size=4096, fmt="csv", writer=None, shard=None, truncate=True):
         #logger.info(f"Logging transformation and text pairs to CSVs under directory {dirname}")
         self.path = osp.join(dirname, 'text.csv')
-        open(self.path, "w").close()
-        self._flushed = True
-        self.init_df()
-
-    def init_df(self):
-        self.text_df = pd.DataFrame(columns = ["text_id", "text"])
+        if shard is not None:
+            # Each worker process writes to its own shard of the log.
+            self.path = shard_path(self.path, shard)
+        self.store = LineageStore(self.path, TextLogger.columns,
+            flush_size=flush_size, fmt=fmt, writer=writer, truncate=truncate)
 
     def log_text(self, text_id, text, le_attrs):
-        row = {
-            "text_id": text_id,
-            "text": text
-        }
-        self.text_df = self.text_df.append(row, ignore_index=True)
-        self._flushed = False
-    
+        self.store.append(text_id, text)
 
     def flush(self):
-        self.text_df.to_csv(self.path, mode='a', quoting=csv.QUOTE_NONNUMERIC, header=False, index=False)
-        self._flushed = True
-        self.init_df()
+        self.store.flush()
+
+    def merge_shards(self):
+        """Appends the rows of every worker shard to this log."""
+        self.store.merge(find_shards(self.path, self.store.fmt))
+
+    def remove_shards(self):
+        """Deletes worker shards left over from a previous run."""
+        for fmt in LineageStore.FORMATS:
+            for path in find_shards(self.path, fmt):
+                os.remove(path)
 
     def close(self):
-        # self.fout.close()
-        super().close()
+        self.store.close()
 
     def __del__(self):
-        if not self._flushed:
+        if len(self.store):
             print("ProvenanceLogger exiting without calling flush().")
@@ -0,0 +1,210 @@
+"""
+Token Table
+========================
+
+Compact, array-backed tokenization of a text used for token-level lineage.
+"""
+
+from array import array
+import threading
+
+
+class OpHistories:
+    """Interned op histories of tokens, so that each token only stores the
+    integer id of its history. Id 0 is the empty history.
+
+    A table created from another one (e.g. the tokens of a transformed text)
+    shares its registry, so op ids can be copied between them. Registries
+    are not shared across unrelated texts, so they are freed together with
+    the tables of an attack instead of growing for the whole process.
+    """
+
+    __slots__ = ("histories", "ids", "_lock")
+
+    def __init__(self):
+        self.histories = [()]
+        self.ids = {(): 0}
+        # Texts of the same attack may be transformed in several threads.
+        self._lock = threading.Lock()
+
+    def id(self, ops):
+        ops = tuple(ops)
+        with self._lock:
+            if ops not in self.ids:
+                self.ids[ops] = len(self.histories)
+                self.histories.append(ops)
+            return self.ids[ops]
+
+    def __getitem__(self, op_id):
+        return self.histories[op_id]
+
+    def __len__(self):
+        return len(self.histories)
+
+    def __getstate__(self):
+        return self.histories, self.ids
+
+    def __setstate__(self, state):
+        self.histories, self.ids = state
+        self._lock = threading.Lock()
+
+
+class TokenTable:
+    """Tokens of a text stored as columns of character offsets, lengths,
+    word flags and op histories, instead of one object per token.
+
+    Token ``i`` is ``text[starts[i]:starts[i] + lengths[i]]``. Tokens are
+    either words (as produced by ``words_from_text``) or the separators
+    between them. The ops applied to each token (e.g. ``"replace"``) are
+    interned, so that each token only stores an integer id of its op history.
+
+    Indexing or iterating returns lightweight :class:`TokenView` objects,
+    which are only created on demand.
+
+    Args:
+        text (str): The text that was tokenized.
+        starts (array): Character offset of each token in ``text``.
+        lengths (array): Number of characters of each token.
+        is_word (array): 1 if the token is a word, 0 if it is a separator.
+        op_ids (array, `optional`): Id of each token's op history. Defaults to
+            no ops for every token.
+        op_histories (:class:`OpHistories`, `optional`): Registry that
+            ``op_ids`` refer to. Defaults to a new registry.
+    """
+
+    __slots__ = ("text", "starts", "lengths", "is_word", "op_ids", "op_histories")
+
+    def __init__(
+        self, text, starts, lengths, is_word, op_ids=None, op_histories=None
+    ):
+        self.text = text
+        self.starts = starts
+        self.lengths = lengths
+        self.is_word = is_word
+        if op_ids is None:
+            op_ids = array("I", [0]) * len(starts)
+        self.op_ids = op_ids
+        if op_histories is None:
+            op_histories = OpHistories()
+        self.op_histories = op_histories
+
+    @classmethod
+    def from_text(cls, text, words, op_histories=None):
+        """Builds the table for ``text``, given the ``words`` found in it (in
+        order). Everything between two words becomes a separator token.
+
+        Pass the ``op_histories`` of another table to be able to copy its op
+        ids into this one."""
+        starts = array("i")
+        lengths = array("i")
+        is_word = array("b")
+        pos = 0
+        for word in words:
+            word_start = text.index(word, pos)
+            if word_start > pos:
+                starts.append(pos)
+                lengths.append(word_start - pos)
+                is_word.append(0)
+            starts.append(word_start)
+            lengths.append(len(word))
+            is_word.append(1)
+            pos = word_start + len(word)
+        if pos < len(text):
+            starts.append(pos)
+            lengths.append(len(text) - pos)
+            is_word.append(0)
+        return cls(text, starts, lengths, is_word, op_histories=op_histories)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [TokenView(self, j) for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("token index out of range")
+        return TokenView(self, i)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield TokenView(self, i)
+
+    def token_text(self, i):
+        start = self.starts[i]
+        return self.text[start : start + self.lengths[i]]
+
+    def token_texts(self):
+        """Returns the text of every token."""
+        text = self.text
+        return [
+            text[start : start + length]
+            for start, length in zip(self.starts, self.lengths)
+        ]
+
+    def word_indices(self):
+        """Returns the token indices of all word tokens."""
+        return [i for i, is_word in enumerate(self.is_word) if is_word]
+
+    def ops(self, i):
+        """Returns the ops applied to token ``i``, oldest first."""
+        return self.op_histories[self.op_ids[i]]
+
+    def set_ops(self, i, ops):
+        self.op_ids[i] = self.op_histories.id(ops)
+
+    def add_op(self, i, op):
+        self.set_ops(i, self.ops(i) + (op,))
+
+    def __str__(self):
+        return self.text
+
+    def __repr__(self):
+        return f"<TokenTable {self.token_texts()}>"
+
+
+class TokenView:
+    """A view of a single token of a :class:`TokenTable`.
+
+    Provides the same ``text`` and ``le_attrs`` interface as
+    :class:`~textattack.shared.LeToken`, but ``le_attrs`` is built from the
+    table's columns and is a copy: use :meth:`TokenTable.add_op` to record
+    ops on the token.
+    """
+
+    __slots__ = ("table", "index")
+
+    def __init__(self, table, index):
+        self.table = table
+        self.index = index
+
+    @property
+    def text(self):
+        return self.table.token_text(self.index)
+
+    @property
+    def is_word(self):
+        return bool(self.table.is_word[self.index])
+
+    @property
+    def ops(self):
+        return list(self.table.ops(self.index))
+
+    @property
+    def le_attrs(self):
+        return {"is_word": self.is_word, "granularity": "word", "ops": self.ops}
+
+    def __eq__(self, other):
+        if not isinstance(other, TokenView):
+            return NotImplemented
+        return self.text == other.text and self.is_word == other.is_word
+
+    def __hash__(self):
+        return hash(self.text)
+
+    def __str__(self):
+        return self.text
+
+    def __repr__(self):
+        return f'<TokenView "{self.text}": le_attrs={self.le_attrs}>'
@@ -3,33 +3,37 @@ Attack Logs to CSV
 ========================
 """
 
-import csv
-from numpy import indices
-
-import pandas as pd
 import itertools
 
 #from textattack.shared import logger
+import os
 import os.path as osp
 
+from .lineage_store import LineageStore, find_shards, shard_path
+
 
 class TransformationLogger:
-    """Logs transformation provenance to a CSV."""
+    """Logs transformation provenance to a CSV.
+
+    Rows are buffered in a :class:`~textattack.shared.lineage_store.LineageStore`
+    and written out in segments of ``flush_size`` rows, either directly or by
+    a background :class:`~textattack.shared.lineage_store.LineageWriter`.
+    If ``shard`` is set, rows go to a separate per-worker file that can later
+    be combined with :meth:`merge_shards`.
+    """
     id_iter = itertools.count()
+    columns = ["transformation_id", "transformation_type",
+        "prev_text", "after_text", "from_modified_indices",
+        "to_modified_indices", "changes"]
 
-    def __init__(self, dirname='../results/'):
+    def __init__(self, dirname='../results/', flush_size=4096, fmt="csv", writer=None, shard=None, truncate=True):
         #logger.info(f"Logging transformation and text pairs to CSVs under directory {dirname}")
         self.path = osp.join(dirname, 'transformation.csv')
-        open(self.path, "w").close()
-        self._flushed = True
-        self.init_df()
-        
-
-    def init_df(self):
-        self.transformation_df = pd.DataFrame(columns=["transformation_id", "transformation_type",
-            "prev_text", "after_text", "from_modified_indices",
-            "to_modified_indices", "changes"])
-        
+        if shard is not None:
+            # Each worker process writes to its own shard of the log.
+            self.path = shard_path(self.path, shard)
+        self.store = LineageStore(self.path, TransformationLogger.columns,
+            flush_size=flush_size, fmt=fmt, writer=writer, truncate=truncate)
 
     def log_transformation(self, current_text_id, transformed_text_id, transformation_type, modified_inds, changes):
         trans_id = next(TransformationLogger.id_iter)
@@ -37,31 +41,26 @@ class TransformationLogger:
         from_mod_inds, to_mod_inds = modified_inds
         # precarious color editing
         # current_text, transformed_text = color_text_pair(current_text, transformed_text, list(from_inds), list(to_inds))
-        
 
-        row = {
-            "transformation_id": trans_id,
-            "transformation_type": transformation_type,
-            "prev_text": current_text_id,
-            "after_text": transformed_text_id,
-            "from_modified_indices": from_mod_inds,
-            "to_modified_indices": to_mod_inds,
-            "changes": changes
-        }
-        
-        self.transformation_df = self.transformation_df.append(row, ignore_index=True)
-        self._flushed = False
-    
+        self.store.append(trans_id, transformation_type, current_text_id,
+            transformed_text_id, from_mod_inds, to_mod_inds, changes)
 
     def flush(self):
-        self.transformation_df.to_csv(self.path, mode='a', quoting=csv.QUOTE_NONNUMERIC, header=False, index=False)
-        self._flushed = True
-        self.init_df()
+        self.store.flush()
+
+    def merge_shards(self):
+        """Appends the rows of every worker shard to this log."""
+        self.store.merge(find_shards(self.path, self.store.fmt))
+
+    def remove_shards(self):
+        """Deletes worker shards left over from a previous run."""
+        for fmt in LineageStore.FORMATS:
+            for path in find_shards(self.path, fmt):
+                os.remove(path)
 
     def close(self):
-        # self.fout.close()
-        super().close()
+        self.store.close()
 
     def __del__(self):
-        if not self._flushed:
+        if len(self.store):
             print("ProvenanceLogger exiting without calling flush().")
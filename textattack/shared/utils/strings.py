@@ -6,6 +6,7 @@ import pycld2 as cld2
 
 from .importing import LazyLoader
 from ..le_token import LeToken
+from ..token_table import TokenTable
 
 
 def has_letter(word):
@@ -111,25 +112,21 @@ def tokens_from_text(s, words_to_ignore=[]):
     """
     split text into list of tokens <LeToken>, where their are both words and non-words tokens.
     """
-    words = words_from_text(s, words_to_ignore=words_to_ignore)
-    tokens = []
-
-    cur_text = s
-    for word in words:
-        word_start = cur_text.index(word)
-        word_end = word_start + len(word)
+    table = token_table_from_text(s, words_to_ignore=words_to_ignore)
+    return [
+        LeToken(token.text, le_attrs={"is_word": token.is_word}) for token in table
+    ]
 
-        if cur_text[:word_start]:
-            tokens.append(LeToken(cur_text[:word_start], le_attrs={'is_word': False})) # non-word token
-        
-        tokens.append(LeToken(word, le_attrs={'is_word': True})) # word token
-        
-        cur_text = cur_text[word_end:] # unprocessed text
 
-    if cur_text:
-        tokens.append(LeToken(cur_text, le_attrs={'is_word': False}))
+def token_table_from_text(s, words_to_ignore=[], op_histories=None):
+    """Split text into a compact ``TokenTable`` of word and non-word tokens.
 
-    return tokens
+    Stores character offsets instead of building one ``LeToken`` per
+    token, which is much cheaper for long documents. ``op_histories`` is
+    the op history registry of the table (see ``TokenTable``).
+    """
+    words = words_from_text(s, words_to_ignore=words_to_ignore)
+    return TokenTable.from_text(s, words, op_histories=op_histories)
 
 
 def default_class_repr(self):
@@ -29,3 +29,57 @@ def batch_model_predict(model_predict, inputs, batch_size=32):
         i += batch_size
 
     return np.concatenate(outputs, axis=0)
+
+
+def shared_prefix_length(input_ids, attention_mask=None):
+    """Returns the number of leading tokens shared by all rows of the (right-
+    padded) ``input_ids``, leaving at least one token per row unshared."""
+    if attention_mask is None:
+        attention_mask = torch.ones_like(input_ids)
+    lengths = attention_mask.sum(dim=1)
+    max_prefix = int(lengths.min()) - 1
+    if max_prefix <= 0:
+        return 0
+    same = (input_ids[:, :max_prefix] == input_ids[:1, :max_prefix]).all(dim=0)
+    same &= attention_mask[:, :max_prefix].bool().all(dim=0)
+    if bool(same.all()):
+        return max_prefix
+    return int((~same).nonzero()[0])
+
+
+class PrefixReuseStats:
+    """Counts the tokens that a model did not have to recompute because they
+    were part of a prefix shared between queries.
+
+    Args:
+        flops_per_token (int): Approximate number of floating point
+            operations of a forward pass per token (about twice the number of
+            model parameters).
+    """
+
+    def __init__(self, flops_per_token=0):
+        self.flops_per_token = flops_per_token
+        self.num_queries = 0
+        self.num_tokens = 0
+        self.num_reused_tokens = 0
+
+    def record(self, num_queries, num_tokens, num_reused_tokens):
+        """Records ``num_queries`` queries of ``num_tokens`` tokens in total,
+        of which ``num_reused_tokens`` were not recomputed."""
+        self.num_queries += num_queries
+        self.num_tokens += num_tokens
+        self.num_reused_tokens += num_reused_tokens
+
+    @property
+    def saved_flops(self):
+        return self.num_reused_tokens * self.flops_per_token
+
+    @property
+    def saved_flops_per_query(self):
+        return self.saved_flops / self.num_queries if self.num_queries else 0.0
+
+    def __repr__(self):
+        return (
+            f"<PrefixReuseStats {self.num_reused_tokens}/{self.num_tokens} tokens reused, "
+            f"{self.saved_flops_per_query:.3g} FLOPs saved per query>"
+        )
@@ -5,6 +5,7 @@ Shared loads word embeddings and related distances
 
 from abc import ABC, abstractmethod
 from collections import defaultdict
+import mmap
 import os
 import pickle
 
@@ -13,6 +14,8 @@ import torch
 
 from textattack.shared import utils
 
+from .nearest_neighbour_index import build_nearest_neighbour_index
+
 
 class AbstractWordEmbedding(ABC):
     """Abstract class representing word embedding used by TextAttack.
@@ -63,6 +66,40 @@ class AbstractWordEmbedding(ABC):
         """
         raise NotImplementedError()
 
+    def get_cos_sim_many(self, a, bs):
+        """Return cosine similarities between vector for word `a` and vectors
+        for each of words `bs`.
+
+        Subclasses can override this to score all pairs at once.
+        Args:
+            a (Union[str|int|list]): Either word or integer presenting the id of the word, or a list with one such
+                word per element of `bs`.
+            bs (list[Union[str|int]]): Words or integers presenting the ids of the words
+        Returns:
+            similarities (ndarray): 1-D array of cosine similarities, one per element of `bs`
+        """
+        a_list = a if isinstance(a, (list, tuple, np.ndarray)) else [a] * len(bs)
+        return np.array(
+            [self.get_cos_sim(a_i, b) for a_i, b in zip(a_list, bs)], dtype=np.float64
+        )
+
+    def get_mse_dist_many(self, a, bs):
+        """Return MSE distances between vector for word `a` and vectors for
+        each of words `bs`.
+
+        Subclasses can override this to score all pairs at once.
+        Args:
+            a (Union[str|int|list]): Either word or integer presenting the id of the word, or a list with one such
+                word per element of `bs`.
+            bs (list[Union[str|int]]): Words or integers presenting the ids of the words
+        Returns:
+            distances (ndarray): 1-D array of MSE (L2) distances, one per element of `bs`
+        """
+        a_list = a if isinstance(a, (list, tuple, np.ndarray)) else [a] * len(bs)
+        return np.array(
+            [self.get_mse_dist(a_i, b) for a_i, b in zip(a_list, bs)], dtype=np.float64
+        )
+
     @abstractmethod
     def word2index(self, word):
         """
@@ -127,6 +164,12 @@ class WordEmbedding(AbstractWordEmbedding):
         self._mse_dist_mat = defaultdict(dict)
         self._cos_sim_mat = defaultdict(dict)
         self._nn_cache = {}
+        # Precomputed distances as sorted `(keys, values)` arrays, where the
+        # key of words `a < b` is `a * len(vocab) + b`. See `_load_pair_table`.
+        self._mse_dist_table = None
+        self._cos_sim_table = None
+        self._nn_index = None
+        self._nn_index_config = None
 
     def __getitem__(self, index):
         """Gets the embedding vector for word/id
@@ -186,11 +229,9 @@ class WordEmbedding(AbstractWordEmbedding):
         try:
             mse_dist = self._mse_dist_mat[a][b]
         except KeyError:
-            e1 = self.embedding_matrix[a]
-            e2 = self.embedding_matrix[b]
-            e1 = torch.tensor(e1).to(utils.device)
-            e2 = torch.tensor(e2).to(utils.device)
-            mse_dist = torch.sum((e1 - e2) ** 2).item()
+            mse_dist = self._lookup_pair(self._mse_dist_table, a, b)
+        if mse_dist is None:
+            mse_dist = float(self._compute_mse_dist([a], [b])[0])
             self._mse_dist_mat[a][b] = mse_dist
 
         return mse_dist
@@ -214,14 +255,91 @@ class WordEmbedding(AbstractWordEmbedding):
         try:
             cos_sim = self._cos_sim_mat[a][b]
         except KeyError:
-            e1 = self.embedding_matrix[a]
-            e2 = self.embedding_matrix[b]
-            e1 = torch.tensor(e1).to(utils.device)
-            e2 = torch.tensor(e2).to(utils.device)
-            cos_sim = torch.nn.CosineSimilarity(dim=0)(e1, e2).item()
+            cos_sim = self._lookup_pair(self._cos_sim_table, a, b)
+        if cos_sim is None:
+            cos_sim = float(self._compute_cos_sim([a], [b])[0])
             self._cos_sim_mat[a][b] = cos_sim
         return cos_sim
 
+    def get_cos_sim_many(self, a, bs):
+        """Return cosine similarities between vector for word `a` and vectors
+        for each of words `bs`, in one vectorized pass.
+
+        Cached and precomputed similarities are looked up, and the remaining
+        ones are computed from the embedding rows all at once. Each similarity is the
+        same as returned by `get_cos_sim`.
+        Args:
+            a (Union[str|int|list]): Either word or integer presenting the id of the word, or a list with one such
+                word per element of `bs`.
+            bs (list[Union[str|int]]): Words or integers presenting the ids of the words
+        Returns:
+            similarities (ndarray): 1-D array of cosine similarities, one per element of `bs`
+        """
+        a, b = self._pair_ids(a, bs)
+        cos_sims = self._lookup_pairs(self._cos_sim_table, a, b)
+        self._lookup_cached_pairs(self._cos_sim_mat, a, b, cos_sims)
+        missing = np.isnan(cos_sims)
+        if missing.any():
+            cos_sims[missing] = self._compute_cos_sim(a[missing], b[missing])
+            self._cache_pairs(
+                self._cos_sim_mat, a[missing], b[missing], cos_sims[missing]
+            )
+        return cos_sims
+
+    def get_mse_dist_many(self, a, bs):
+        """Return MSE distances between vector for word `a` and vectors for
+        each of words `bs`, in one vectorized pass.
+
+        Cached and precomputed distances are looked up, and the remaining
+        ones are computed from the embedding rows all at once. Each distance is the same
+        as returned by `get_mse_dist`.
+        Args:
+            a (Union[str|int|list]): Either word or integer presenting the id of the word, or a list with one such
+                word per element of `bs`.
+            bs (list[Union[str|int]]): Words or integers presenting the ids of the words
+        Returns:
+            distances (ndarray): 1-D array of MSE (L2) distances, one per element of `bs`
+        """
+        a, b = self._pair_ids(a, bs)
+        mse_dists = self._lookup_pairs(self._mse_dist_table, a, b)
+        self._lookup_cached_pairs(self._mse_dist_mat, a, b, mse_dists)
+        missing = np.isnan(mse_dists)
+        if missing.any():
+            mse_dists[missing] = self._compute_mse_dist(a[missing], b[missing])
+            self._cache_pairs(
+                self._mse_dist_mat, a[missing], b[missing], mse_dists[missing]
+            )
+        return mse_dists
+
+    def _pair_ids(self, a, bs):
+        """Returns the word ids of pairs ``(a, b)`` as two arrays, with the
+        smaller id of each pair first."""
+        if not isinstance(a, (list, tuple, np.ndarray)):
+            a = [a] * len(bs)
+        a = np.array(
+            [self._word2index[x] if isinstance(x, str) else x for x in a],
+            dtype=np.int64,
+        )
+        b = np.array(
+            [self._word2index[x] if isinstance(x, str) else x for x in bs],
+            dtype=np.int64,
+        )
+        return np.minimum(a, b), np.maximum(a, b)
+
+    def _compute_cos_sim(self, a, b):
+        # Each row is reduced on its own, so a pair gets the same value
+        # whether it is computed alone or in a batch. Values are computed in
+        # the dtype of the embedding matrix (e.g. float32).
+        e1 = np.asarray(self.embedding_matrix[a])
+        e2 = np.asarray(self.embedding_matrix[b])
+        norms = np.sqrt((e1 * e1).sum(axis=1) * (e2 * e2).sum(axis=1))
+        return (e1 * e2).sum(axis=1) / np.maximum(norms, 1e-8)
+
+    def _compute_mse_dist(self, a, b):
+        e1 = np.asarray(self.embedding_matrix[a])
+        e2 = np.asarray(self.embedding_matrix[b])
+        return ((e1 - e2) ** 2).sum(axis=1)
+
     def nearest_neighbours(self, index, topn):
         """
         Get top-N nearest neighbours for a word
@@ -237,17 +355,112 @@ class WordEmbedding(AbstractWordEmbedding):
             nn = self.nn_matrix[index][1 : (topn + 1)]
         else:
             try:
-                nn = self._nn_cache[index]
+                nn = self._nn_cache[(index, topn)]
             except KeyError:
-                embedding = torch.tensor(self.embedding_matrix).to(utils.device)
-                vector = torch.tensor(self.embedding_matrix[index]).to(utils.device)
-                dist = torch.norm(embedding - vector, dim=1, p=None)
-                # Since closest neighbour will be the same word, we consider N+1 nearest neighbours
-                nn = dist.topk(topn + 1, largest=False)[1:].tolist()
-                self._nn_cache[index] = nn
+                if self._nn_index_config is not None:
+                    nn = _search_neighbours(
+                        self._get_nn_index(), self.embedding_matrix[index], index, topn
+                    )
+                else:
+                    embedding = torch.tensor(self.embedding_matrix).to(utils.device)
+                    vector = torch.tensor(self.embedding_matrix[index]).to(
+                        utils.device
+                    )
+                    dist = torch.norm(embedding - vector, dim=1, p=None)
+                    # Since closest neighbour will be the same word, we consider N+1 nearest neighbours
+                    nn = dist.topk(topn + 1, largest=False).indices[1:].tolist()
+                self._nn_cache[(index, topn)] = nn
 
         return nn
 
+    def build_nn_index(self, path=None, backend=None, **kwargs):
+        """Builds an approximate nearest-neighbour index over the embedding
+        matrix, which `nearest_neighbours` uses instead of scanning the whole
+        matrix when there is no `nn_matrix`.
+
+        Args:
+            path (str, optional): File to persist the index in, e.g. next to the embedding files. If it holds an
+                index built over the same vectors with the same settings, the index is loaded from it instead of
+                being rebuilt.
+            backend (str, optional): `"faiss"` or `"ivf"`. Defaults to faiss if it is installed. See
+                :func:`~textattack.shared.nearest_neighbour_index.build_nearest_neighbour_index`.
+            kwargs: Passed to the backend when building the index.
+        """
+        self._nn_index_config = (path, backend, kwargs)
+        self._nn_index = None
+        self._nn_cache = {}
+        self._get_nn_index()
+
+    def _get_nn_index(self):
+        # The index is not pickled; worker processes load (or rebuild) it on
+        # first use.
+        if self._nn_index is None:
+            path, backend, kwargs = self._nn_index_config
+            self._nn_index = build_nearest_neighbour_index(
+                self.embedding_matrix, path=path, backend=backend, **kwargs
+            )
+        return self._nn_index
+
+    def _lookup_pair(self, table, a, b):
+        if table is None:
+            return None
+        keys, values = table
+        key = a * len(self.embedding_matrix) + b
+        i = np.searchsorted(keys, key)
+        if i < len(keys) and keys[i] == key:
+            return float(values[i])
+        return None
+
+    def _lookup_pairs(self, table, a, b):
+        """Returns the precomputed values of pairs ``(a[i], b[i])`` in
+        ``table``, with NaN for pairs that are not in it."""
+        values = np.full(len(a), np.nan)
+        if table is None or not len(a) or not len(table[0]):
+            return values
+        keys, table_values = table
+        pair_keys = a * len(self.embedding_matrix) + b
+        i = np.minimum(np.searchsorted(keys, pair_keys), len(keys) - 1)
+        found = keys[i] == pair_keys
+        values[found] = table_values[i[found]]
+        return values
+
+    def _lookup_cached_pairs(self, cache, a, b, values):
+        """Sets ``values[i]`` to the value of pair ``(a[i], b[i])`` in
+        ``cache`` (e.g. ``self._cos_sim_mat``), if it is there."""
+        if not cache:
+            return
+        for i, (a_i, b_i) in enumerate(zip(a.tolist(), b.tolist())):
+            row = cache.get(a_i)
+            if row is not None and b_i in row:
+                values[i] = row[b_i]
+
+    def _cache_pairs(self, cache, a, b, values):
+        for a_i, b_i, value in zip(a.tolist(), b.tolist(), values.tolist()):
+            cache[a_i][b_i] = value
+
+    def __getstate__(self):
+        # Memory-mapped arrays are pickled as their file location, so that
+        # worker processes map the same file instead of receiving a copy.
+        state = self.__dict__.copy()
+        state["_nn_index"] = None
+        for name in ("embedding_matrix", "nn_matrix"):
+            state[name] = _MappedArray.wrap(state[name])
+        for name in ("_mse_dist_table", "_cos_sim_table"):
+            if state[name] is not None:
+                state[name] = tuple(_MappedArray.wrap(x) for x in state[name])
+        return state
+
+    def __setstate__(self, state):
+        for name in ("_mse_dist_table", "_cos_sim_table", "_nn_index_config"):
+            state.setdefault(name, None)
+        state["_nn_index"] = None
+        for name in ("embedding_matrix", "nn_matrix"):
+            state[name] = _MappedArray.unwrap(state[name])
+        for name in ("_mse_dist_table", "_cos_sim_table"):
+            if state[name] is not None:
+                state[name] = tuple(_MappedArray.unwrap(x) for x in state[name])
+        self.__dict__ = state
+
     @staticmethod
     def counterfitted_GLOVE_embedding():
         """Returns a prebuilt counter-fitted GLOVE word embedding proposed by
@@ -285,28 +498,107 @@ class WordEmbedding(AbstractWordEmbedding):
         nn_matrix_file = os.path.join(word_embeddings_folder, nn_matrix_file)
 
         # loading the files
-        embedding_matrix = np.load(word_embeddings_file)
+        # The matrices are memory-mapped rather than read, so that all
+        # processes using the embedding share one copy in the page cache.
+        embedding_matrix = np.load(word_embeddings_file, mmap_mode="r")
         word2index = np.load(word_list_file, allow_pickle=True)
         index2word = {}
         for word, index in word2index.items():
             index2word[index] = word
-        nn_matrix = np.load(nn_matrix_file)
+        nn_matrix = np.load(nn_matrix_file, mmap_mode="r")
 
         embedding = WordEmbedding(embedding_matrix, word2index, index2word, nn_matrix)
 
-        with open(mse_dist_file, "rb") as f:
-            mse_dist_mat = pickle.load(f)
-        with open(cos_sim_file, "rb") as f:
-            cos_sim_mat = pickle.load(f)
-
-        embedding._mse_dist_mat = mse_dist_mat
-        embedding._cos_sim_mat = cos_sim_mat
+        embedding._mse_dist_table = _load_pair_table(
+            mse_dist_file, len(embedding_matrix)
+        )
+        embedding._cos_sim_table = _load_pair_table(
+            cos_sim_file, len(embedding_matrix)
+        )
 
         utils.GLOBAL_OBJECTS["textattack_counterfitted_GLOVE_embedding"] = embedding
 
         return embedding
 
 
+class _MappedArray:
+    """Picklable reference to a read-only memory-mapped ``.npy`` file."""
+
+    def __init__(self, filename, dtype, shape, offset, order):
+        self.filename = filename
+        self.dtype = dtype
+        self.shape = shape
+        self.offset = offset
+        self.order = order
+
+    @staticmethod
+    def wrap(array):
+        # Views of a mapped array (whose base is another array rather than
+        # the mmap itself) are pickled as regular arrays.
+        if (
+            isinstance(array, np.memmap)
+            and isinstance(array.base, mmap.mmap)
+            and array.mode == "r"
+        ):
+            order = "C" if array.flags.c_contiguous else "F"
+            return _MappedArray(
+                array.filename, array.dtype, array.shape, array.offset, order
+            )
+        return array
+
+    @staticmethod
+    def unwrap(array):
+        if isinstance(array, _MappedArray):
+            return np.memmap(
+                array.filename,
+                dtype=array.dtype,
+                mode="r",
+                offset=array.offset,
+                shape=array.shape,
+                order=array.order,
+            )
+        return array
+
+
+def _search_neighbours(nn_index, vector, index, topn):
+    """Returns the ids of the ``topn`` nearest neighbours of word ``index``
+    (whose vector is ``vector``) found by ``nn_index``, excluding the word
+    itself."""
+    ids = nn_index.search(np.asarray(vector)[None], topn + 1)[0]
+    return [int(i) for i in ids if i != index and i >= 0][:topn]
+
+
+def _load_pair_table(pickle_file, vocab_size):
+    """Returns the distances pickled in ``pickle_file`` (as a dictionary with
+    ``d[a][b]`` for ``a < b``) as memory-mapped ``(keys, values)`` arrays
+    sorted by key, where the key of ``(a, b)`` is ``a * vocab_size + b``.
+
+    The arrays are written next to ``pickle_file`` the first time, and only
+    mapped afterwards.
+    """
+    root = os.path.splitext(pickle_file)[0]
+    keys_file = f"{root}.keys.npy"
+    values_file = f"{root}.values.npy"
+    if not (os.path.exists(keys_file) and os.path.exists(values_file)):
+        with open(pickle_file, "rb") as f:
+            pairs = pickle.load(f)
+        keys = np.fromiter(
+            (a * vocab_size + b for a, row in pairs.items() for b in row),
+            dtype=np.int64,
+        )
+        values = np.fromiter(
+            (d for row in pairs.values() for d in row.values()), dtype=np.float64
+        )
+        order = np.argsort(keys, kind="stable")
+        # Write to temporary files first, since other processes may be
+        # loading the same embedding.
+        for path, array in ((keys_file, keys[order]), (values_file, values[order])):
+            tmp_file = f"{path}.{os.getpid()}.tmp.npy"
+            np.save(tmp_file, array)
+            os.replace(tmp_file, path)
+    return np.load(keys_file, mmap_mode="r"), np.load(values_file, mmap_mode="r")
+
+
 class GensimWordEmbedding(AbstractWordEmbedding):
     """Wraps Gensim's `models.keyedvectors` module
     (https://radimrehurek.com/gensim/models/keyedvectors.html)"""
@@ -327,6 +619,8 @@ class GensimWordEmbedding(AbstractWordEmbedding):
         self.keyed_vectors.init_sims()
         self._mse_dist_mat = defaultdict(dict)
         self._cos_sim_mat = defaultdict(dict)
+        self._nn_index = None
+        self._nn_index_config = None
 
     def __getitem__(self, index):
         """Gets the embedding vector for word/id
@@ -423,8 +717,40 @@ class GensimWordEmbedding(AbstractWordEmbedding):
         Returns:
             neighbours (list[int]): List of indices of the nearest neighbours
         """
+        if self._nn_index_config is not None:
+            vector = self.keyed_vectors.vectors_norm[index]
+            return _search_neighbours(self._get_nn_index(), vector, index, topn)
         word = self.keyed_vectors.index2word[index]
         return [
             self.word2index(i[0])
             for i in self.keyed_vectors.similar_by_word(word, topn)
         ]
+
+    def build_nn_index(self, path=None, backend=None, **kwargs):
+        """Builds an approximate nearest-neighbour index over the normalized
+        vectors, which `nearest_neighbours` uses instead of Gensim's exhaustive
+        `similar_by_word`. Neighbours by euclidean distance between
+        normalized vectors are the neighbours by cosine similarity.
+
+        Args:
+            path (str, optional): File to persist the index in. If it holds an index built over the same vectors
+                with the same settings, the index is loaded from it instead of being rebuilt.
+            backend (str, optional): `"faiss"` or `"ivf"`. Defaults to faiss if it is installed.
+            kwargs: Passed to the backend when building the index.
+        """
+        self._nn_index_config = (path, backend, kwargs)
+        self._nn_index = None
+        self._get_nn_index()
+
+    def _get_nn_index(self):
+        if self._nn_index is None:
+            path, backend, kwargs = self._nn_index_config
+            self._nn_index = build_nearest_neighbour_index(
+                self.keyed_vectors.vectors_norm, path=path, backend=backend, **kwargs
+            )
+        return self._nn_index
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_nn_index"] = None
+        return state
@@ -86,6 +86,7 @@ class WordSwapMaskedLM(WordSwap):
         self._language_model.to(utils.device)
         self._language_model.eval()
         self.masked_lm_name = self._language_model.__class__.__name__
+        self._vocab_filters = None
 
     def _encode_text(self, text):
         """Encodes ``text`` using an ``AutoTokenizer``, ``self._lm_tokenizer``.
@@ -125,52 +126,79 @@ class WordSwapMaskedLM(WordSwap):
         replacement_words = []
         while i < len(masked_texts):
             inputs = self._encode_text(masked_texts[i : i + self.batch_size])
-            ids = inputs["input_ids"].tolist()
+            is_mask = inputs["input_ids"] == self._lm_tokenizer.mask_token_id
+            # Mask-token located past max_length might be truncated by tokenizer
+            has_mask = is_mask.any(dim=1).tolist()
+            masked_indices = is_mask.int().argmax(dim=1)
             with torch.no_grad():
                 preds = self._language_model(**inputs)[0]
 
-            for j in range(len(ids)):
-                try:
-                    # Need try-except b/c mask-token located past max_length might be truncated by tokenizer
-                    masked_index = ids[j].index(self._lm_tokenizer.mask_token_id)
-                except ValueError:
+            rows = torch.arange(len(masked_indices), device=preds.device)
+            mask_token_probs = torch.softmax(preds[rows, masked_indices], dim=-1)
+            words, valid_start, valid = self._vocab_filter(mask_token_probs.shape[-1])
+            # Models like RoBERTa treat the token right after the start token differently.
+            starting = masked_indices == 1
+            valid = torch.where(starting.unsqueeze(1), valid_start, valid)
+            valid &= mask_token_probs >= self.min_confidence
+            scores = mask_token_probs.masked_fill(~valid, -1.0)
+            k = min(self.max_candidates, scores.shape[-1])
+            top_scores, top_ids = scores.topk(k, dim=-1)
+
+            for row_scores, row_ids, row_has_mask, row_starting in zip(
+                top_scores.tolist(), top_ids.tolist(), has_mask, starting.tolist()
+            ):
+                if not row_has_mask:
                     replacement_words.append([])
                     continue
-
-                mask_token_logits = preds[j, masked_index]
-                mask_token_probs = torch.softmax(mask_token_logits, dim=0)
-                ranked_indices = torch.argsort(mask_token_probs, descending=True)
-                top_words = []
-                for _id in ranked_indices:
-                    _id = _id.item()
-                    word = self._lm_tokenizer.convert_ids_to_tokens(_id)
-                    if utils.check_if_subword(
-                        word,
-                        self._language_model.config.model_type,
-                        (masked_index == 1),
-                    ):
-                        word = utils.strip_BPE_artifacts(
-                            word, self._language_model.config.model_type
-                        )
-                    if (
-                        mask_token_probs[_id] >= self.min_confidence
-                        and utils.is_one_word(word)
-                        and not utils.check_if_punctuations(word)
-                    ):
-                        top_words.append(word)
-
-                    if (
-                        len(top_words) >= self.max_candidates
-                        or mask_token_probs[_id] < self.min_confidence
-                    ):
-                        break
-
-                replacement_words.append(top_words)
+                row_words = words[row_starting]
+                replacement_words.append(
+                    [
+                        row_words[_id]
+                        for score, _id in zip(row_scores, row_ids)
+                        if score >= 0
+                    ]
+                )
 
             i += self.batch_size
 
         return replacement_words
 
+    def _vocab_filter(self, vocab_size):
+        """Returns the word of each of the language model's ``vocab_size``
+        token ids (with BPE artifacts stripped), when it is and is not the
+        first token of the text, and boolean tensors of which of those are
+        valid replacement words (one word, not just punctuation).
+
+        They are computed once per model, so that BAE can pick the top
+        replacements with a single ``topk`` instead of checking tokens one
+        by one."""
+        if self._vocab_filters is None or len(self._vocab_filters[1]) != vocab_size:
+            model_type = self._language_model.config.model_type
+            num_tokens = min(vocab_size, len(self._lm_tokenizer))
+            tokens = self._lm_tokenizer.convert_ids_to_tokens(list(range(num_tokens)))
+            tokens += [None] * (vocab_size - num_tokens)
+            words = ([], [])
+            valid = ([], [])
+            for starting in (False, True):
+                for token in tokens:
+                    if not token:
+                        words[starting].append(token)
+                        valid[starting].append(False)
+                        continue
+                    if utils.check_if_subword(token, model_type, starting):
+                        token = utils.strip_BPE_artifacts(token, model_type)
+                    words[starting].append(token)
+                    valid[starting].append(
+                        utils.is_one_word(token)
+                        and not utils.check_if_punctuations(token)
+                    )
+            self._vocab_filters = (
+                words,
+                torch.tensor(valid[True], device=utils.device),
+                torch.tensor(valid[False], device=utils.device),
+            )
+        return self._vocab_filters
+
     def _bert_attack_replacement_words(
         self,
         current_text,